@@ -0,0 +1,263 @@
+import hashlib
+import itertools
+import json
+import os
+from typing import Dict, List, Optional
+from common.tree import DOMTree, NodeView
+
+class DiffCache:
+    """
+    On-disk cache of StructuralDiffer results.
+
+    Entries are keyed by the root structural hashes of both trees, the diff
+    engine/budget and the differ's cost-model version, so a retried or
+    sharded CI run against the same baseline skips the diff entirely. The
+    mapping is stored as preorder index pairs (-1 for an inserted/deleted
+    side) and rebuilt as NodeViews on the caller's trees. Files are evicted
+    least-recently-used first once the directory exceeds max_bytes.
+    """
+    def __init__(self, directory: str = ".plr_cache/diff", max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, t1: DOMTree, t2: DOMTree, engine: str, budget=None) -> str:
+        from analyze.diff import DIFF_CONFIG_VERSION
+        budget_key = (budget.max_seconds, budget.max_nodes, budget.max_memory_mb) if budget else None
+        raw = f"{t1.root_hash:016x}:{len(t1)}:{t2.root_hash:016x}:{len(t2)}:{engine}:{budget_key}:{DIFF_CONFIG_VERSION}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, t1: DOMTree, t2: DOMTree, engine: str, budget=None) -> Optional[Dict]:
+        path = self._path(self.key(t1, t2, engine, budget))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # A truncated or hand-edited entry is a miss, like an unreadable file
+        try:
+            pairs, distance = entry["pairs"], entry["distance"]
+            if len(pairs) % 2 or not all(
+                    type(i) is int and -1 <= i < len(tree) for i, tree in zip(pairs, itertools.cycle((t1, t2)))):
+                return None
+        except (KeyError, TypeError):
+            return None
+        # Touch on hit: mtime is the LRU clock
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        mapping = [
+            (t1.node(pairs[k]) if pairs[k] >= 0 else None, t2.node(pairs[k + 1]) if pairs[k + 1] >= 0 else None)
+            for k in range(0, len(pairs), 2)
+        ]
+        return {
+            "distance": distance,
+            "mapping": mapping,
+            "strategy": entry.get("strategy"),
+            "estimate": entry.get("estimate"),
+            "elapsed": 0.0,
+            "cached": True
+        }
+
+    def put(self, t1: DOMTree, t2: DOMTree, engine: str, result: Dict, budget=None) -> bool:
+        """
+        Stores a diff result. Returns False (and stores nothing) when the
+        mapping doesn't consist of NodeViews on t1/t2.
+        """
+        pairs: List[int] = []
+        for n1, n2 in result["mapping"]:
+            for node, tree in ((n1, t1), (n2, t2)):
+                if node is None:
+                    pairs.append(-1)
+                elif isinstance(node, NodeView) and node.tree is tree:
+                    pairs.append(node.index)
+                else:
+                    return False
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(self.key(t1, t2, engine, budget))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "distance": result["distance"],
+                "strategy": result.get("strategy"),
+                "estimate": result.get("estimate"),
+                "pairs": pairs
+            }, f, separators=(",", ":"))
+        # Atomic publish so parallel shards never read a partial entry
+        os.replace(tmp_path, path)
+        self.evict()
+        return True
+
+    def evict(self):
+        """Deletes least-recently-used entries until the cache fits max_bytes."""
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        except OSError:
+            return
+        stats = []
+        for entry in entries:
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            stats.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in stats)
+        for _, size, path in sorted(stats):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+class EmbeddingCache:
+    """
+    Content-addressed on-disk cache of node embeddings.
+
+    Keys are SHA-256 digests of the serialized node snippet; the model id and
+    revision select a separate namespace directory, so a model upgrade never
+    serves stale vectors. Vectors live in one memory-mapped float16 matrix
+    (vectors.f16) with a JSON key index; rows are recycled least-recently-used
+    first once the matrix reaches max_bytes. One writer per directory.
+    """
+    INITIAL_ROWS = 1024
+
+    def __init__(self, directory: str = ".plr_cache/embeddings", model_id: str = "", revision: str = "",
+                 max_bytes: int = 256 * 1024 * 1024):
+        namespace = hashlib.sha256(f"{model_id}@{revision}".encode("utf-8")).hexdigest()[:16]
+        self.directory = os.path.join(directory, namespace)
+        self.max_bytes = max_bytes
+        self.dim = 0
+        self.capacity = 0
+        self.clock = 0
+        # key -> [row, last use]
+        self.slots: Dict[str, List[int]] = {}
+        self._vectors = None
+        self._dirty = False
+        self._load()
+
+    @staticmethod
+    def key(snippet: str) -> str:
+        return hashlib.sha256(snippet.encode("utf-8")).hexdigest()
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index.json")
+
+    def _matrix_path(self) -> str:
+        return os.path.join(self.directory, "vectors.f16")
+
+    def _load(self):
+        import numpy as np
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        dim, capacity = index.get("dim", 0), index.get("capacity", 0)
+        try:
+            if os.path.getsize(self._matrix_path()) < dim * capacity * 2:
+                return
+            self._vectors = np.memmap(self._matrix_path(), dtype=np.float16, mode="r+", shape=(capacity, dim))
+        except (OSError, ValueError):
+            return
+        self.dim, self.capacity = dim, capacity
+        self.clock = index.get("clock", 0)
+        self.slots = index.get("slots", {})
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.slots
+
+    def get_many(self, keys: List[str]) -> Dict:
+        """{key: float32 vector} for the keys present; hits are marked recently used."""
+        import numpy as np
+        found = {}
+        for key in keys:
+            slot = self.slots.get(key)
+            if slot is None or key in found:
+                continue
+            self.clock += 1
+            slot[1] = self.clock
+            found[key] = np.array(self._vectors[slot[0]], dtype=np.float32)
+        if found:
+            self._dirty = True
+        return found
+
+    def put_many(self, keys: List[str], vectors):
+        """Stores one row per key (vectors: (len(keys), dim) array-like)."""
+        import numpy as np
+        vectors = np.asarray(vectors, dtype=np.float16)
+        if not len(keys):
+            return
+        if not self.dim:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"EmbeddingCache holds {self.dim}-d vectors, got {vectors.shape[1]}-d")
+
+        batch = dict.fromkeys(keys)
+        rows = self._allocate([k for k in batch if k not in self.slots], batch)
+        for key, vector in zip(keys, vectors):
+            slot = self.slots.get(key)
+            if slot is None:
+                slot = self.slots[key] = [rows.pop(), 0]
+            self.clock += 1
+            slot[1] = self.clock
+            self._vectors[slot[0]] = vector
+        self._dirty = True
+
+    def _allocate(self, new_keys: List[str], keep) -> List[int]:
+        """Free rows for new_keys, growing the matrix or evicting LRU rows outside keep."""
+        max_rows = max(1, self.max_bytes // (self.dim * 2))
+        if len(keep) > max_rows:
+            raise ValueError(f"{len(keep)} vectors exceed the cache capacity of {max_rows}")
+        needed = len(self.slots) + len(new_keys)
+        if needed > self.capacity and self.capacity < max_rows:
+            capacity = max(self.capacity, self.INITIAL_ROWS)
+            while capacity < needed:
+                capacity *= 2
+            self._resize(min(capacity, max_rows))
+
+        used = {slot[0] for slot in self.slots.values()}
+        free = [row for row in range(self.capacity) if row not in used][:len(new_keys)]
+        if len(free) < len(new_keys):
+            by_age = sorted((item for item in self.slots.items() if item[0] not in keep), key=lambda item: item[1][1])
+            for key, slot in by_age[:len(new_keys) - len(free)]:
+                free.append(slot[0])
+                del self.slots[key]
+        # Callers pop(): hand rows out in ascending order
+        free.reverse()
+        return free
+
+    def _resize(self, capacity: int):
+        import numpy as np
+        os.makedirs(self.directory, exist_ok=True)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._matrix_path(), "ab") as f:
+            f.truncate(capacity * self.dim * 2)
+        self._vectors = np.memmap(self._matrix_path(), dtype=np.float16, mode="r+", shape=(capacity, self.dim))
+        self.capacity = capacity
+
+    def flush(self):
+        """Persists the matrix and the key index (index written atomically)."""
+        if not self._dirty or self._vectors is None:
+            return
+        self._vectors.flush()
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._index_path()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "capacity": self.capacity, "clock": self.clock, "slots": self.slots},
+                      f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        self._dirty = False
@@ -1,12 +1,49 @@
+import multiprocessing
+import time
 from apted import APTED, Config
-from apted.helpers import Tree
-from typing import List, Tuple
-from common.models import Node
+from typing import List, Tuple, Union, Dict, Optional
+from common.models import BaseNode
+from common.tree import DOMTree, NodeView, as_tree
+from analyze.matching import paired_subtree_roots
+from analyze.gumtree import GumTreeMatcher
+
+# Bump whenever DOMTreeConfig costs or engine behaviour change; part of the
+# diff cache key.
+DIFF_CONFIG_VERSION = 3
 
 class DOMTreeConfig(Config):
-    def rename(self, node1: Node, node2: Node):
+    # Bound on memoised (signature, signature) -> cost entries
+    MEMO_SIZE = 1 << 16
+
+    def __init__(self):
+        self._memo: Dict[Tuple[int, int], float] = {}
+
+    def rename(self, node1: BaseNode, node2: BaseNode):
         """
         Cost of renaming node1 to node2.
+        For DOMTree nodes the precomputed tag+attribute signatures give a zero
+        cost without touching attributes, and repeated signature pairs are
+        served from a bounded memo.
+        """
+        if type(node1) is NodeView and type(node2) is NodeView:
+            sig1 = node1.tree.signature_hash[node1.index]
+            sig2 = node2.tree.signature_hash[node2.index]
+            if sig1 == sig2:
+                return 0
+            key = (sig1, sig2)
+            cost = self._memo.get(key)
+            if cost is None:
+                cost = self.attribute_cost(node1, node2)
+                if len(self._memo) >= self.MEMO_SIZE:
+                    self._memo.clear()
+                self._memo[key] = cost
+            return cost
+        return self.attribute_cost(node1, node2)
+
+    @staticmethod
+    def attribute_cost(node1: BaseNode, node2: BaseNode):
+        """
+        Reference rename cost computed from the tags and attribute dicts.
         """
         if node1.tag != node2.tag:
             return 1 # fundamental change
@@ -30,16 +67,271 @@ class DOMTreeConfig(Config):
         cost = min(0.5, (mismatches / len(keys)) * 0.5)
         return cost
 
-    def children(self, node: Node):
+    def children(self, node: BaseNode):
         return node.children
 
+class _ResidualNode:
+    """
+    Node of a residual tree for the hybrid engine. A collapsed node stands in
+    for a whole subtree paired with an identical one in the other tree; both
+    carry the same pair number.
+    """
+    __slots__ = ('view', 'children', 'size', 'collapsed', 'pair')
+
+    def __init__(self, view: NodeView, size: int = 1, pair: Optional[int] = None):
+        self.view = view
+        self.children = []
+        self.size = size
+        self.collapsed = pair is not None
+        self.pair = pair
+
+    @property
+    def name(self):
+        return self.view.tag
+
+
+class HybridTreeConfig(DOMTreeConfig):
+    """
+    Costs over residual trees: a collapsed subtree costs its size to insert or
+    delete, maps for free onto the identical subtree it was paired with, and
+    is never renamed into anything else.
+    """
+    def delete(self, node: _ResidualNode):
+        return node.size
+
+    def insert(self, node: _ResidualNode):
+        return node.size
+
+    def rename(self, node1: _ResidualNode, node2: _ResidualNode):
+        if node1.collapsed or node2.collapsed:
+            if node1.collapsed and node2.collapsed and node1.pair == node2.pair:
+                return 0
+            return node1.size + node2.size
+        return DOMTreeConfig.rename(self, node1.view, node2.view)
+
+    def children(self, node: _ResidualNode):
+        return node.children
+
+
+def build_residual_tree(tree: DOMTree, collapsed_roots: List[int]) -> _ResidualNode:
+    """
+    Copies the tree skeleton, replacing each collapsed subtree by a single leaf
+    numbered by its position in collapsed_roots.
+    """
+    collapsed = {root: pair for pair, root in enumerate(collapsed_roots)}
+    nodes: Dict[int, _ResidualNode] = {}
+    i, count = 0, len(tree)
+    while i < count:
+        if i in collapsed:
+            node = _ResidualNode(tree.node(i), tree.size[i], collapsed[i])
+            step = tree.size[i]
+        else:
+            node = _ResidualNode(tree.node(i))
+            step = 1
+        nodes[i] = node
+        parent = tree.parent[i]
+        if parent >= 0:
+            nodes[parent].children.append(node)
+        i += step
+    return nodes[0]
+
+
+class DiffBudget:
+    """
+    Upper bounds for a single diff. APTED's cost is estimated up front from
+    the tree sizes; when an estimate would exceed a bound the differ degrades
+    to a cheaper strategy (exact -> hybrid -> fast) instead of blocking.
+    max_seconds is also enforced as a wall-clock deadline: where fork is
+    available, an APTED run still going when it expires is stopped and the
+    fast engine's result is returned instead. None disables a bound.
+    """
+    # Calibration for the pure-Python APTED run over DOMTreeConfig: runtime
+    # and peak memory both scale with the number of node pairs.
+    APTED_SECONDS_PER_PAIR = 5e-5
+    APTED_BYTES_PER_PAIR = 80
+
+    def __init__(self, max_seconds: Optional[float] = None, max_nodes: Optional[int] = None, max_memory_mb: Optional[float] = None):
+        self.max_seconds = max_seconds
+        self.max_nodes = max_nodes
+        self.max_memory_mb = max_memory_mb
+
+    def estimate(self, size1: int, size2: int) -> Dict[str, float]:
+        pairs = size1 * size2
+        return {
+            "nodes": max(size1, size2),
+            "seconds": pairs * self.APTED_SECONDS_PER_PAIR,
+            "memory_mb": pairs * self.APTED_BYTES_PER_PAIR / (1024 * 1024),
+        }
+
+    def allows(self, estimate: Dict[str, float]) -> bool:
+        if self.max_nodes is not None and estimate["nodes"] > self.max_nodes:
+            return False
+        if self.max_seconds is not None and estimate["seconds"] > self.max_seconds:
+            return False
+        if self.max_memory_mb is not None and estimate["memory_mb"] > self.max_memory_mb:
+            return False
+        return True
+
+
 class StructuralDiffer:
-    def diff(self, tree1_json: dict, tree2_json: dict):
+    """
+    Tree differ producing {"distance", "mapping"}.
+
+    Engines:
+      exact  - APTED over the full trees (optimal, cubic worst case).
+      hybrid - identical subtrees (equal structural hash), paired one-to-one
+               in document order, are collapsed into matched leaves first;
+               APTED only sees the residual changed regions and the result
+               is expanded back to full-tree nodes. Collapsed pairs can't be
+               renamed, so the distance is a valid edit cost at or above the
+               exact one (equal when the pairs lie on an optimal mapping).
+      fast   - GumTree-style greedy matching, near-linear. The mapping is
+               pruned to a valid edit mapping, so the distance is the cost
+               of a real edit script, at or above the exact distance; it is
+               not TED, and a moved subtree counts as delete + insert.
+      auto   - picks one of the above by tree size.
+
+    With a DiffBudget, APTED-based strategies that are estimated to exceed it
+    fall back to the next cheaper one, and with max_seconds an APTED run that
+    overruns its deadline (or whose child process fails) is abandoned for
+    the fast engine. The result records the strategy that actually ran
+    ("identical", "exact", "hybrid" or "fast"), the APTED cost estimate it
+    was chosen on, the elapsed time and, after a deadline expiry, the
+    abandoned strategy as "timed_out"; after a child failure, the abandoned
+    strategy as "failed" and the reason as "error".
+    """
+    ENGINES = ("exact", "hybrid", "fast", "auto")
+    # auto: largest tree size (nodes) still handled by each engine
+    AUTO_EXACT_MAX_NODES = 500
+    AUTO_HYBRID_MAX_NODES = 20000
+
+    def __init__(self, engine: str = "exact", budget: Optional[DiffBudget] = None):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown diff engine '{engine}'. Expected one of {self.ENGINES}")
+        self.engine = engine
+        self.budget = budget
+
+    def diff(self, tree1: Union[DOMTree, Dict], tree2: Union[DOMTree, Dict]):
         """
         Computes the edit distance and edit script between two DOM trees.
+        Accepts snapshot dicts or prebuilt DOMTrees; pass DOMTrees to share one
+        tree with the later pipeline stages instead of rebuilding it.
+        """
+        start = time.perf_counter()
+        t1, t2 = as_tree(tree1), as_tree(tree2)
+
+        # Identical structural hashes: the edit script is empty and the
+        # mapping is the preorder identity, no APTED run needed.
+        if t1.root_hash == t2.root_hash and len(t1) == len(t2):
+            result = {
+                "distance": 0,
+                "mapping": list(zip(t1.nodes(), t2.nodes()))
+            }
+            strategy, estimate = "identical", None
+        else:
+            strategy, estimate, collapsed = self.plan(t1, t2)
+            abandoned = error = None
+            if strategy != "fast" and self.budget is not None and self.budget.max_seconds is not None \
+                    and "fork" in multiprocessing.get_all_start_methods():
+                remaining = self.budget.max_seconds - (time.perf_counter() - start)
+                result, error = self._run_with_deadline(t1, t2, strategy, collapsed, remaining)
+                if result is None:
+                    # Never re-run APTED here: without the child there is no deadline
+                    abandoned, strategy = strategy, "fast"
+            else:
+                result = self._run(t1, t2, strategy, collapsed)
+            if result is None:
+                result = GumTreeMatcher(DOMTreeConfig()).match(t1, t2)
+            if abandoned and error is None:
+                result["timed_out"] = abandoned
+            elif abandoned:
+                result["failed"], result["error"] = abandoned, error
+
+        result["strategy"] = strategy
+        result["estimate"] = estimate
+        result["elapsed"] = time.perf_counter() - start
+        return result
+
+    def resolve_engine(self, t1: DOMTree, t2: DOMTree) -> str:
+        if self.engine != "auto":
+            return self.engine
+        nodes = max(len(t1), len(t2))
+        if nodes <= self.AUTO_EXACT_MAX_NODES:
+            return "exact"
+        if nodes <= self.AUTO_HYBRID_MAX_NODES:
+            return "hybrid"
+        return "fast"
+
+    def plan(self, t1: DOMTree, t2: DOMTree):
         """
-        root1 = Node.from_json(tree1_json)
-        root2 = Node.from_json(tree2_json)
+        Chooses the strategy to run under the budget.
+        Returns (strategy, APTED cost estimate, hybrid collapsed roots or None).
+        """
+        strategy = self.resolve_engine(t1, t2)
+        budget = self.budget
+        estimate = None
+
+        if strategy == "exact":
+            estimate = (budget or DiffBudget()).estimate(len(t1), len(t2))
+            if budget is None or budget.allows(estimate):
+                return "exact", estimate, None
+            strategy = "hybrid"
+
+        if strategy == "hybrid":
+            collapsed = paired_subtree_roots(t1, t2)
+            # A collapsed subtree of size s becomes a single residual leaf
+            residual1 = len(t1) - sum(t1.size[i] - 1 for i in collapsed[0])
+            residual2 = len(t2) - sum(t2.size[i] - 1 for i in collapsed[1])
+            estimate = (budget or DiffBudget()).estimate(residual1, residual2)
+            if budget is None or budget.allows(estimate):
+                return "hybrid", estimate, collapsed
+
+        return "fast", estimate, None
+
+    def _run(self, t1: DOMTree, t2: DOMTree, strategy: str, collapsed):
+        if strategy == "hybrid":
+            return self._diff_hybrid(t1, t2, collapsed)
+        if strategy == "fast":
+            return GumTreeMatcher(DOMTreeConfig()).match(t1, t2)
+        return self._diff_exact(t1, t2)
+
+    def _run_with_deadline(self, t1: DOMTree, t2: DOMTree, strategy: str, collapsed,
+                           seconds: float) -> Tuple[Optional[Dict], Optional[str]]:
+        """
+        Runs an APTED strategy in a forked child (which inherits the trees)
+        and waits at most `seconds` for it. Returns (result, None) on
+        success, (None, None) when the deadline passes (the child is
+        terminated) and (None, reason) when the child raised or died.
+        """
+        if seconds <= 0:
+            return None, None
+        context = multiprocessing.get_context("fork")
+        receiver, sender = context.Pipe(duplex=False)
+        child = context.Process(target=_deadline_child, args=(self, t1, t2, strategy, collapsed, sender), daemon=True)
+        child.start()
+        sender.close()
+        try:
+            if not receiver.poll(seconds):
+                return None, None
+            status, distance, pairs = receiver.recv()
+        except EOFError:
+            status, distance = "error", None
+        finally:
+            if child.is_alive():
+                child.terminate()
+            child.join()
+            receiver.close()
+        if status != "ok":
+            # distance carries the child's exception text, if it got to send one
+            return None, distance or f"diff process exited with code {child.exitcode}"
+        return {
+            "distance": distance,
+            "mapping": [(t1.node(i) if i >= 0 else None, t2.node(j) if j >= 0 else None) for i, j in pairs]
+        }, None
+
+    def _diff_exact(self, t1: DOMTree, t2: DOMTree):
+        root1 = t1.root
+        root2 = t2.root
         
         # Use Custom Config to handle Node objects directly
         # apted library expects tree objects to look like what Config expects.
@@ -61,20 +353,133 @@ class StructuralDiffer:
                  print(f"CRITICAL ERROR: Mapping contains DICTS: {type(m1)} -> {type(m2)}")
         
         # Mapping is a list of (node1, node2) tuples.
-        # Now these are the ACTUAL Node objects, not apted.helpers.Tree wrappers.
+        # These are NodeView handles into the input trees, not apted.helpers.Tree wrappers.
         
         return {
             "distance": ted,
             "mapping": mapping
         }
 
+    def _diff_hybrid(self, t1: DOMTree, t2: DOMTree, collapsed: Tuple[List[int], List[int]]):
+        residual1 = build_residual_tree(t1, collapsed[0])
+        residual2 = build_residual_tree(t2, collapsed[1])
+
+        apted = APTED(residual1, residual2, HybridTreeConfig())
+        ted = apted.compute_edit_distance()
+        residual_mapping = apted.compute_edit_mapping()
+
+        # Expand collapsed leaves back into per-node pairs. Identical subtrees
+        # have identical shapes, so their preorder ranges align one-to-one.
+        mapping = []
+        for r1, r2 in residual_mapping:
+            if r1 is not None and r2 is not None and (r1.collapsed or r2.collapsed):
+                if r1.collapsed and r2.collapsed and r1.pair == r2.pair:
+                    start1, start2 = r1.view.index, r2.view.index
+                    mapping.extend(
+                        (t1.node(start1 + k), t2.node(start2 + k)) for k in range(r1.size)
+                    )
+                    continue
+                # Costed as delete + insert; report it that way.
+                mapping.extend(self._expand_unmatched(r1, t1, first=True))
+                mapping.extend(self._expand_unmatched(r2, t2, first=False))
+            elif r2 is None:
+                mapping.extend(self._expand_unmatched(r1, t1, first=True))
+            elif r1 is None:
+                mapping.extend(self._expand_unmatched(r2, t2, first=False))
+            else:
+                mapping.append((r1.view, r2.view))
+
+        return {
+            "distance": ted,
+            "mapping": mapping
+        }
+
+    @staticmethod
+    def _expand_unmatched(node: _ResidualNode, tree: DOMTree, first: bool):
+        start = node.view.index
+        for k in range(node.size):
+            view = tree.node(start + k)
+            yield (view, None) if first else (None, view)
+
+
+def _deadline_child(differ: StructuralDiffer, t1: DOMTree, t2: DOMTree, strategy: str, collapsed, sender):
+    # Node views don't cross the pipe; the parent rebuilds them from indices
+    try:
+        result = differ._run(t1, t2, strategy, collapsed)
+        pairs = [(n1.index if n1 is not None else -1, n2.index if n2 is not None else -1)
+                 for n1, n2 in result["mapping"]]
+        sender.send(("ok", result["distance"], pairs))
+    except Exception as e:
+        sender.send(("error", f"{type(e).__name__}: {e}", None))
+    finally:
+        sender.close()
+
+
+def compare_engines(tree1: Union[DOMTree, Dict], tree2: Union[DOMTree, Dict], engine: str = "hybrid") -> Dict:
+    """
+    Runs `engine` and the exact APTED engine on the same pair and reports the
+    distance delta and how much of the exact mapping the engine reproduced.
+    """
+    t1, t2 = as_tree(tree1), as_tree(tree2)
+
+    def run(name):
+        start = time.perf_counter()
+        result = StructuralDiffer(name).diff(t1, t2)
+        return result, time.perf_counter() - start
+
+    def pairs(mapping):
+        return {
+            (n1.index if n1 is not None else None, n2.index if n2 is not None else None)
+            for n1, n2 in mapping
+        }
+
+    exact, exact_time = run("exact")
+    other, other_time = run(engine)
+    exact_pairs, other_pairs = pairs(exact["mapping"]), pairs(other["mapping"])
+    agreement = len(exact_pairs & other_pairs) / len(exact_pairs) if exact_pairs else 1.0
+    return {
+        "engine": engine,
+        "nodes": (len(t1), len(t2)),
+        "exact_distance": exact["distance"],
+        "engine_distance": other["distance"],
+        "mapping_agreement": agreement,
+        "exact_seconds": exact_time,
+        "engine_seconds": other_time,
+    }
+
+
 if __name__ == "__main__":
-    # Test
-    t1 = {"nodeName": "body", "children": [{"nodeName": "div", "attributes": {"id": "a"}}]}
-    t2 = {"nodeName": "body", "children": [{"nodeName": "div", "attributes": {"id": "b"}}]}
-    
-    differ = StructuralDiffer()
-    result = differ.diff(t1, t2)
-    print(f"Edit Distance: {result['distance']}")
-    for m in result['mapping']:
-        print(f"{m[0].name if m[0] else 'None'} -> {m[1].name if m[1] else 'None'}")
+    import argparse
+    import itertools
+
+    parser = argparse.ArgumentParser(description="Structural DOM diff")
+    parser.add_argument("--engine", choices=[e for e in StructuralDiffer.ENGINES if e != "exact"], default="hybrid")
+    parser.add_argument("--compare-exact", nargs="+", metavar="HTML",
+                        help="Compare --engine against exact APTED on every pair of the given HTML files "
+                             "(e.g. testing/v1.html testing/v2.html testing/v3.html)")
+    args = parser.parse_args()
+
+    if args.compare_exact:
+        from ingest.html_loader import snapshot_from_html
+        trees = {}
+        for path in args.compare_exact:
+            with open(path, "r", encoding="utf-8") as f:
+                trees[path] = DOMTree.from_json(snapshot_from_html(f.read()))
+        for a, b in itertools.combinations(args.compare_exact, 2):
+            report = compare_engines(trees[a], trees[b], args.engine)
+            status = "MATCH" if report["exact_distance"] == report["engine_distance"] else "DIFF"
+            print(
+                f"{a} -> {b}: exact={report['exact_distance']} {args.engine}={report['engine_distance']} "
+                f"[{status}] agreement={report['mapping_agreement']:.0%} "
+                f"({report['exact_seconds'] * 1000:.1f} ms vs {report['engine_seconds'] * 1000:.1f} ms)"
+            )
+    else:
+        # Test
+        t1 = {"nodeName": "body", "children": [{"nodeName": "div", "attributes": {"id": "a"}}]}
+        t2 = {"nodeName": "body", "children": [{"nodeName": "div", "attributes": {"id": "b"}}]}
+
+        differ = StructuralDiffer()
+        result = differ.diff(t1, t2)
+        print(f"Edit Distance: {result['distance']}")
+        for m in result['mapping']:
+            print(f"{m[0].name if m[0] else 'None'} -> {m[1].name if m[1] else 'None'}")
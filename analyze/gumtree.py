@@ -0,0 +1,162 @@
+from typing import Dict, List, Tuple
+from common.tree import DOMTree, NO_NODE
+from analyze.matching import match_identical_subtrees, prune_to_edit_mapping
+
+class GumTreeMatcher:
+    """
+    Near-linear GumTree-style matcher. Trades the optimal edit distance for
+    speed on very large DOMs:
+
+      1. Top-down: identical subtrees are anchored by structural hash.
+      2. Bottom-up: an unmatched container is matched to the same-tag node
+         that holds most of its children's partners, if the dice overlap of
+         their matched descendants reaches min_dice.
+      3. Recovery: unmatched children of matched pairs are paired by tag using
+         the differ's rename cost; leftovers are paired in order when renaming
+         is cheaper than delete + insert, as APTED would do.
+
+    After steps 2 and 3, pairs that break ancestor or document order (e.g. a
+    subtree anchored at its new parent after a move) are dropped, so the
+    mapping is a valid edit mapping and the distance is the cost of a real
+    edit script: never below the exact distance, with moves costed as
+    delete + insert.
+
+    Produces the same mapping shape as APTED: (n1, n2) pairs with None for
+    deleted or inserted nodes.
+    """
+    # Dice coefficient a container pair needs to be matched bottom-up.
+    MIN_DICE = 0.5
+    # Bottom-up candidates evaluated per container (highest vote first).
+    MAX_CANDIDATES = 3
+    # Above this many child pairs, recovery pairs same-tag children in order
+    # instead of by minimum rename cost.
+    RECOVERY_PAIR_LIMIT = 256
+
+    def __init__(self, config, min_dice: float = MIN_DICE):
+        self.config = config
+        self.min_dice = min_dice
+
+    def match(self, t1: DOMTree, t2: DOMTree) -> Dict:
+        m1 = [NO_NODE] * len(t1)
+        m2 = [NO_NODE] * len(t2)
+
+        # 1. Top-down anchors, expanded to every node of each identical subtree
+        for i, j in match_identical_subtrees(t1, t2).items():
+            for k in range(t1.size[i]):
+                m1[i + k] = j + k
+                m2[j + k] = i + k
+
+        # 2. Bottom-up container matching (reverse preorder = children first)
+        if m1[0] == NO_NODE and m2[0] == NO_NODE:
+            m1[0], m2[0] = 0, 0
+        for i in range(len(t1) - 1, 0, -1):
+            if m1[i] != NO_NODE:
+                continue
+            j = self._best_container(t1, t2, i, m1, m2)
+            if j != NO_NODE:
+                m1[i], m2[j] = j, i
+        prune_to_edit_mapping(t1, t2, m1, m2)
+
+        # 3. Recovery among the children of every matched pair, top-down
+        queue = [(i, m1[i]) for i in range(len(t1)) if m1[i] != NO_NODE]
+        while queue:
+            i, j = queue.pop()
+            for ci, cj in self._recover_children(t1, t2, i, j, m1, m2):
+                m1[ci], m2[cj] = cj, ci
+                queue.append((ci, cj))
+        prune_to_edit_mapping(t1, t2, m1, m2)
+
+        return self._to_result(t1, t2, m1, m2)
+
+    def _best_container(self, t1: DOMTree, t2: DOMTree, i: int, m1: List[int], m2: List[int]) -> int:
+        votes: Dict[int, int] = {}
+        for child in t1.children_of(i):
+            partner = m1[child]
+            if partner != NO_NODE:
+                parent = t2.parent[partner]
+                if parent != NO_NODE and m2[parent] == NO_NODE:
+                    votes[parent] = votes.get(parent, 0) + 1
+        if not votes:
+            return NO_NODE
+
+        tag = t1.tag_of(i)
+        best, best_dice = NO_NODE, self.min_dice
+        ranked = sorted(votes, key=lambda j: (-votes[j], j))[:self.MAX_CANDIDATES]
+        for j in ranked:
+            if t2.tag_of(j) != tag:
+                continue
+            dice = self._dice(t1, t2, i, j, m1)
+            if dice >= best_dice:
+                best, best_dice = j, dice
+        return best
+
+    @staticmethod
+    def _dice(t1: DOMTree, t2: DOMTree, i: int, j: int, m1: List[int]) -> float:
+        lo, hi = j + 1, j + t2.size[j]
+        common = 0
+        for d in range(i + 1, i + t1.size[i]):
+            partner = m1[d]
+            if lo <= partner < hi:
+                common += 1
+        total = (t1.size[i] - 1) + (t2.size[j] - 1)
+        return 2 * common / total if total else 0.0
+
+    def _recover_children(self, t1: DOMTree, t2: DOMTree, i: int, j: int, m1: List[int], m2: List[int]) -> List[Tuple[int, int]]:
+        free1 = [c for c in t1.children_of(i) if m1[c] == NO_NODE]
+        if not free1:
+            return []
+        free2 = [c for c in t2.children_of(j) if m2[c] == NO_NODE]
+        if not free2:
+            return []
+
+        by_tag: Dict[str, List[int]] = {}
+        for c in free2:
+            by_tag.setdefault(t2.tag_of(c), []).append(c)
+
+        pairs = []
+        leftover1 = []
+        for c1 in free1:
+            candidates = by_tag.get(t1.tag_of(c1))
+            if not candidates:
+                leftover1.append(c1)
+                continue
+            if len(free1) * len(free2) > self.RECOVERY_PAIR_LIMIT:
+                best = candidates[0]
+            else:
+                view1 = t1.node(c1)
+                best = min(candidates, key=lambda c2: self.config.rename(view1, t2.node(c2)))
+            candidates.remove(best)
+            pairs.append((c1, best))
+
+        paired2 = {c2 for _, c2 in pairs}
+        leftover2 = [c for c in free2 if c not in paired2]
+        for c1, c2 in zip(leftover1, leftover2):
+            v1, v2 = t1.node(c1), t2.node(c2)
+            if self.config.rename(v1, v2) < self.config.delete(v1) + self.config.insert(v2):
+                pairs.append((c1, c2))
+        return pairs
+
+    def _to_result(self, t1: DOMTree, t2: DOMTree, m1: List[int], m2: List[int]) -> Dict:
+        mapping = []
+        distance = 0
+        rename = self.config.rename
+        for i in range(len(t1)):
+            j = m1[i]
+            if j == NO_NODE:
+                v1 = t1.node(i)
+                mapping.append((v1, None))
+                distance += self.config.delete(v1)
+            else:
+                v1, v2 = t1.node(i), t2.node(j)
+                mapping.append((v1, v2))
+                if t1.label_hash[i] != t2.label_hash[j]:
+                    distance += rename(v1, v2)
+        for j in range(len(t2)):
+            if m2[j] == NO_NODE:
+                v2 = t2.node(j)
+                mapping.append((None, v2))
+                distance += self.config.insert(v2)
+        return {
+            "distance": distance,
+            "mapping": mapping
+        }
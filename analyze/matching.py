@@ -0,0 +1,130 @@
+"""
+Hash-based subtree matching helpers shared by the diff engines.
+"""
+import bisect
+from typing import Dict, List, Tuple
+from common.tree import DOMTree, NO_NODE
+
+# How many same-hash candidates to inspect when looking for one under a parent
+# with the same label before settling for the first unclaimed one.
+PARENT_SCAN_LIMIT = 32
+
+
+def match_identical_subtrees(t1: DOMTree, t2: DOMTree, min_size: int = 1) -> Dict[int, int]:
+    """
+    Greedy top-down anchor matching: pairs maximal identical subtrees (equal
+    structural hash) between the two trees. Returns {t1 root index: t2 root
+    index}; descendants of an anchor pair are implied and not listed.
+
+    Repeated subtrees are paired preferring a candidate whose parent has the
+    same label, then document order.
+    """
+    buckets: Dict[int, List[int]] = {}
+    hashes2 = t2.subtree_hash
+    for j in range(len(t2)):
+        buckets.setdefault(hashes2[j], []).append(j)
+
+    claimed = bytearray(len(t2))
+    # Per-bucket offset past the claimed prefix, so long runs of repeated
+    # subtrees (table rows, list items) aren't rescanned for every match.
+    offsets: Dict[int, int] = {}
+    anchors: Dict[int, int] = {}
+    size1, size2 = t1.size, t2.size
+    parent1, parent2 = t1.parent, t2.parent
+    labels1, labels2 = t1.label_hash, t2.label_hash
+
+    i, count = 0, len(t1)
+    while i < count:
+        h = t1.subtree_hash[i]
+        candidates = buckets.get(h) if size1[i] >= min_size else None
+        best = -1
+        if candidates:
+            start = offsets.get(h, 0)
+            while start < len(candidates) and claimed[candidates[start]]:
+                start += 1
+            offsets[h] = start
+            parent_label = labels1[parent1[i]] if parent1[i] >= 0 else None
+            for pos in range(start, min(len(candidates), start + PARENT_SCAN_LIMIT)):
+                j = candidates[pos]
+                if claimed[j]:
+                    continue
+                if best < 0:
+                    best = j
+                p = parent2[j]
+                if parent_label is not None and p >= 0 and labels2[p] == parent_label:
+                    best = j
+                    break
+        if best >= 0:
+            anchors[i] = best
+            claimed[best:best + size2[best]] = b"\x01" * size2[best]
+            i += size1[i]
+        else:
+            i += 1
+    return anchors
+
+
+def paired_subtree_roots(t1: DOMTree, t2: DOMTree, min_size: int = 2) -> Tuple[List[int], List[int]]:
+    """
+    Roots of identical subtrees (at least min_size nodes) paired one-to-one
+    between the trees, as two equally long lists: roots1[k] pairs with
+    roots2[k]. A hash occurring three times on one side and twice on the
+    other yields two pairs. Pairs out of document order with the others are
+    dropped, so all of them fit in a single edit mapping.
+    """
+    anchors = sorted(match_identical_subtrees(t1, t2, min_size).items())
+    keep = _increasing_subsequence([j for _, j in anchors])
+    return [anchors[k][0] for k in keep], [anchors[k][1] for k in keep]
+
+
+def prune_to_edit_mapping(t1: DOMTree, t2: DOMTree, m1: List[int], m2: List[int]):
+    """
+    Drops pairs from a node mapping (m1[i] = j, m2[j] = i, NO_NODE when
+    unmapped) until it is a valid edit mapping: ancestor relations and
+    document order agree on both sides. The cost of such a mapping is the
+    cost of an edit script, so it can never undercut the exact distance; a
+    subtree moved to another parent is left as delete + insert.
+    """
+    _drop_misplaced(t1, t2, m1, m2)
+    _drop_misplaced(t2, t1, m2, m1)
+    pairs = [(i, m1[i]) for i in range(len(t1)) if m1[i] != NO_NODE]
+    keep = set(_increasing_subsequence([j for _, j in pairs]))
+    for k, (i, j) in enumerate(pairs):
+        if k not in keep:
+            m1[i], m2[j] = NO_NODE, NO_NODE
+
+
+def _drop_misplaced(ta: DOMTree, tb: DOMTree, ma: List[int], mb: List[int]):
+    # Preorder sweep: a pair stays only if the nearest mapped ancestor on this
+    # side is mapped to an ancestor of the partner
+    nearest = [NO_NODE] * len(ta)
+    parent, size_b = ta.parent, tb.size
+    for i in range(1, len(ta)):
+        p = parent[i]
+        anchor = nearest[i] = p if ma[p] != NO_NODE else nearest[p]
+        j = ma[i]
+        if j == NO_NODE or anchor == NO_NODE:
+            continue
+        up = ma[anchor]
+        if not up < j < up + size_b[up]:
+            ma[i], mb[j] = NO_NODE, NO_NODE
+
+
+def _increasing_subsequence(values: List[int]) -> List[int]:
+    """Positions of a longest strictly increasing subsequence of values."""
+    tails: List[int] = []       # smallest tail value per subsequence length
+    tail_pos: List[int] = []    # its position in values
+    previous = [-1] * len(values)
+    for pos, value in enumerate(values):
+        k = bisect.bisect_left(tails, value)
+        if k == len(tails):
+            tails.append(value)
+            tail_pos.append(pos)
+        else:
+            tails[k], tail_pos[k] = value, pos
+        previous[pos] = tail_pos[k - 1] if k else -1
+    keep = []
+    pos = tail_pos[-1] if tail_pos else -1
+    while pos >= 0:
+        keep.append(pos)
+        pos = previous[pos]
+    return keep[::-1]
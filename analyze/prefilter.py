@@ -0,0 +1,192 @@
+"""
+Cheap candidate pre-filter for semantic recovery.
+
+Ranks the nodes of the new tree as candidates for a lost node using
+structural and lexical signals only, so just the top-N go to MarkupLM:
+
+  - tag and ARIA role compatibility,
+  - attribute token overlap (Jaccard over id / class / name / ... tokens),
+  - SimHash distance of the node's own token text,
+  - tree position (relative preorder position and depth).
+
+Indexes are built once per tree; scoring a lost node touches only the nodes
+that share its tag, role or an attribute token.
+"""
+import re
+from typing import Dict, List, Sequence, Set, Tuple
+import numpy as np
+from common.tree import DOMTree, NodeView, NO_NODE
+from common.simhash import SimHash
+
+_ATTR_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Attributes whose values carry identity; style/script noise is left out
+TOKEN_ATTRIBUTES = ("id", "class", "name", "type", "role", "aria-label", "placeholder",
+                    "title", "alt", "href", "for", "value", "data-testid", "data-test", "data-qa")
+
+# Score weights; a perfect candidate scores their sum
+WEIGHTS = {
+    "tag": 2.0,
+    "role": 1.0,
+    "attributes": 3.0,
+    "text": 1.5,
+    "position": 1.0,
+}
+
+
+def attribute_tokens(tree: DOMTree, index: int) -> Set[str]:
+    tokens = set()
+    for name in TOKEN_ATTRIBUTES:
+        value = tree.get_attr(index, name)
+        if value:
+            tokens.update(f"{name}:{t}" for t in _ATTR_TOKEN_RE.findall(str(value).lower()))
+    return tokens
+
+
+class TreeFeatures:
+    """Per-tree arrays and inverted indexes the pre-filter scores against."""
+
+    def __init__(self, tree: DOMTree, sim: SimHash = None):
+        self.tree = tree
+        count = len(tree)
+        sim = sim or SimHash()
+        self.fingerprints = sim.compute_batch(tree.token_text(i) for i in range(count))
+
+        depth = np.zeros(count, dtype=np.int32)
+        parent = tree.parent
+        for i in range(1, count):
+            depth[i] = depth[parent[i]] + 1
+        self.depth = depth
+        self.max_depth = max(1, int(depth.max())) if count else 1
+        self.position = np.arange(count, dtype=np.float64) / max(1, count - 1)
+
+        self.tag_ids = np.frombuffer(tree.tag_ids, dtype=np.int32)
+        self.by_tag: Dict[str, List[int]] = {}
+        self.by_role: Dict[str, List[int]] = {}
+        self.by_token: Dict[str, np.ndarray] = {}
+        # Role codes per node: -1 without a role, else an index into role_codes
+        self.role_codes: Dict[str, int] = {}
+        self.roles = np.full(count, -1, dtype=np.int32)
+        self.tokens: List[Set[str]] = []
+        self.token_count = np.zeros(count, dtype=np.int32)
+        postings: Dict[str, List[int]] = {}
+        for i in range(count):
+            self.by_tag.setdefault(tree.tag_of(i), []).append(i)
+            role = tree.get_attr(i, "role")
+            if role:
+                self.by_role.setdefault(role, []).append(i)
+                self.roles[i] = self.role_codes.setdefault(role, len(self.role_codes))
+            tokens = attribute_tokens(tree, i)
+            self.tokens.append(tokens)
+            self.token_count[i] = len(tokens)
+            for token in tokens:
+                postings.setdefault(token, []).append(i)
+        self.by_token = {token: np.asarray(ids, dtype=np.int64) for token, ids in postings.items()}
+
+
+class CandidateFilter:
+    """
+    Ranks new-tree candidates for nodes lost from the old tree.
+
+    Build once per (old, new) tree pair; candidates() is then cheap per lost
+    node. average_pool_size() reports how many nodes were actually scored
+    per lost node, and recall() how often a reference answer survived.
+    """
+    # Attribute tokens shared by more nodes than this are too common to
+    # seed the candidate pool on their own (e.g. class:item)
+    MAX_TOKEN_POSTINGS = 2000
+
+    def __init__(self, old_tree: DOMTree, new_tree: DOMTree, weights: Dict[str, float] = None):
+        self.old = TreeFeatures(old_tree)
+        self.new = TreeFeatures(new_tree)
+        self.weights = dict(WEIGHTS, **(weights or {}))
+        # Nodes scored per candidates() call
+        self.pool_sizes: List[int] = []
+
+    def _pool(self, index: int) -> np.ndarray:
+        """New-tree nodes sharing the lost node's tag, role or an attribute token."""
+        old, new = self.old, self.new
+        parts = [np.asarray(new.by_tag.get(old.tree.tag_of(index), ()), dtype=np.int64)]
+        role = old.tree.get_attr(index, "role")
+        if role:
+            parts.append(np.asarray(new.by_role.get(role, ()), dtype=np.int64))
+        for token in old.tokens[index]:
+            postings = new.by_token.get(token)
+            if postings is not None and len(postings) <= self.MAX_TOKEN_POSTINGS:
+                parts.append(postings)
+        return np.unique(np.concatenate(parts))
+
+    def scores(self, index: int, pool: np.ndarray) -> np.ndarray:
+        """Weighted compatibility of old node `index` with each node in pool."""
+        old, new, w = self.old, self.new, self.weights
+        tag = old.tree.tag_of(index)
+        role = old.tree.get_attr(index, "role")
+        lost_tokens = old.tokens[index]
+
+        tag_match = (new.tag_ids[pool] == new.tree._tag_ids.get(tag, -1)).astype(np.float64)
+        role_code = new.role_codes.get(role, -2) if role else -1
+        role_match = (new.roles[pool] == role_code).astype(np.float64)
+        if lost_tokens:
+            # Intersections by binary search of the (sorted) postings lists
+            # over the pool only, unions from token counts
+            inter = np.zeros(len(pool), dtype=np.float64)
+            for token in lost_tokens:
+                postings = new.by_token.get(token)
+                if postings is not None:
+                    at = np.minimum(np.searchsorted(postings, pool), len(postings) - 1)
+                    inter += postings[at] == pool
+            overlap = inter / (len(lost_tokens) + new.token_count[pool] - inter)
+        else:
+            overlap = (new.token_count[pool] == 0).astype(np.float64)
+        text = 1.0 - SimHash.hamming_one_to_many(int(old.fingerprints[index]), new.fingerprints[pool]) / 64.0
+        position = 1.0 - np.minimum(1.0, np.abs(new.position[pool] - old.position[index]) * 2
+                                    + np.abs(new.depth[pool] - old.depth[index]) / new.max_depth)
+        return (w["tag"] * tag_match + w["role"] * role_match + w["attributes"] * overlap
+                + w["text"] * text + w["position"] * position)
+
+    def candidates(self, lost: NodeView, top_n: int = 50) -> List[Tuple[int, float]]:
+        """The top_n new-tree indices for a lost old-tree node, best first."""
+        index = lost.index if isinstance(lost, NodeView) else lost
+        pool = self._pool(index)
+        if len(pool) < top_n:
+            # Too few structural matches: fall back to the whole tree
+            pool = np.arange(len(self.new.tree), dtype=np.int64)
+        self.pool_sizes.append(len(pool))
+        if not len(pool):
+            return []
+        scores = self.scores(index, pool)
+        take = min(top_n, len(pool))
+        best = np.argpartition(-scores, take - 1)[:take]
+        best = best[np.lexsort((pool[best], -scores[best]))]
+        return [(int(pool[b]), float(scores[b])) for b in best]
+
+    def candidates_many(self, lost_nodes: Sequence[NodeView], top_n: int = 50) -> List[List[Tuple[int, float]]]:
+        return [self.candidates(node, top_n) for node in lost_nodes]
+
+    def average_pool_size(self) -> float:
+        """Mean number of new-tree nodes scored per candidates() call so far."""
+        return float(np.mean(self.pool_sizes)) if self.pool_sizes else 0.0
+
+    def exhaustive_best(self, lost: NodeView) -> int:
+        """Best-scoring node of the whole new tree, without the pool pruning."""
+        index = lost.index if isinstance(lost, NodeView) else lost
+        if not len(self.new.tree):
+            return NO_NODE
+        everything = np.arange(len(self.new.tree), dtype=np.int64)
+        scores = self.scores(index, everything)
+        return int(everything[np.lexsort((everything, -scores))[0]])
+
+    @staticmethod
+    def recall(filtered: Sequence[Sequence[Tuple[int, float]]], reference: Sequence[int]) -> float:
+        """
+        Fraction of lost nodes whose reference match (new-tree index, e.g.
+        exhaustive_best() or a known counterpart; NO_NODE when there is
+        none) survived the filter.
+        """
+        checked = kept = 0
+        for candidates, best in zip(filtered, reference):
+            if best == NO_NODE:
+                continue
+            checked += 1
+            kept += any(j == best for j, _ in candidates)
+        return kept / checked if checked else 1.0
@@ -1,32 +1,212 @@
-import torch
-from transformers import MarkupLMProcessor, MarkupLMModel
+import os
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+
+# torch / transformers are imported on first use: importing this module (and
+# constructing SemanticRecovery) must stay cheap for runs that never recover.
+
+DEFAULT_MODEL = "microsoft/markuplm-base"
+# Offline runners point this at a local copy of the model (save_pretrained layout)
+MODEL_DIR_ENV = "PLR_MARKUPLM_DIR"
+# MarkupLM's position embeddings cap every sequence at 512 tokens
+MAX_LENGTH = 512
+# Token overlap between consecutive windows of a page-level pass
+PAGE_STRIDE = 128
+
+# Process-wide warm cache: (model path, quantized) -> (processor, model)
+_MODELS: Dict[Tuple[str, bool], tuple] = {}
+_MODELS_LOCK = threading.Lock()
+
+def configure_threads(num_threads: Optional[int] = None, interop_threads: Optional[int] = None):
+    """
+    CPU thread tuning for the runners. torch only accepts the inter-op setting
+    before its first parallel region, so a late call keeps the current value.
+    """
+    import torch
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            print(f"Warning: inter-op threads already fixed at {torch.get_num_interop_threads()}: {e}")
+
+def load_model(model_dir: Optional[str] = None, quantize: bool = False):
+    """
+    Returns the shared (processor, model) pair, loading it on first call.
+
+    A local model_dir (or $PLR_MARKUPLM_DIR) is read with local_files_only, so
+    offline runs never reach the hub. quantize applies dynamic int8
+    quantization to the Linear layers for faster CPU inference.
+    """
+    path = model_dir or os.environ.get(MODEL_DIR_ENV) or DEFAULT_MODEL
+    key = (path, quantize)
+    cached = _MODELS.get(key)
+    if cached is not None:
+        return cached
+    with _MODELS_LOCK:
+        cached = _MODELS.get(key)
+        if cached is None:
+            import torch
+            from transformers import MarkupLMProcessor, MarkupLMModel
+            local = os.path.isdir(path)
+            processor = MarkupLMProcessor.from_pretrained(path, local_files_only=local)
+            model = MarkupLMModel.from_pretrained(path, local_files_only=local)
+            model.eval()
+            if quantize:
+                model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            cached = _MODELS[key] = (processor, model)
+    return cached
 
 class SemanticRecovery:
-    def __init__(self):
-        # Initialize MarkupLM (using a small version or default)
-        # In a real scenario, we'd ensure weights are downloaded.
+    def __init__(self, batch_size: int = 16, num_threads: Optional[int] = None, interop_threads: Optional[int] = None,
+                 model_dir: Optional[str] = None, quantize: bool = False,
+                 cache_dir: Optional[str] = ".plr_cache/embeddings", cache_mb: int = 256):
+        self.batch_size = batch_size
+        self.model_dir = model_dir
+        self.quantize = quantize
+        self.cache_dir = cache_dir
+        self.cache_mb = cache_mb
+        self.cache = None
+        self._threads = (num_threads, interop_threads)
+        self._processor = None
+        self._model = None
+        self._load_failed = False
+
+    def _ensure_loaded(self):
+        # Initialize MarkupLM on the first embedding request
+        if self._model is not None or self._load_failed:
+            return
         try:
-            self.processor = MarkupLMProcessor.from_pretrained("microsoft/markuplm-base")
-            self.model = MarkupLMModel.from_pretrained("microsoft/markuplm-base")
+            configure_threads(*self._threads)
+            self._processor, self._model = load_model(self.model_dir, self.quantize)
         except Exception as e:
             print(f"Warning: MarkupLM not loaded. Semantic features will be disabled. Error: {e}")
-            self.model = None
+            self._load_failed = True
+            return
+        if self.cache_dir:
+            # Namespaced by model and revision so upgrades never serve stale vectors
+            from analyze.cache import EmbeddingCache
+            config = self._model.config
+            model_id = f"{config.name_or_path}{':int8' if self.quantize else ''}"
+            self.cache = EmbeddingCache(self.cache_dir, model_id, getattr(config, "_commit_hash", None) or "",
+                                        max_bytes=self.cache_mb * 1024 * 1024)
+
+    @property
+    def processor(self):
+        self._ensure_loaded()
+        return self._processor
+
+    @property
+    def model(self):
+        self._ensure_loaded()
+        return self._model
 
     def get_node_embedding(self, html_string: str, xpath: str = None):
         if not self.model:
             return None
-            
-        # MarkupLM inputs: HTML string, plus optional XPaths/Indices to focus on specific nodes
-        # Ideally, we pass the whole page segment or parents.
-        # For this prototype, we'll process the snippet.
-        
-        inputs = self.processor(html_string, return_tensors="pt")
-        
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-        
-        # Use the CLS token or pooler output as the representation
-        return outputs.pooler_output[0]
+        return self.embed_batch([html_string])[0]
+
+    def embed_batch(self, html_strings: Sequence[str], batch_size: int = None) -> Optional['torch.Tensor']:
+        """
+        Embeds many HTML snippets with padded forward passes of batch_size
+        snippets each. Returns an (len(html_strings), hidden) tensor of pooler
+        outputs in input order. Snippets already in the embedding cache skip
+        the model.
+        """
+        if not self.model:
+            return None
+        if self.cache is None:
+            return self._embed_uncached(html_strings, batch_size)
+
+        import torch
+        if not html_strings:
+            return torch.empty((0, self.model.config.hidden_size))
+        keys = [self.cache.key(html) for html in html_strings]
+        found = self.cache.get_many(keys)
+        misses = [k for k in range(len(keys)) if keys[k] not in found]
+        # Duplicate snippets within the batch are embedded once
+        first_miss = {}
+        for k in misses:
+            first_miss.setdefault(keys[k], k)
+        if first_miss:
+            todo = list(first_miss.values())
+            vectors = self._embed_uncached([html_strings[k] for k in todo], batch_size)
+            self.cache.put_many([keys[k] for k in todo], vectors.numpy())
+            self.cache.flush()
+            for k, vector in zip(todo, vectors):
+                found[keys[k]] = vector
+        # Cached rows come back as float16-rounded float32
+        return torch.stack([torch.as_tensor(found[key], dtype=torch.float32) for key in keys])
+
+    def _embed_uncached(self, html_strings: Sequence[str], batch_size: int = None) -> 'torch.Tensor':
+        import torch
+        batch_size = batch_size or self.batch_size
+        # Similar lengths share a batch so little of each batch is padding
+        order = sorted(range(len(html_strings)), key=lambda k: len(html_strings[k]))
+        out = torch.empty((len(html_strings), self.model.config.hidden_size))
+        with torch.inference_mode():
+            for start in range(0, len(order), batch_size):
+                chunk = order[start:start + batch_size]
+                inputs = self.processor(
+                    [html_strings[k] for k in chunk],
+                    padding=True, truncation=True, max_length=MAX_LENGTH, return_tensors="pt"
+                )
+                # Use the CLS token or pooler output as the representation
+                out[chunk] = self.model(**inputs).pooler_output
+        return out
+
+    def embed_page(self, html_string: str, xpaths: Sequence[str], batch_size: int = None) -> Dict[str, Optional['torch.Tensor']]:
+        """
+        Embeds many nodes of one page with a single page-level pass.
+
+        The page is tokenized once (split into overlapping 512-token windows
+        when longer) and token states are mean-pooled per element: a requested
+        xpath pools every text node at or below it. xpaths use MarkupLM's own
+        form, /html/body/div[2]/span, with an index only among same-tag
+        siblings. Elements without text map to None.
+        """
+        if not self.model:
+            return {xpath: None for xpath in xpaths}
+        import torch
+        batch_size = batch_size or self.batch_size
+
+        features = self.processor.feature_extractor(html_string)
+        nodes, node_xpaths = features["nodes"][0], features["xpaths"][0]
+        if not nodes:
+            return {xpath: None for xpath in xpaths}
+        encoding = self.processor.tokenizer(
+            nodes, xpaths=node_xpaths, padding=True, truncation=True, max_length=MAX_LENGTH,
+            stride=PAGE_STRIDE, return_overflowing_tokens=True, return_tensors="pt"
+        )
+        encoding.pop("overflow_to_sample_mapping", None)
+
+        hidden = self.model.config.hidden_size
+        sums = torch.zeros((len(nodes), hidden))
+        counts = torch.zeros(len(nodes))
+        windows = encoding["input_ids"].shape[0]
+        with torch.inference_mode():
+            for start in range(0, windows, batch_size):
+                batch = {key: value[start:start + batch_size] for key, value in encoding.items()}
+                states = self.model(**batch).last_hidden_state
+                for offset in range(states.shape[0]):
+                    word_ids = encoding.word_ids(start + offset)
+                    positions = [p for p, w in enumerate(word_ids) if w is not None]
+                    if not positions:
+                        continue
+                    owners = torch.tensor([word_ids[p] for p in positions])
+                    sums.index_add_(0, owners, states[offset, positions])
+                    counts.index_add_(0, owners, torch.ones(len(positions)))
+
+        result = {}
+        for xpath in xpaths:
+            prefix = xpath + "/"
+            members = [k for k, x in enumerate(node_xpaths) if (x == xpath or x.startswith(prefix)) and counts[k] > 0]
+            if not members:
+                result[xpath] = None
+                continue
+            result[xpath] = sums[members].sum(dim=0) / counts[members].sum()
+        return result
 
     def find_best_match(self, deleted_node_repr, candidate_nodes):
         """
@@ -34,24 +214,68 @@ class SemanticRecovery:
         deleted_node_repr: Vector/Encoding of the lost node
         candidate_nodes: List of (Node, Vector) tuples
         """
-        import torch.nn.functional as F
-        
         if not candidate_nodes or deleted_node_repr is None:
             return None
-            
-        best_score = -1
-        best_node = None
-        
-        ref_vec = deleted_node_repr
-        
-        for node, vec in candidate_nodes:
-            if vec is None: continue
-            
-            # Cosine similarity
-            score = F.cosine_similarity(ref_vec.unsqueeze(0), vec.unsqueeze(0)).item()
-            
-            if score > best_score:
-                best_score = score
-                best_node = node
-                
-        return best_node, best_score
+        matches = self.find_best_matches([deleted_node_repr], candidate_nodes)[0]
+        return matches[0] if matches else (None, -1)
+
+    def find_best_matches(self, deleted_node_reprs, candidate_nodes, k: int = 1, index: 'VectorIndex' = None):
+        """
+        Top-k semantic matches for many deleted nodes at once: candidate
+        vectors are stacked into one normalized matrix and every deleted node
+        is scored with a single matrix multiply. Returns, per deleted node, a
+        list of (Node, cosine score), best first.
+
+        Pass a prebuilt (possibly IVF-trained or persisted) VectorIndex whose
+        keys are the candidate nodes to skip re-stacking candidate_nodes.
+        """
+        from analyze.vector_index import VectorIndex
+        if index is None:
+            index = VectorIndex()
+            usable = [(node, vec) for node, vec in candidate_nodes if vec is not None]
+            if usable:
+                index.add([node for node, _ in usable], [_to_numpy(vec) for _, vec in usable])
+        results = [[] for _ in deleted_node_reprs]
+        queries = [q for q, vec in enumerate(deleted_node_reprs) if vec is not None]
+        if queries:
+            matches = index.best_matches([_to_numpy(deleted_node_reprs[q]) for q in queries], k=k)
+            for q, match in zip(queries, matches):
+                results[q] = match
+        return results
+
+    def recover(self, lost_nodes, candidate_filter, top_n: int = 50):
+        """
+        Best semantic match in the new tree for each lost old-tree NodeView.
+        Only the candidate_filter's top_n candidates per lost node are
+        embedded (each distinct snippet once). Returns (NodeView, score) or
+        None per lost node.
+        """
+        if not self.model or not lost_nodes:
+            return [None] * len(lost_nodes)
+        import numpy as np
+        new_tree = candidate_filter.new.tree
+        shortlists = candidate_filter.candidates_many(lost_nodes, top_n)
+        rows = {j: r for r, j in enumerate(sorted({j for shortlist in shortlists for j, _ in shortlist}))}
+        if not rows:
+            return [None] * len(lost_nodes)
+
+        candidates = _to_numpy(self.embed_batch([new_tree.outer_html(j) for j in rows]))
+        lost = _to_numpy(self.embed_batch([node.tree.outer_html(node.index) for node in lost_nodes]))
+        candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+        lost = lost / np.maximum(np.linalg.norm(lost, axis=1, keepdims=True), 1e-12)
+
+        results = []
+        for q, shortlist in enumerate(shortlists):
+            if not shortlist:
+                results.append(None)
+                continue
+            picked = [rows[j] for j, _ in shortlist]
+            scores = candidates[picked] @ lost[q]
+            best = int(np.argmax(scores))
+            results.append((new_tree.node(shortlist[best][0]), float(scores[best])))
+        return results
+
+def _to_numpy(vector):
+    if hasattr(vector, "detach"):
+        return vector.detach().cpu().numpy()
+    return vector
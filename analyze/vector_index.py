@@ -0,0 +1,198 @@
+"""
+Cosine top-k search over node embeddings.
+
+Vectors are L2-normalized into one float32 matrix, so cosine similarity for
+a whole batch of queries is a single matrix multiply. Large indexes can be
+trained into an inverted-file (IVF) layout: vectors are clustered by
+spherical k-means and a query only scores the nprobe closest clusters.
+"""
+import json
+import os
+from typing import Any, List, Optional, Sequence, Tuple
+import numpy as np
+
+def _as_matrix(vectors) -> np.ndarray:
+    """float32 (n, dim) array from numpy / torch / nested sequences."""
+    if hasattr(vectors, "detach"):
+        vectors = vectors.detach().cpu().numpy()
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix.reshape(1, -1) if matrix.ndim == 1 else matrix
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorIndex:
+    """
+    Flat (exact) cosine index with an optional IVF layout for large sets.
+
+    keys are arbitrary payloads (e.g. NodeViews) returned by best_matches().
+    save()/load() persist the index as a NumPy .npz file for lookups across
+    builds; keys must then be JSON-serializable (xpaths, snippet hashes).
+    """
+    # Queries scored per matrix multiply; bounds the (queries, n) score block
+    QUERY_CHUNK = 256
+    # Below this many vectors train_ivf() keeps the flat layout
+    IVF_MIN_VECTORS = 4096
+    KMEANS_ITERATIONS = 8
+
+    def __init__(self, dim: Optional[int] = None):
+        self.dim = dim
+        self.keys: List[Any] = []
+        self._vectors = np.zeros((0, dim or 0), dtype=np.float32)
+        self._pending: List[np.ndarray] = []
+        # IVF state: centroids and, per cluster, a [start, end) row range
+        self.centroids: Optional[np.ndarray] = None
+        self._list_bounds: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, keys: Sequence[Any], vectors):
+        """Adds one normalized row per key. Adding drops an IVF layout."""
+        matrix = _as_matrix(vectors)
+        if len(keys) != len(matrix):
+            raise ValueError(f"{len(keys)} keys for {len(matrix)} vectors")
+        if not len(keys):
+            return
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+            self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f"VectorIndex holds {self.dim}-d vectors, got {matrix.shape[1]}-d")
+        self.keys.extend(keys)
+        self._pending.append(_normalize(matrix))
+        self.centroids = self._list_bounds = None
+
+    @property
+    def vectors(self) -> np.ndarray:
+        if self._pending:
+            self._vectors = np.concatenate([self._vectors] + self._pending)
+            self._pending = []
+        return self._vectors
+
+    def train_ivf(self, nlist: Optional[int] = None, seed: int = 0):
+        """
+        Clusters the vectors into nlist inverted lists (default ~sqrt(n)) and
+        reorders rows so each list is a contiguous slice.
+        """
+        vectors = self.vectors
+        if len(vectors) < self.IVF_MIN_VECTORS:
+            return
+        nlist = nlist or int(np.sqrt(len(vectors)))
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(self.KMEANS_ITERATIONS):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=nlist) == 0
+            # Empty clusters keep their previous centroid
+            sums[empty] = centroids[empty]
+            centroids = _normalize(sums)
+
+        assign = np.concatenate([
+            np.argmax(vectors[start:start + self.QUERY_CHUNK * 16] @ centroids.T, axis=1)
+            for start in range(0, len(vectors), self.QUERY_CHUNK * 16)
+        ])
+        order = np.argsort(assign, kind="stable")
+        self._vectors = vectors[order]
+        self.keys = [self.keys[k] for k in order]
+        counts = np.bincount(assign, minlength=nlist)
+        ends = np.cumsum(counts)
+        self._list_bounds = np.stack([ends - counts, ends], axis=1)
+        self.centroids = centroids
+
+    def search(self, queries, k: int = 1, nprobe: int = 8) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k rows by cosine similarity for each query. Returns (scores,
+        rows), both (n_queries, k), best first; rows index self.keys, and
+        missing results (fewer than k vectors reachable) are -1 with score
+        -inf. An IVF index scores only the nprobe nearest lists per query.
+        """
+        queries = _normalize(_as_matrix(queries))
+        vectors = self.vectors
+        k = max(1, k)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        if not len(vectors) or not len(queries):
+            return scores, rows
+        if self.centroids is None:
+            for start in range(0, len(queries), self.QUERY_CHUNK):
+                block = queries[start:start + self.QUERY_CHUNK] @ vectors.T
+                self._top_k(block, 0, k, scores[start:start + self.QUERY_CHUNK], rows[start:start + self.QUERY_CHUNK])
+            return scores, rows
+
+        nprobe = min(nprobe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        # Group queries by probed list, then score list by list so each list
+        # is one contiguous matrix multiply
+        flat = probes.ravel()
+        order = np.argsort(flat, kind="stable")
+        query_ids = np.repeat(np.arange(len(queries)), nprobe)[order]
+        clusters, first = np.unique(flat[order], return_index=True)
+        for cluster, members in zip(clusters, np.split(query_ids, first[1:])):
+            start, end = self._list_bounds[cluster]
+            if start == end:
+                continue
+            block = queries[members] @ vectors[start:end].T
+            self._top_k(block, start, k, scores, rows, members)
+        return scores, rows
+
+    @staticmethod
+    def _top_k(block: np.ndarray, offset: int, k: int, scores: np.ndarray, rows: np.ndarray, members=None):
+        """Merges the top k of each block row into the running (scores, rows)."""
+        take = min(k, block.shape[1])
+        if take == 1:
+            local = np.argmax(block, axis=1)[:, None]
+        else:
+            local = np.argpartition(-block, take - 1, axis=1)[:, :take]
+        local_scores = np.take_along_axis(block, local, axis=1)
+        target = slice(None) if members is None else members
+        merged_scores = np.concatenate([scores[target], local_scores], axis=1)
+        merged_rows = np.concatenate([rows[target], local + offset], axis=1)
+        best = np.argsort(-merged_scores, axis=1, kind="stable")[:, :k]
+        scores[target] = np.take_along_axis(merged_scores, best, axis=1)
+        rows[target] = np.take_along_axis(merged_rows, best, axis=1)
+
+    def save(self, path: str):
+        """Writes the index to path (.npz) atomically."""
+        vectors = self.vectors
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            vectors=vectors,
+            keys=np.array(json.dumps(self.keys)),
+            centroids=self.centroids if self.centroids is not None else np.zeros((0, vectors.shape[1]), np.float32),
+            list_bounds=self._list_bounds if self._list_bounds is not None else np.zeros((0, 2), np.int64),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'VectorIndex':
+        """Reads an index written by save(); a missing file gives an empty index."""
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as data:
+            vectors = data["vectors"]
+            index = cls(vectors.shape[1])
+            index._vectors = vectors
+            index.keys = [tuple(k) if isinstance(k, list) else k for k in json.loads(str(data["keys"]))]
+            if len(data["centroids"]):
+                index.centroids = data["centroids"]
+                index._list_bounds = data["list_bounds"]
+        return index
+
+    def best_matches(self, queries, k: int = 1, nprobe: int = 8) -> List[List[Tuple[Any, float]]]:
+        """search() resolved to [(key, score), ...] per query, best first."""
+        scores, rows = self.search(queries, k, nprobe)
+        return [
+            [(self.keys[r], float(s)) for r, s in zip(row, score) if r >= 0]
+            for row, score in zip(rows, scores)
+        ]
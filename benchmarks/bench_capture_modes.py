@@ -0,0 +1,60 @@
+"""
+Capture-to-tree cost of the two DOMCapturer modes on large pages, from the
+payload the browser hands back to a built DOMTree:
+
+  serialize: nested serializeNode JSON -> json.loads -> DOMTree.from_json
+  cdp:       DOMSnapshot.captureSnapshot JSON -> json.loads ->
+             DOMTree.from_capture
+
+Both clean dynamic attributes during the build, as main.py does. That the
+two modes build identical trees is checked by verify_capture_modes.py.
+
+In-browser time (the JS walk vs. the CDP snapshot) needs a live browser and
+is not included; payload size is the proxy for the transfer between them.
+
+    python -m benchmarks.bench_capture_modes [--sizes 10000 100000 300000]
+"""
+import argparse
+import json
+import time
+
+from common.tree import DOMTree
+from ingest.cleaner import DOMCleaner
+from benchmarks.synthetic import make_snapshot, to_cdp_snapshot
+
+
+def _best(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(sizes=(10_000, 100_000, 300_000), repeat: int = 3):
+    cleaner = DOMCleaner()
+    print(f"{'nodes':>8} | {'mode':<9} | {'payload':>9} | {'json.loads':>10} | {'clean+build':>11} | {'total':>9}")
+    for size in sizes:
+        snapshot = make_snapshot(size)
+        payloads = {
+            "serialize": json.dumps(snapshot),
+            "cdp": json.dumps({"cdp_snapshot": to_cdp_snapshot(snapshot)}),
+        }
+        builders = {
+            "serialize": lambda data: DOMTree.from_json(data, cleaner=cleaner),
+            "cdp": lambda data: DOMTree.from_capture(data, cleaner=cleaner),
+        }
+        for mode, payload in payloads.items():
+            parse, data = _best(lambda: json.loads(payload), repeat)
+            build, _ = _best(lambda: builders[mode](data), repeat)
+            print(f"{size:>8} | {mode:<9} | {len(payload) / 1e6:>6.1f} MB | {parse * 1000:>7.0f} ms | "
+                  f"{build * 1000:>8.0f} ms | {(parse + build) * 1000:>6.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Capture mode payload and tree-build benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 300_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
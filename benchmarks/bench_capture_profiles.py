@@ -0,0 +1,72 @@
+"""
+Bytes and milliseconds saved per DOMCapturer profile, relative to "full".
+
+Live (needs Playwright and a browser): captures --url under each profile,
+with and without resource blocking, and reports per-step timings and
+payload bytes from the snapshots' capture_stats.
+
+    python -m benchmarks.bench_capture_profiles --url https://example.com [--repeat 3]
+
+Offline: splits a stored "full" capture (default last_snapshot.json) into
+the parts each profile would keep and reports bytes only.
+
+    python -m benchmarks.bench_capture_profiles [--snapshot last_snapshot.json]
+"""
+import argparse
+import asyncio
+import json
+
+# Snapshot parts each profile keeps; mirrors ingest.capture.CAPTURE_PROFILES
+# (kept here so the offline report runs without Playwright installed)
+PROFILE_PARTS = {
+    "minimal": ("dom_structure",),
+    "diff": ("dom_structure",),
+    "recovery": ("dom_structure", "ax_tree", "html_content"),
+    "full": ("dom_structure", "raw_structure", "ax_tree", "html_content"),
+}
+
+
+def offline(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        snapshot = json.load(f)
+    sizes = {k: len(json.dumps(v)) for k, v in snapshot.items()}
+    full = sum(sizes.get(part, 0) for part in PROFILE_PARTS["full"])
+    print(f"{path}: " + ", ".join(f"{k} {v / 1024:.1f} KiB" for k, v in sizes.items() if k in PROFILE_PARTS["full"]))
+    print(f"{'profile':<9} | {'bytes':>10} | {'saved vs full':>13}")
+    for profile, parts in PROFILE_PARTS.items():
+        total = sum(sizes.get(part, 0) for part in parts)
+        print(f"{profile:<9} | {total:>10} | {(full - total) / max(1, full):>12.0%}")
+
+
+async def live(url: str, repeat: int):
+    from ingest.capture import DOMCapturer, CAPTURE_PROFILES
+    rows = []
+    for block in (False, True):
+        for profile in CAPTURE_PROFILES:
+            async with DOMCapturer(profile=profile, block_resources=block, measure=True) as capturer:
+                await capturer.capture_page(url)  # warm the browser and HTTP cache
+                best = None
+                for _ in range(repeat):
+                    stats = (await capturer.capture_page(url))["capture_stats"]
+                    if best is None or sum(stats["ms"].values()) < sum(best["ms"].values()):
+                        best = stats
+            rows.append((profile, block, sum(best["ms"].values()), sum(best["bytes"].values()), best["ms"]))
+
+    full_ms, full_bytes = next((ms, size) for profile, block, ms, size, _ in rows if profile == "full" and not block)
+    print(f"{'profile':<9} | {'block':<5} | {'ms':>8} | {'saved ms':>8} | {'bytes':>10} | {'saved bytes':>11} | steps")
+    for profile, block, ms, size, steps in rows:
+        detail = ", ".join(f"{k} {v:.0f}" for k, v in steps.items())
+        print(f"{profile:<9} | {str(block):<5} | {ms:>8.0f} | {full_ms - ms:>8.0f} | {size:>10} | "
+              f"{full_bytes - size:>11} | {detail}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Capture profile payload and timing report")
+    parser.add_argument("--url", default=None, help="Capture this page live under each profile")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--snapshot", default="last_snapshot.json", help="Stored full capture for the offline report")
+    args = parser.parse_args()
+    if args.url:
+        asyncio.run(live(args.url, args.repeat))
+    else:
+        offline(args.snapshot)
@@ -0,0 +1,85 @@
+"""
+Dynamic-attribute cleaning on large snapshots: the previous DOMCleaner (six
+regexes tried per attribute on a deepcopy of the snapshot, then the tree
+build) against DOMCleaner passed to the tree builders as a filter (one
+alternation, memoized per attribute name, no copy and no extra walk).
+
+    python -m benchmarks.bench_cleaner [--sizes 10000 100000 300000]
+"""
+import argparse
+import copy
+import json
+import re
+import time
+
+from common.tree import DOMTree
+from ingest.cleaner import DOMCleaner
+from benchmarks.synthetic import make_snapshot, to_cdp_snapshot
+
+
+class LegacyCleaner:
+    """The pre-fusion DOMCleaner.clean path, kept here as the baseline."""
+    def __init__(self):
+        self.compiled_patterns = [re.compile(p) for p in (
+            r'^data-reactid$', r'^ng-content-.*$', r'^_ngcontent-.*$',
+            r'^data-v-.*$', r'^ember\d+$', r'^react-id.*$',
+        )]
+
+    def clean(self, dom_node):
+        node = copy.deepcopy(dom_node)
+        self._clean_recursive(node)
+        return node
+
+    def _clean_recursive(self, node):
+        if node.get('attributes'):
+            for key in [k for k in node['attributes'] if any(p.match(k) for p in self.compiled_patterns)]:
+                del node['attributes'][key]
+        for child in node.get('children', ()):
+            self._clean_recursive(child)
+        if 'shadowRoot' in node:
+            self._clean_recursive(node['shadowRoot'])
+
+
+def _best(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _count_dynamic(tree: DOMTree, cleaner: DOMCleaner) -> int:
+    names = tree.attr_names
+    return sum(1 for keys in tree.attr_keys for k in keys if cleaner.is_dynamic_name(names[k]))
+
+
+def run(sizes=(10_000, 100_000, 300_000), repeat: int = 3):
+    legacy = LegacyCleaner()
+    print(f"{'nodes':>8} | {'path':<30} | {'time':>9} | {'speedup':>7}")
+    for size in sizes:
+        snapshot = make_snapshot(size)
+        cdp = json.loads(json.dumps(to_cdp_snapshot(snapshot)))
+        paths = {
+            "deepcopy + clean + from_json": lambda: DOMTree.from_json(legacy.clean(snapshot)),
+            "from_json(cleaner=)": lambda: DOMTree.from_json(snapshot, cleaner=DOMCleaner()),
+            "from_cdp_snapshot(cleaner=)": lambda: DOMTree.from_cdp_snapshot(cdp, cleaner=DOMCleaner()),
+        }
+        baseline, hashes = None, set()
+        for label, fn in paths.items():
+            seconds, tree = _best(fn, repeat)
+            baseline = baseline or seconds
+            hashes.add(tree.root_hash)
+            leftover = _count_dynamic(tree, DOMCleaner())
+            print(f"{size:>8} | {label:<30} | {seconds * 1000:>6.0f} ms | {baseline / seconds:>6.1f}x"
+                  + (f"  ! {leftover} dynamic attributes left" if leftover else ""))
+        if len(hashes) != 1:
+            print("  ! trees differ between paths")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DOM cleaning benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 300_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
@@ -0,0 +1,77 @@
+"""
+MarkupLM embedding throughput (nodes per second) for SemanticRecovery:
+one forward pass per node, padded batches, a single page-level pass, and
+batches served cold and warm from the embedding cache.
+
+    python -m benchmarks.bench_recovery [--nodes 200] [--threads 4] [--interop-threads 1] [--quantize]
+"""
+import argparse
+import tempfile
+import time
+
+from lxml import etree, html as lxml_html
+
+from analyze.recovery import SemanticRecovery
+from benchmarks.synthetic import make_snapshot, to_html
+
+
+def _sample(page: str, count: int):
+    """(xpath, outer HTML) of up to count elements that carry text."""
+    doc = lxml_html.document_fromstring(page)
+    root = doc.getroottree()
+    picked = []
+    for el in doc.iter():
+        if not isinstance(el.tag, str) or not (el.text or "").strip():
+            continue
+        picked.append((root.getpath(el), etree.tostring(el, encoding="unicode", with_tail=False)))
+        if len(picked) >= count:
+            break
+    return picked
+
+
+def _rate(label: str, count: int, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} | {elapsed * 1000:>10.1f} ms | {count / elapsed:>9.1f} nodes/s")
+
+
+def run(nodes: int = 200, page_nodes: int = 400, threads: int = None, interop_threads: int = None,
+        model_dir: str = None, quantize: bool = False):
+    recovery = SemanticRecovery(num_threads=threads, interop_threads=interop_threads, model_dir=model_dir,
+                                quantize=quantize, cache_dir=None)
+    start = time.perf_counter()
+    if not recovery.model:
+        print("MarkupLM unavailable; nothing to measure.")
+        return
+
+    print(f"model load: {(time.perf_counter() - start) * 1000:.0f} ms{' (int8)' if quantize else ''}")
+
+    page = to_html(make_snapshot(page_nodes, dynamic_attrs=False))
+    sample = _sample(page, nodes)
+    xpaths = [xpath for xpath, _ in sample]
+    snippets = [snippet for _, snippet in sample]
+    print(f"{len(sample)} nodes from a {page_nodes}-element page")
+    print(f"{'mode':<28} | {'time':>13} | {'throughput':>15}")
+
+    _rate("per node", len(snippets), lambda: [recovery.get_node_embedding(s) for s in snippets])
+    for batch_size in (8, 32):
+        _rate(f"embed_batch (batch={batch_size})", len(snippets), lambda: recovery.embed_batch(snippets, batch_size=batch_size))
+    _rate("embed_page (one pass)", len(xpaths), lambda: recovery.embed_page(page, xpaths))
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cached = SemanticRecovery(model_dir=model_dir, quantize=quantize, cache_dir=cache_dir)
+        _rate("embed_batch (cold cache)", len(snippets), lambda: cached.embed_batch(snippets))
+        _rate("embed_batch (warm cache)", len(snippets), lambda: cached.embed_batch(snippets))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SemanticRecovery embedding throughput")
+    parser.add_argument("--nodes", type=int, default=200)
+    parser.add_argument("--page-nodes", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--interop-threads", type=int, default=None, help="torch inter-op threads")
+    parser.add_argument("--model-dir", default=None, help="local MarkupLM directory")
+    parser.add_argument("--quantize", action="store_true", help="dynamic int8 Linear layers")
+    args = parser.parse_args()
+    run(args.nodes, args.page_nodes, args.threads, args.interop_threads, args.model_dir, args.quantize)
@@ -0,0 +1,48 @@
+"""
+Compares the legacy DOMCleaner.clean + Node.from_json path against the
+single-pass DOMTree builders (nested dict and CDP flattened input).
+
+    python -m benchmarks.bench_tree_builder
+"""
+import sys
+import time
+
+from common.models import Node
+from common.tree import DOMTree
+from ingest.cleaner import DOMCleaner
+from benchmarks.synthetic import make_snapshot, make_chain, to_cdp_snapshot
+
+
+def _time(fn, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes=(10_000, 100_000)):
+    cleaner = DOMCleaner()
+    print(f"{'nodes':>8} | {'clean+from_json':>16} | {'DOMTree.from_json':>18} | {'DOMTree.from_cdp':>17}")
+    for size in sizes:
+        snapshot = make_snapshot(size)
+        cdp = to_cdp_snapshot(snapshot)
+        legacy = _time(lambda: Node.from_json(cleaner.clean(snapshot)))
+        fused = _time(lambda: DOMTree.from_json(snapshot, cleaner=cleaner))
+        flat = _time(lambda: DOMTree.from_cdp_snapshot(cdp, cleaner=cleaner))
+        print(f"{size:>8} | {legacy * 1000:>13.1f} ms | {fused * 1000:>15.1f} ms | {flat * 1000:>14.1f} ms")
+
+    depth = sys.getrecursionlimit() * 2
+    chain = make_chain(depth)
+    try:
+        Node.from_json(cleaner.clean(chain))
+        legacy_status = "ok"
+    except RecursionError:
+        legacy_status = "RecursionError"
+    tree = DOMTree.from_json(chain, cleaner=cleaner)
+    print(f"depth {depth}: legacy path -> {legacy_status}, DOMTree.from_json -> {len(tree)} nodes")
+
+
+if __name__ == "__main__":
+    run()
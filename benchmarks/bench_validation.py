@@ -0,0 +1,55 @@
+"""
+Locator validation: bulk-checking generated bundles (primary / secondary /
+tertiary) against an lxml copy of the page: per-call XPath parsing with a
+full-page scan versus cached compiled XPaths seeded from the selector index.
+
+    python -m benchmarks.bench_validation [--nodes 20000] [--targets 5000]
+"""
+import argparse
+import random
+import time
+
+from common.tree import DOMTree
+from generator.bundle import LocatorBundleGenerator
+from generator.validation import LocatorValidator, compile_xpath, to_xpath
+from benchmarks.synthetic import make_snapshot
+
+
+def run(nodes: int = 20_000, targets: int = 5000):
+    tree = DOMTree.from_json(make_snapshot(nodes, dynamic_attrs=False))
+    picks = random.Random(3).sample(range(len(tree)), min(targets, len(tree)))
+    generator = LocatorBundleGenerator(validate=False)
+    start = time.perf_counter()
+    bundles = generator.generate_bundles([tree.node(i) for i in picks], tree)
+    generated = time.perf_counter() - start
+    locators = sum(len(b) for b in bundles)
+    print(f"{len(tree)} nodes, {len(picks)} targets, {locators} locators (generated in {generated:.2f} s)")
+
+    start = time.perf_counter()
+    validator = LocatorValidator(tree)
+    print(f"{'lxml tree build':<28} | {(time.perf_counter() - start) * 1000:>9.1f} ms")
+
+    # Baseline: parse every expression and scan the whole page for it; too
+    # slow for the full set, so time a slice and scale
+    root = validator.root
+    sample = bundles[:200]
+    start = time.perf_counter()
+    for bundle in sample:
+        for locator in bundle.values():
+            root.xpath(to_xpath(locator))
+    uncompiled = (time.perf_counter() - start) * len(bundles) / max(1, len(sample))
+    print(f"{'root.xpath() (estimated)':<28} | {uncompiled * 1000:>9.1f} ms | {locators / uncompiled:>8.0f} locators/s")
+
+    compile_xpath.cache_clear()
+    for label in ("seeded/compiled, cold cache", "seeded/compiled, warm cache"):
+        report = validator.validate_many(picks, bundles)
+        print(f"{label:<28} | {report.seconds * 1000:>9.1f} ms | {report.locator_count / report.seconds:>8.0f} locators/s")
+    print(f"  {report.summary()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Locator validation benchmark")
+    parser.add_argument("--nodes", type=int, default=20_000)
+    parser.add_argument("--targets", type=int, default=5000)
+    args = parser.parse_args()
+    run(args.nodes, args.targets)
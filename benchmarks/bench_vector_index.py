@@ -0,0 +1,76 @@
+"""
+Semantic candidate search: the per-pair cosine loop that find_best_match
+used to run against one matrix-multiply top-k over a flat VectorIndex and
+an IVF-trained one (with recall against the exact answer).
+
+    python -m benchmarks.bench_vector_index [--lost 1000] [--candidates 50000] [--dim 768]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from analyze.vector_index import VectorIndex
+
+
+def _clustered(rng, count: int, centers: np.ndarray) -> np.ndarray:
+    """Embeddings grouped around shared centers, like nodes of similar kinds."""
+    picks = rng.integers(0, len(centers), count)
+    return (centers[picks] + 0.5 * rng.normal(size=(count, centers.shape[1]))).astype(np.float32)
+
+
+def _pair_loop(queries: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    best = np.empty(len(queries), dtype=np.int64)
+    for q, query in enumerate(queries):
+        best_score, best_row = -1.0, -1
+        q_norm = np.linalg.norm(query)
+        for row, vec in enumerate(candidates):
+            score = float(query @ vec) / (q_norm * np.linalg.norm(vec))
+            if score > best_score:
+                best_score, best_row = score, row
+        best[q] = best_row
+    return best
+
+
+def run(lost: int = 1000, candidates: int = 50_000, dim: int = 768, nprobe: int = 8):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(max(1, candidates // 100), dim)).astype(np.float32)
+    page = _clustered(rng, candidates, centers)
+    truth = rng.choice(candidates, lost, replace=False)
+    queries = page[truth] + 0.3 * rng.normal(size=(lost, dim)).astype(np.float32)
+    print(f"{lost} lost nodes vs {candidates} candidates, {dim}-d")
+
+    # The per-pair loop is far too slow for the full set; time a slice and scale
+    sample = max(1, min(lost, 2))
+    start = time.perf_counter()
+    _pair_loop(queries[:sample], page)
+    loop = (time.perf_counter() - start) * lost / sample
+    print(f"{'per-pair loop (estimated)':<26} | {loop:>9.2f} s")
+
+    index = VectorIndex()
+    index.add(list(range(candidates)), page)
+    start = time.perf_counter()
+    _, exact = index.search(queries)
+    flat = time.perf_counter() - start
+    print(f"{'flat matmul top-1':<26} | {flat * 1000:>9.1f} ms")
+
+    start = time.perf_counter()
+    index.train_ivf()
+    train = time.perf_counter() - start
+    start = time.perf_counter()
+    _, rows = index.search(queries, nprobe=nprobe)
+    ivf = time.perf_counter() - start
+    exact_keys = np.asarray(exact[:, 0])
+    ivf_keys = np.asarray([index.keys[r] for r in rows[:, 0]])
+    recall = float((ivf_keys == exact_keys).mean())
+    print(f"{f'IVF top-1 (nprobe={nprobe})':<26} | {ivf * 1000:>9.1f} ms | recall {recall:.3f} | train {train:.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VectorIndex search benchmark")
+    parser.add_argument("--lost", type=int, default=1000)
+    parser.add_argument("--candidates", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+    run(args.lost, args.candidates, args.dim, args.nprobe)
@@ -0,0 +1,114 @@
+"""
+Synthetic snapshot generators shared by the benchmark scripts.
+"""
+import random
+from html import escape
+from typing import Dict, List
+
+TAGS = ["DIV", "SPAN", "A", "LI", "UL", "BUTTON", "INPUT", "SECTION", "P", "FORM"]
+
+
+def make_snapshot(node_count: int, max_children: int = 6, seed: int = 7, dynamic_attrs: bool = True, max_depth: int = None) -> Dict:
+    """
+    Builds a nested serializeNode-style snapshot dict with roughly node_count
+    element nodes (plus interleaved #text nodes). Generated iteratively so
+    large or deep trees don't hit the recursion limit.
+    """
+    rng = random.Random(seed)
+    root = {"nodeName": "HTML", "nodeType": 1, "nodeValue": None, "attributes": {"lang": "en"}, "children": []}
+    frontier = [(root, 0)]
+    created = 1
+    while created < node_count and frontier:
+        parent, depth = frontier.pop(rng.randrange(len(frontier))) if max_depth is None else frontier.pop()
+        for _ in range(rng.randint(1, max_children)):
+            if created >= node_count:
+                break
+            attrs = {"class": f"c{rng.randint(0, 50)} item"}
+            if rng.random() < 0.3:
+                attrs["id"] = f"node-{created}"
+            if dynamic_attrs:
+                attrs[f"data-v-{rng.randint(0, 9999):04x}"] = ""
+                if rng.random() < 0.5:
+                    attrs[f"_ngcontent-c{rng.randint(0, 40)}"] = ""
+            child = {"nodeName": rng.choice(TAGS), "nodeType": 1, "nodeValue": None, "attributes": attrs, "children": []}
+            parent["children"].append({"nodeName": "#text", "nodeType": 3, "nodeValue": "text", "attributes": {}, "children": []})
+            parent["children"].append(child)
+            created += 1
+            if max_depth is None or depth + 1 < max_depth:
+                frontier.append((child, depth + 1))
+    return root
+
+
+def make_chain(depth: int) -> Dict:
+    """A single chain of nested DIVs, depth levels deep."""
+    root = {"nodeName": "HTML", "nodeType": 1, "nodeValue": None, "attributes": {}, "children": []}
+    curr = root
+    for i in range(depth):
+        child = {"nodeName": "DIV", "nodeType": 1, "nodeValue": None, "attributes": {"class": f"lvl-{i % 10}"}, "children": []}
+        curr["children"].append(child)
+        curr = child
+    return root
+
+
+def to_cdp_snapshot(root: Dict) -> Dict:
+    """
+    Converts a nested snapshot into the flattened DOMSnapshot.captureSnapshot
+    layout (document node first, preorder arrays, shared string table).
+    """
+    strings: List[str] = []
+    string_ids: Dict[str, int] = {}
+
+    def sid(value) -> int:
+        if value is None:
+            return -1
+        value = str(value)
+        idx = string_ids.get(value)
+        if idx is None:
+            idx = string_ids[value] = len(strings)
+            strings.append(value)
+        return idx
+
+    nodes = {"parentIndex": [-1], "nodeType": [9], "nodeName": [sid("#document")], "nodeValue": [-1],
+             "attributes": [[]], "shadowRootType": {"index": [], "value": []}}
+    stack = [(root, 0, False)]
+    while stack:
+        item, parent, is_shadow = stack.pop()
+        index = len(nodes["parentIndex"])
+        nodes["parentIndex"].append(parent)
+        nodes["nodeType"].append(11 if is_shadow else item.get("nodeType", 1))
+        nodes["nodeName"].append(sid("#document-fragment" if is_shadow else item["nodeName"]))
+        nodes["nodeValue"].append(sid(item.get("nodeValue")))
+        flat = []
+        for k, v in (item.get("attributes") or {}).items():
+            flat.extend((sid(k), sid(v)))
+        nodes["attributes"].append(flat)
+        if is_shadow:
+            nodes["shadowRootType"]["index"].append(index)
+            nodes["shadowRootType"]["value"].append(sid("open"))
+        pending = [(c, index, False) for c in item.get("children") or []]
+        if item.get("shadowRoot"):
+            pending.insert(0, (item["shadowRoot"], index, True))
+        stack.extend(reversed(pending))
+    return {"documents": [{"nodes": nodes}], "strings": strings}
+
+
+def to_html(root: Dict) -> str:
+    """Serializes a nested snapshot back to markup (text and elements only)."""
+    parts: List[str] = []
+    stack = [(root, False)]
+    while stack:
+        item, closing = stack.pop()
+        name = item["nodeName"].lower()
+        if closing:
+            parts.append(f"</{name}>")
+            continue
+        if name == "#text":
+            parts.append(escape(item.get("nodeValue") or "", quote=False))
+            continue
+        if name.startswith("#"):
+            continue
+        attrs = "".join(f' {k}="{escape(str(v))}"' for k, v in (item.get("attributes") or {}).items())
+        parts.append(f"<{name}{attrs}>")
+        stack.append((item, True))
+        stack.extend((c, False) for c in reversed(item.get("children") or []))
+    return "".join(parts)
@@ -0,0 +1,46 @@
+"""
+Stable 64-bit node hashes.
+
+The label hash covers a node's own content (tag, attributes, text); the
+structural hash additionally folds in the ordered structural hashes of its
+children, Merkle-style. Both use BLAKE2b so values are stable across
+processes and can be persisted as cache keys (Python's hash() is salted).
+"""
+import hashlib
+import struct
+from typing import Dict, Iterable
+
+def _field(value) -> str:
+    # Length-prefixed, so no separator inside a name or value can shift the
+    # field boundaries; None gets its own marker, distinct from "None"
+    if value is None:
+        return "~"
+    value = value if isinstance(value, str) else str(value)
+    return f"{len(value)}:{value}"
+
+
+def label_hash(tag: str, attributes: Dict[str, str], text: str) -> int:
+    """Hash of tag + attributes (order-insensitive) + text."""
+    parts = [_field(tag), f"{len(attributes) if attributes else 0};"]
+    if attributes:
+        for k in sorted(attributes):
+            parts.append(_field(k))
+            parts.append(_field(attributes[k]))
+    parts.append(_field(text or ""))
+    digest = hashlib.blake2b("".join(parts).encode("utf-8", "surrogatepass"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def signature_hash(tag: str, attributes: Dict[str, str]) -> int:
+    """
+    Hash of tag + attributes only. Equal signatures mean a zero rename cost.
+    Equals label_hash() of the same node without text.
+    """
+    return label_hash(tag, attributes, "")
+
+
+def structural_hash(label: int, child_hashes: Iterable[int]) -> int:
+    """Hash of a node label followed by its children's structural hashes, in order."""
+    child_hashes = tuple(child_hashes)
+    payload = struct.pack(f"<{len(child_hashes) + 1}Q", label, *child_hashes)
+    return int.from_bytes(hashlib.blake2b(payload, digest_size=8, person=b"plr-subtree").digest(), "little")
@@ -0,0 +1,130 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+class SimHashLSHIndex:
+    """
+    Banded LSH index over 64-bit SimHash fingerprints.
+
+    The fingerprint is split into max_distance + 1 bands; by pigeonhole, any
+    fingerprint within max_distance bits of a query agrees with it exactly on
+    at least one band. A query therefore only verifies entries sharing a band
+    bucket instead of scanning every stored snapshot.
+
+    Entries carry a route so lookups can be scoped to "previous snapshots of
+    this page". Each route keeps its max_per_route most recently added
+    entries; older ones are evicted.
+    """
+    def __init__(self, max_distance: int = 3, width: int = 64, max_per_route: int = 20):
+        self.max_distance = max_distance
+        self.width = width
+        self.max_per_route = max_per_route
+        bands = max_distance + 1
+        base, extra = divmod(width, bands)
+        self.bands: List[Tuple[int, int]] = []  # (shift, mask)
+        shift = 0
+        for b in range(bands):
+            bits = base + (1 if b < extra else 0)
+            self.bands.append((shift, (1 << bits) - 1))
+            shift += bits
+        self.tables: List[Dict[int, List[str]]] = [{} for _ in self.bands]
+        self.entries: Dict[str, Dict] = {}
+        # route -> keys, oldest first
+        self.routes: Dict[Optional[str], List[str]] = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _band_values(self, fingerprint: int):
+        for shift, mask in self.bands:
+            yield (fingerprint >> shift) & mask
+
+    def add(self, key: str, fingerprint: int, route: Optional[str] = None, **meta):
+        """Adds or replaces an entry, evicting the route's oldest beyond max_per_route."""
+        if key in self.entries:
+            self.remove(key)
+        self.entries[key] = dict(meta, fingerprint=int(fingerprint), route=route)
+        for table, value in zip(self.tables, self._band_values(int(fingerprint))):
+            table.setdefault(value, []).append(key)
+        keys = self.routes.setdefault(route, [])
+        keys.append(key)
+        if self.max_per_route and len(keys) > self.max_per_route:
+            for old_key in keys[:len(keys) - self.max_per_route]:
+                self.remove(old_key)
+
+    def remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self.routes.get(entry["route"])
+        if keys is not None:
+            keys.remove(key)
+            if not keys:
+                del self.routes[entry["route"]]
+        for table, value in zip(self.tables, self._band_values(entry["fingerprint"])):
+            bucket = table.get(value)
+            if bucket and key in bucket:
+                bucket.remove(key)
+                if not bucket:
+                    del table[value]
+
+    def query(self, fingerprint: int, max_distance: Optional[int] = None, route: Optional[str] = None) -> List[Tuple[str, int]]:
+        """
+        Entries within max_distance bits, nearest first, as (key, distance).
+        A max_distance above the index's own is answered by a linear scan,
+        since the bands only guarantee recall up to the index's distance.
+        """
+        limit = self.max_distance if max_distance is None else max_distance
+        fingerprint = int(fingerprint)
+        if limit > self.max_distance:
+            candidates = self.entries if route is None else self.routes.get(route, ())
+        else:
+            candidates = (key for table, value in zip(self.tables, self._band_values(fingerprint))
+                          for key in table.get(value, ()))
+        seen = set()
+        hits = []
+        for key in candidates:
+            if key in seen:
+                continue
+            seen.add(key)
+            entry = self.entries[key]
+            if route is not None and entry["route"] != route:
+                continue
+            distance = (entry["fingerprint"] ^ fingerprint).bit_count()
+            if distance <= limit:
+                hits.append((key, distance))
+        hits.sort(key=lambda hit: (hit[1], hit[0]))
+        return hits
+
+    def nearest(self, fingerprint: int, max_distance: Optional[int] = None, route: Optional[str] = None) -> Optional[Tuple[str, int]]:
+        hits = self.query(fingerprint, max_distance, route)
+        return hits[0] if hits else None
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "max_distance": self.max_distance,
+                "width": self.width,
+                "entries": {k: dict(v, fingerprint=format(v["fingerprint"], "x")) for k, v in self.entries.items()}
+            }, f, indent=1)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, max_distance: int = 3, width: int = 64, max_per_route: int = 20) -> 'SimHashLSHIndex':
+        """
+        Loads a saved index, or returns an empty one if the file doesn't exist.
+        Entries are re-banded for the caller's max_distance; the saved one is
+        informational only.
+        """
+        if not os.path.exists(path):
+            return cls(max_distance, width, max_per_route)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(max_distance, data.get("width", width), max_per_route)
+        for key, entry in data.get("entries", {}).items():
+            entry = dict(entry)
+            fingerprint = int(entry.pop("fingerprint"), 16)
+            route = entry.pop("route", None)
+            index.add(key, fingerprint, route, **entry)
+        return index
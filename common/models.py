@@ -1,28 +1,20 @@
 from typing import List, Dict, Optional
 import json
+from common.hashing import label_hash, structural_hash
 
-class Node:
+class BaseNode:
     """
-    Represents a DOM Node in a way that is compatible with APTED or easily convertible.
+    Behaviour shared by standalone Node objects and NodeView handles into a DOMTree.
+    Subclasses provide tag, attributes, children and text.
     """
-    def __init__(self, tag: str, attributes: Dict[str, str] = None, children: List['Node'] = None, text: str = ""):
-        self.tag = str(tag or "unknown")
-        self.attributes = attributes if isinstance(attributes, dict) else {}
-        self.children = children if isinstance(children, list) else []
-        self.text = str(text or "")
-        self.id = self.attributes.get('id')
-        raw_classes = self.attributes.get('class')
-        if isinstance(raw_classes, str):
-            self.classes = raw_classes.split()
-        else:
-            self.classes = []
+    __slots__ = ()
 
     def __eq__(self, other):
-        if not isinstance(other, Node):
+        if not isinstance(other, BaseNode):
             return False
         return (
-            self.tag == other.tag and 
-            self.attributes == other.attributes and 
+            self.tag == other.tag and
+            self.attributes == other.attributes and
             self.text == other.text
         )
 
@@ -33,8 +25,27 @@ class Node:
     def name(self):
         return self.tag
 
-    def add_child(self, child: 'Node'):
-        self.children.append(child)
+    @property
+    def label_hash(self) -> int:
+        return label_hash(self.tag, self.attributes, self.text)
+
+    @property
+    def subtree_hash(self) -> int:
+        """
+        Merkle hash of the subtree. Computed on demand here; DOMTree
+        precomputes it for every node at build time.
+        """
+        # Iterative post-order so deep graphs don't hit the recursion limit
+        hashes = {}
+        stack = [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                hashes[id(node)] = structural_hash(node.label_hash, (hashes[id(c)] for c in node.children))
+            else:
+                stack.append((node, True))
+                stack.extend((c, False) for c in node.children)
+        return hashes[id(self)]
 
     def to_apted_format(self) -> str:
         """
@@ -51,11 +62,33 @@ class Node:
     def __repr__(self):
         return f"Node<{self.tag} id={self.id}>"
 
+
+class Node(BaseNode):
+    """
+    Represents a DOM Node in a way that is compatible with APTED or easily convertible.
+    """
+    __slots__ = ('tag', 'attributes', 'children', 'text', 'id', 'classes')
+
+    def __init__(self, tag: str, attributes: Dict[str, str] = None, children: List['Node'] = None, text: str = ""):
+        self.tag = str(tag or "unknown")
+        self.attributes = attributes if isinstance(attributes, dict) else {}
+        self.children = children if isinstance(children, list) else []
+        self.text = str(text or "")
+        self.id = self.attributes.get('id')
+        raw_classes = self.attributes.get('class')
+        if isinstance(raw_classes, str):
+            self.classes = raw_classes.split()
+        else:
+            self.classes = []
+
+    def add_child(self, child: 'Node'):
+        self.children.append(child)
+
     @classmethod
     def from_json(cls, data: Dict) -> 'Node':
         if not data:
              return cls("unknown")
-             
+
         node = cls(
             tag=data.get('nodeName', '').lower(),
             attributes=data.get('attributes') or {},
@@ -66,10 +99,10 @@ class Node:
             if child_data.get('nodeName') == '#text':
                 continue
             node.add_child(cls.from_json(child_data))
-            
+
         if data.get('shadowRoot'):
             shadow = cls.from_json(data['shadowRoot'])
             shadow_wrapper = cls("shadow-root", children=shadow.children)
             node.add_child(shadow_wrapper)
-            
+
         return node
@@ -1,29 +1,56 @@
 import hashlib
 import re
-from typing import List
+from typing import Dict, Iterable, List
+import numpy as np
+
+_TOKEN_RE = re.compile(r'\w+')
+
+# Bytes -> set-bit count, for numpy builds without np.bitwise_count
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def popcount64(values: np.ndarray) -> np.ndarray:
+    """Per-element population count of a uint64 array."""
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values).astype(np.int64)
+    as_bytes = values.view(np.uint8).reshape(values.shape + (8,))
+    return _POPCOUNT_TABLE[as_bytes].sum(axis=-1, dtype=np.int64)
+
 
 class SimHash:
+    # Bound on memoised token -> hash entries per instance
+    TOKEN_CACHE_SIZE = 1 << 18
+
     def __init__(self, width: int = 64):
         self.width = width
+        self._token_cache: Dict[str, int] = {}
 
     def _hash_func(self, x: str) -> int:
         return int(hashlib.md5(x.encode('utf-8')).hexdigest(), 16)
 
+    def _token_hash(self, token: str) -> int:
+        cached = self._token_cache.get(token)
+        if cached is None:
+            if len(self._token_cache) >= self.TOKEN_CACHE_SIZE:
+                self._token_cache.clear()
+            cached = self._token_cache[token] = self._hash_func(token) & ((1 << self.width) - 1)
+        return cached
+
     def compute(self, text: str) -> str:
         """
         Computes the SimHash of a given text.
         Returns a hex string representation of the hash.
         """
         # 1. Tokenize (simple splitting by non-alphanumeric)
-        tokens = re.findall(r'\w+', text.lower())
-        
+        tokens = _TOKEN_RE.findall(text.lower())
+
         # Initialize vector V of zeros
         v = [0] * self.width
-        
+
         for token in tokens:
             # 2. Hash each token
-            token_hash = self._hash_func(token)
-            
+            token_hash = self._token_hash(token)
+
             # 3. Update vector
             for i in range(self.width):
                 bit = (token_hash >> i) & 1
@@ -31,13 +58,13 @@ class SimHash:
                     v[i] += 1
                 else:
                     v[i] -= 1
-        
+
         # 4. Form fingerprint
         fingerprint = 0
         for i in range(self.width):
             if v[i] >= 0:
                 fingerprint |= (1 << i)
-                
+
         return hex(fingerprint)[2:].zfill(self.width // 4)
 
     def distance(self, hash1: str, hash2: str) -> int:
@@ -46,12 +73,131 @@ class SimHash:
         """
         h1 = int(hash1, 16)
         h2 = int(hash2, 16)
-        x = (h1 ^ h2) & ((1 << self.width) - 1)
-        ans = 0
-        while x:
-            ans += 1
-            x &= x - 1
-        return ans
+        return ((h1 ^ h2) & ((1 << self.width) - 1)).bit_count()
+
+    # --- Batch API (NumPy) ---
+
+    def token_bits(self, tokens: List[str]) -> np.ndarray:
+        """
+        (len(tokens), width) int8 matrix of +1/-1 votes, one row per token.
+        """
+        self._require_batch_width()
+        hashes = np.fromiter((self._token_hash(t) for t in tokens), dtype=np.uint64, count=len(tokens))
+        shifts = np.arange(self.width, dtype=np.uint64)
+        bits = ((hashes[:, None] >> shifts) & np.uint64(1)).astype(np.int8)
+        return bits * 2 - 1
+
+    def vote_matrix(self, texts: Iterable[str]) -> np.ndarray:
+        """
+        (len(texts), width) int32 matrix of summed token votes per text. Each
+        distinct token is hashed once per batch.
+        """
+        self._require_batch_width()
+        token_ids: Dict[str, int] = {}
+        # Repeated texts (list items, table cells) are tokenized once
+        text_tokens: Dict[str, List[int]] = {}
+        flat: List[int] = []
+        offsets: List[int] = []
+        for text in texts:
+            offsets.append(len(flat))
+            ids = text_tokens.get(text)
+            if ids is None:
+                ids = []
+                for token in _TOKEN_RE.findall(text.lower()):
+                    idx = token_ids.get(token)
+                    if idx is None:
+                        idx = token_ids[token] = len(token_ids)
+                    ids.append(idx)
+                text_tokens[text] = ids
+            flat.extend(ids)
+
+        votes = np.zeros((len(offsets), self.width), dtype=np.int32)
+        if not flat:
+            return votes
+        token_of = np.asarray(flat, dtype=np.int64)
+        lengths = np.diff(np.append(np.asarray(offsets, dtype=np.int64), len(flat)))
+        text_of = np.repeat(np.arange(len(offsets)), lengths)
+        # votes = 2 * (tokens with the bit set) - tokens, per text and bit: one
+        # weighted bincount per bit column instead of a row-wise segment sum
+        ones = np.ascontiguousarray((self.token_bits(list(token_ids)) > 0).T, dtype=np.float64)
+        for bit in range(self.width):
+            votes[:, bit] = np.bincount(text_of, weights=ones[bit][token_of], minlength=len(offsets))
+        votes *= 2
+        votes -= lengths[:, None].astype(np.int32)
+        return votes
+
+    def fingerprints_from_votes(self, votes: np.ndarray) -> np.ndarray:
+        """Folds vote rows into uint64 fingerprints (bit i set where votes[:, i] >= 0)."""
+        bits = (votes >= 0).astype(np.uint8)
+        if self.width < 64:
+            bits = np.pad(bits, ((0, 0), (0, 64 - self.width)))
+        packed = np.packbits(bits, axis=1, bitorder='little')
+        return packed.view('<u8').reshape(-1).astype(np.uint64)
+
+    def compute_batch(self, texts: Iterable[str]) -> np.ndarray:
+        """
+        Fingerprints many texts at once. Returns a uint64 array; element k
+        equals int(self.compute(texts[k]), 16).
+        """
+        return self.fingerprints_from_votes(self.vote_matrix(texts))
+
+    def _require_batch_width(self):
+        if self.width > 64:
+            raise ValueError("Batch SimHash supports widths up to 64 bits")
+
+    @staticmethod
+    def to_hex(fingerprints: np.ndarray, width: int = 64) -> List[str]:
+        return [format(int(f), 'x').zfill(width // 4) for f in fingerprints]
+
+    @staticmethod
+    def from_hex(hashes: Iterable[str]) -> np.ndarray:
+        return np.fromiter((int(h, 16) for h in hashes), dtype=np.uint64)
+
+    @staticmethod
+    def hamming_one_to_many(fingerprint: int, fingerprints: np.ndarray) -> np.ndarray:
+        """Hamming distances from one fingerprint to each of many."""
+        return popcount64(np.asarray(fingerprints, dtype=np.uint64) ^ np.uint64(fingerprint))
+
+    @staticmethod
+    def hamming_many_to_many(a: np.ndarray, b: np.ndarray, chunk_rows: int = 4096) -> np.ndarray:
+        """(len(a), len(b)) matrix of pairwise Hamming distances, built in row chunks."""
+        a = np.asarray(a, dtype=np.uint64)
+        b = np.asarray(b, dtype=np.uint64)
+        out = np.empty((len(a), len(b)), dtype=np.int64)
+        for start in range(0, len(a), chunk_rows):
+            block = a[start:start + chunk_rows, None] ^ b[None, :]
+            out[start:start + chunk_rows] = popcount64(block)
+        return out
+
+def subtree_fingerprints(tree, sim: SimHash = None, chunk_rows: int = 8192) -> np.ndarray:
+    """
+    SimHash of every subtree of a DOMTree, as a uint64 array in preorder.
+
+    Each node's own token_text() is tokenized once into a vote vector.
+    Subtrees are contiguous preorder ranges [i, i + size[i]), so a subtree's
+    aggregated votes are one difference of prefix sums, and no subtree text
+    is re-tokenized. Element i equals the SimHash of the subtree's token
+    texts joined together.
+    """
+    sim = sim or SimHash()
+    count = len(tree)
+    votes = sim.vote_matrix(tree.token_text(i) for i in range(count))
+    prefix = np.zeros((count + 1, sim.width), dtype=np.int32)
+    np.cumsum(votes, axis=0, out=prefix[1:])
+    del votes
+
+    ends = np.arange(count, dtype=np.int64) + np.frombuffer(tree.size, dtype=np.int32)
+    fingerprints = np.empty(count, dtype=np.uint64)
+    for start in range(0, count, chunk_rows):
+        stop = min(start + chunk_rows, count)
+        fingerprints[start:stop] = sim.fingerprints_from_votes(prefix[ends[start:stop]] - prefix[start:stop])
+    return fingerprints
+
+def page_fingerprint(tree, sim: SimHash = None) -> int:
+    """SimHash of a whole DOMTree: the root entry of its subtree fingerprints."""
+    if sim is None:
+        return int(tree.fingerprints[0]) if len(tree) else 0
+    return int(subtree_fingerprints(tree, sim)[0]) if len(tree) else 0
 
 def get_simhash_distance(text1: str, text2: str) -> int:
     sim = SimHash()
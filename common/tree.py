@@ -0,0 +1,522 @@
+from array import array
+import numpy as np
+from html import escape
+from typing import Dict, List, Optional, Iterator, Union
+from common.models import BaseNode
+from common.hashing import label_hash, signature_hash, structural_hash
+
+NO_NODE = -1
+_EMPTY = ()
+
+class DOMTree:
+    """
+    Struct-of-arrays DOM tree.
+
+    Nodes are numbered in preorder. Structure lives in flat int arrays
+    (parent / first_child / next_sibling / size), tag names and attribute
+    names are interned into per-tree tables, and per-node attributes are
+    stored as parallel (name id, value) tuples. Consumers get NodeView
+    handles, which carry only (tree, index).
+
+    Every node also carries a label hash (tag + attributes + text), a
+    signature hash (tag + attributes, used by the differ's rename cost) and
+    a Merkle structural hash (label + ordered child structural hashes), all
+    computed once when the tree is finalized. Equal structural hashes mean
+    identical subtrees.
+    """
+
+    def __init__(self):
+        self.tag_names: List[str] = []
+        self.attr_names: List[str] = []
+        self._tag_ids: Dict[str, int] = {}
+        self._attr_ids: Dict[str, int] = {}
+        self._key_tuples: Dict[tuple, tuple] = {}
+
+        self.tag_ids = array('i')
+        self.parent = array('i')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.size = array('i')
+        self.attr_keys: List[tuple] = []
+        self.attr_values: List[tuple] = []
+        self.texts: List[str] = []
+        self.label_hash = array('Q')
+        self.signature_hash = array('Q')
+        self.subtree_hash = array('Q')
+        self._fingerprints = None
+
+    def __len__(self):
+        return len(self.tag_ids)
+
+    # --- Construction ---
+
+    def intern_tag(self, tag: str) -> int:
+        tag_id = self._tag_ids.get(tag)
+        if tag_id is None:
+            tag_id = len(self.tag_names)
+            self._tag_ids[tag] = tag_id
+            self.tag_names.append(tag)
+        return tag_id
+
+    def intern_attr(self, name: str) -> int:
+        attr_id = self._attr_ids.get(name)
+        if attr_id is None:
+            attr_id = len(self.attr_names)
+            self._attr_ids[name] = attr_id
+            self.attr_names.append(name)
+        return attr_id
+
+    def add_node(self, parent: int, tag: str, attributes: Optional[Dict[str, str]] = None, text: str = "", last_child: Optional[List[int]] = None) -> int:
+        """
+        Appends a node in preorder position. Nodes must be added parent-first and
+        siblings left-to-right; last_child is the builder's scratch list used to
+        link siblings in O(1).
+        """
+        if attributes:
+            keys = tuple(self.intern_attr(k) for k in attributes)
+            keys = self._key_tuples.setdefault(keys, keys)
+            values = tuple(attributes.values())
+        else:
+            keys = values = _EMPTY
+        return self._append(parent, self.intern_tag(str(tag or "unknown")), keys, values, str(text or ""), last_child)
+
+    def _append(self, parent: int, tag_id: int, keys: tuple, values: tuple, text: str, last_child: Optional[List[int]]) -> int:
+        index = len(self.tag_ids)
+        self.tag_ids.append(tag_id)
+        self.parent.append(parent)
+        self.first_child.append(NO_NODE)
+        self.next_sibling.append(NO_NODE)
+        self.size.append(1)
+        self.attr_keys.append(keys)
+        self.attr_values.append(values)
+        self.texts.append(text)
+
+        if last_child is not None:
+            last_child.append(NO_NODE)
+            if parent != NO_NODE:
+                prev = last_child[parent]
+                if prev == NO_NODE:
+                    self.first_child[parent] = index
+                else:
+                    self.next_sibling[prev] = index
+                last_child[parent] = index
+        return index
+
+    def _finalize(self):
+        count = len(self.tag_ids)
+        names, tags, texts = self.attr_names, self.tag_names, self.texts
+        labels = array('Q', bytes(8 * count))
+        signatures = array('Q', bytes(8 * count))
+        for i in range(count):
+            tag = tags[self.tag_ids[i]]
+            attributes = {names[k]: v for k, v in zip(self.attr_keys[i], self.attr_values[i])}
+            labels[i] = label_hash(tag, attributes, texts[i])
+            # Without text the label already is the signature
+            signatures[i] = signature_hash(tag, attributes) if texts[i] else labels[i]
+        self.label_hash = labels
+        self.signature_hash = signatures
+
+        # Children always follow their parent in preorder, so a reverse sweep
+        # sees every child before its parent: sizes and structural hashes
+        # accumulate bottom-up in one pass.
+        size, parent = self.size, self.parent
+        first_child, next_sibling = self.first_child, self.next_sibling
+        subtree = array('Q', bytes(8 * count))
+        for i in range(count - 1, -1, -1):
+            child_hashes = []
+            child = first_child[i]
+            while child != NO_NODE:
+                child_hashes.append(subtree[child])
+                child = next_sibling[child]
+            subtree[i] = structural_hash(labels[i], child_hashes)
+            if i:
+                size[parent[i]] += size[i]
+        self.subtree_hash = subtree
+
+    @classmethod
+    def from_json(cls, data: Dict, cleaner=None) -> 'DOMTree':
+        """
+        Builds the tree from a captured snapshot dict with the same semantics as
+        Node.from_json: '#text' children are skipped and a shadowRoot becomes a
+        trailing 'shadow-root' child. The walk is iterative, so nesting depth is
+        not bounded by the recursion limit. If a DOMCleaner is given, dynamic
+        attributes are stripped in the same pass (no copy of the snapshot).
+        """
+        tree = cls()
+        last_child: List[int] = []
+        if not data:
+            tree.add_node(NO_NODE, "unknown", last_child=last_child)
+            tree._finalize()
+            return tree
+
+        clean = cleaner.clean_attributes if cleaner is not None else None
+        # Stack entries: (snapshot dict, parent index, is_shadow_wrapper)
+        stack = [(data, NO_NODE, False)]
+        while stack:
+            item, parent, is_shadow = stack.pop()
+            if is_shadow:
+                index = tree.add_node(parent, "shadow-root", last_child=last_child)
+            else:
+                attributes = item.get('attributes') or None
+                if attributes and clean is not None:
+                    attributes = clean(attributes)
+                index = tree.add_node(
+                    parent,
+                    (item.get('nodeName') or '').lower(),
+                    attributes,
+                    item.get('nodeValue') or "",
+                    last_child
+                )
+
+            pending = []
+            for child_data in item.get('children') or _EMPTY:
+                if not child_data or child_data.get('nodeName') == '#text':
+                    continue
+                pending.append((child_data, index, False))
+            if not is_shadow and item.get('shadowRoot'):
+                pending.append((item['shadowRoot'], index, True))
+            stack.extend(reversed(pending))
+
+        tree._finalize()
+        return tree
+
+    @classmethod
+    def from_cdp_snapshot(cls, snapshot: Dict, cleaner=None, document_index: int = 0, include_frames: bool = False) -> 'DOMTree':
+        """
+        Builds the tree straight from a CDP DOMSnapshot.captureSnapshot result
+        (flattened per-document node arrays plus a shared string table), without
+        materialising the nested snapshot dict.
+
+        The output matches DOMTree.from_json on the equivalent serializeNode
+        capture: rooted at the document element, '#text' and pseudo-element
+        nodes skipped, shadow roots appended as trailing 'shadow-root' children.
+        With include_frames, an iframe's content document element is attached
+        as the iframe's last child.
+        """
+        strings = snapshot.get('strings') or []
+        documents = snapshot.get('documents') or []
+        dynamic = cleaner.is_dynamic_name if cleaner is not None else None
+        tree = cls()
+        last_child: List[int] = []
+
+        # Tag and attribute names arrive as string-table indices; resolve each
+        # index to its interned id once.
+        tag_for_string: Dict[int, int] = {}
+        attr_for_string: Dict[int, int] = {}
+        n_strings = len(strings)
+
+        def rare_map(rare) -> Dict[int, int]:
+            if not rare:
+                return {}
+            return dict(zip(rare.get('index') or _EMPTY, rare.get('value') or _EMPTY))
+
+        # Per-document child arrays (text and pseudo nodes dropped, shadow roots
+        # split out), built with array operations rather than a per-node loop:
+        # kept nodes are stably sorted by parent, so each node's children are
+        # the contiguous run order[offsets[i]:offsets[i + 1]] in document order.
+        prepared: Dict[int, tuple] = {}
+
+        def prepare(doc_idx: int):
+            if doc_idx in prepared:
+                return prepared[doc_idx]
+            nodes = documents[doc_idx].get('nodes') or {}
+            parents = np.asarray(nodes.get('parentIndex') or _EMPTY, dtype=np.int64)
+            node_types = np.asarray(nodes.get('nodeType') or _EMPTY, dtype=np.int64)
+            shadow_types = rare_map(nodes.get('shadowRootType'))
+            pseudo_types = rare_map(nodes.get('pseudoType'))
+
+            count = len(parents)
+            keep = (parents >= 0) & (node_types != 3)
+            if pseudo_types:
+                keep[np.fromiter(pseudo_types, dtype=np.int64)] = False
+            shadow = np.zeros(count, dtype=bool)
+            if shadow_types:
+                shadow[np.fromiter(shadow_types, dtype=np.int64)] = True
+            kept = np.flatnonzero(keep & ~shadow)
+            kept_parents = parents[kept]
+            order = kept[np.argsort(kept_parents, kind='stable')].tolist()
+            offsets = np.zeros(count + 1, dtype=np.int64)
+            np.cumsum(np.bincount(kept_parents, minlength=count), out=offsets[1:])
+
+            shadows: Dict[int, List[int]] = {}
+            for i in np.flatnonzero(keep & shadow).tolist():
+                shadows.setdefault(int(parents[i]), []).append(i)
+            roots = kept[(node_types[kept] == 1) & (parents[kept_parents] < 0)]
+            prepared[doc_idx] = (
+                nodes.get('nodeName') or _EMPTY, nodes.get('nodeValue') or _EMPTY,
+                nodes.get('attributes') or _EMPTY, rare_map(nodes.get('contentDocumentIndex')),
+                order, offsets.tolist(), shadows, int(roots[0]) if len(roots) else NO_NODE
+            )
+            return prepared[doc_idx]
+
+        root = prepare(document_index)[-1] if document_index < len(documents) else NO_NODE
+        if root == NO_NODE:
+            tree.add_node(NO_NODE, "unknown", last_child=last_child)
+            tree._finalize()
+            return tree
+
+        key_tuples = tree._key_tuples
+        current_doc = None
+        # Stack entries: (document index, snapshot node index, parent index, is_shadow_wrapper)
+        stack = [(document_index, root, NO_NODE, False)]
+        while stack:
+            doc_idx, i, parent, is_shadow = stack.pop()
+            if doc_idx != current_doc:
+                current_doc = doc_idx
+                names, values, flat_attrs, frames, order, offsets, shadows, _ = prepare(doc_idx)
+
+            if is_shadow:
+                index = tree.add_node(parent, "shadow-root", last_child=last_child)
+            else:
+                name_idx = names[i]
+                tag_id = tag_for_string.get(name_idx)
+                if tag_id is None:
+                    tag_name = strings[name_idx].lower() if 0 <= name_idx < n_strings else ""
+                    tag_id = tag_for_string[name_idx] = tree.intern_tag(tag_name or "unknown")
+                value_idx = values[i] if i < len(values) else -1
+                text = strings[value_idx] if 0 <= value_idx < n_strings else ""
+
+                flat = flat_attrs[i] if i < len(flat_attrs) else None
+                keys = values_out = _EMPTY
+                if flat:
+                    key_list = []
+                    value_list = []
+                    for k in range(0, len(flat) - 1, 2):
+                        attr_id = attr_for_string.get(flat[k])
+                        if attr_id is None:
+                            # Cleaning is fused in: a dynamic name is classified
+                            # once per string and its attributes never stored
+                            name = strings[flat[k]]
+                            attr_id = attr_for_string[flat[k]] = (
+                                NO_NODE if dynamic is not None and dynamic(name) else tree.intern_attr(name)
+                            )
+                        if attr_id == NO_NODE:
+                            continue
+                        key_list.append(attr_id)
+                        value_list.append(strings[flat[k + 1]] if flat[k + 1] >= 0 else "")
+                    if key_list:
+                        keys = tuple(key_list)
+                        keys = key_tuples.setdefault(keys, keys)
+                        values_out = tuple(value_list)
+                index = tree._append(parent, tag_id, keys, values_out, text, last_child)
+
+            kids = order[offsets[i]:offsets[i + 1]]
+            host_shadows = None if is_shadow else shadows.get(i)
+            frame_doc = frames.get(i) if include_frames and not is_shadow and frames else None
+            if host_shadows is None and frame_doc is None:
+                if kids:
+                    stack.extend((doc_idx, c, index, False) for c in reversed(kids))
+                continue
+
+            pending = [(doc_idx, c, index, False) for c in kids or _EMPTY]
+            pending.extend((doc_idx, sr, index, True) for sr in host_shadows or _EMPTY)
+            if frame_doc is not None and frame_doc < len(documents):
+                frame_root = prepare(frame_doc)[-1]
+                if frame_root != NO_NODE:
+                    pending.append((frame_doc, frame_root, index, False))
+            stack.extend(reversed(pending))
+
+        tree._finalize()
+        return tree
+
+    @classmethod
+    def from_capture(cls, snapshot: Dict, cleaner=None) -> 'DOMTree':
+        """
+        Builds the tree from a DOMCapturer result in either capture mode: a
+        'cdp_snapshot' (DOMSnapshot.captureSnapshot) or a serializer
+        'dom_structure'. Captures arrive uncleaned, so the optional cleaner
+        filters attributes during the build. A bare snapshot dict is also
+        accepted.
+        """
+        if snapshot and snapshot.get('cdp_snapshot'):
+            return cls.from_cdp_snapshot(snapshot['cdp_snapshot'], cleaner=cleaner,
+                                         include_frames=snapshot.get('include_frames', False))
+        return cls.from_json(snapshot['dom_structure'] if snapshot and 'dom_structure' in snapshot else snapshot,
+                             cleaner=cleaner)
+
+    @classmethod
+    def from_node(cls, root: BaseNode) -> 'DOMTree':
+        """
+        Packs an existing Node graph into a DOMTree.
+        """
+        tree = cls()
+        last_child: List[int] = []
+        stack = [(root, NO_NODE)]
+        while stack:
+            node, parent = stack.pop()
+            index = tree.add_node(parent, node.tag, node.attributes, node.text, last_child)
+            stack.extend((child, index) for child in reversed(node.children))
+        tree._finalize()
+        return tree
+
+    # --- Access ---
+
+    @property
+    def root(self) -> 'NodeView':
+        return NodeView(self, 0)
+
+    @property
+    def root_hash(self) -> int:
+        """Structural hash of the whole tree; a cache key for the snapshot."""
+        return self.subtree_hash[0] if len(self.subtree_hash) else 0
+
+    @property
+    def fingerprints(self):
+        """
+        Per-node subtree SimHash (uint64 array), computed on first use and
+        cached. See common.simhash.subtree_fingerprints.
+        """
+        if self._fingerprints is None:
+            from common.simhash import subtree_fingerprints
+            self._fingerprints = subtree_fingerprints(self)
+        return self._fingerprints
+
+    def node(self, index: int) -> 'NodeView':
+        return NodeView(self, index)
+
+    def nodes(self) -> Iterator['NodeView']:
+        """Yields every node in preorder."""
+        for i in range(len(self.tag_ids)):
+            yield NodeView(self, i)
+
+    def tag_of(self, index: int) -> str:
+        return self.tag_names[self.tag_ids[index]]
+
+    def children_of(self, index: int) -> List[int]:
+        result = []
+        child = self.first_child[index]
+        next_sibling = self.next_sibling
+        while child != NO_NODE:
+            result.append(child)
+            child = next_sibling[child]
+        return result
+
+    def get_attr(self, index: int, name: str, default=None):
+        attr_id = self._attr_ids.get(name)
+        if attr_id is None:
+            return default
+        keys = self.attr_keys[index]
+        for pos, key in enumerate(keys):
+            if key == attr_id:
+                return self.attr_values[index][pos]
+        return default
+
+    def token_text(self, index: int) -> str:
+        """
+        The node's own content as SimHash input: tag, attribute names and
+        values, and text.
+        """
+        names = self.attr_names
+        parts = [self.tag_names[self.tag_ids[index]]]
+        for k, v in zip(self.attr_keys[index], self.attr_values[index]):
+            parts.append(names[k])
+            if v:
+                parts.append(str(v))
+        if self.texts[index]:
+            parts.append(self.texts[index])
+        return " ".join(parts)
+
+    def attributes_of(self, index: int) -> Dict[str, str]:
+        names = self.attr_names
+        return {names[k]: v for k, v in zip(self.attr_keys[index], self.attr_values[index])}
+
+    def outer_html(self, index: int) -> str:
+        """Markup of the subtree at index (what the semantic model embeds)."""
+        names, tags = self.attr_names, self.tag_names
+        parts = []
+        closers = []
+        end = index + self.size[index]
+        for i in range(index, end):
+            # Close every open element that i is not nested in
+            while closers and closers[-1][0] <= i:
+                parts.append(closers.pop()[1])
+            tag = tags[self.tag_ids[i]]
+            attrs = "".join(
+                f' {names[k]}="{escape(str(v))}"' if v is not None else f" {names[k]}"
+                for k, v in zip(self.attr_keys[i], self.attr_values[i])
+            )
+            parts.append(f"<{tag}{attrs}>{escape(self.texts[i], quote=False)}")
+            closers.append((i + self.size[i], f"</{tag}>"))
+        while closers:
+            parts.append(closers.pop()[1])
+        return "".join(parts)
+
+
+class NodeView(BaseNode):
+    """
+    Lightweight handle onto one node of a DOMTree. Exposes the same read
+    interface as Node (tag, attributes, children, text, id, classes).
+    """
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree: DOMTree, index: int):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def tag(self) -> str:
+        return self.tree.tag_names[self.tree.tag_ids[self.index]]
+
+    @property
+    def attributes(self) -> Dict[str, str]:
+        return self.tree.attributes_of(self.index)
+
+    @property
+    def text(self) -> str:
+        return self.tree.texts[self.index]
+
+    @property
+    def id(self):
+        return self.tree.get_attr(self.index, 'id')
+
+    @property
+    def classes(self) -> List[str]:
+        raw_classes = self.tree.get_attr(self.index, 'class')
+        return raw_classes.split() if isinstance(raw_classes, str) else []
+
+    @property
+    def children(self) -> List['NodeView']:
+        tree = self.tree
+        return [NodeView(tree, i) for i in tree.children_of(self.index)]
+
+    @property
+    def parent(self) -> Optional['NodeView']:
+        p = self.tree.parent[self.index]
+        return NodeView(self.tree, p) if p != NO_NODE else None
+
+    @property
+    def label_hash(self) -> int:
+        return self.tree.label_hash[self.index]
+
+    @property
+    def subtree_hash(self) -> int:
+        return self.tree.subtree_hash[self.index]
+
+    def get(self, name: str, default=None):
+        """Attribute lookup without materialising the attribute dict."""
+        return self.tree.get_attr(self.index, name, default)
+
+    def __eq__(self, other):
+        # Label hashes stand in for the tag/attribute/text comparison.
+        if isinstance(other, NodeView):
+            return self.tree.label_hash[self.index] == other.tree.label_hash[other.index]
+        return BaseNode.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+def as_tree(data: Union[DOMTree, BaseNode, Dict]) -> DOMTree:
+    """
+    Normalises the inputs accepted across the pipeline (snapshot dict, Node
+    graph or an already-built DOMTree) to a DOMTree.
+    """
+    if isinstance(data, DOMTree):
+        return data
+    if isinstance(data, NodeView) and data.index == 0:
+        return data.tree
+    if isinstance(data, BaseNode):
+        return DOMTree.from_node(data)
+    if data and 'documents' in data and 'strings' in data:
+        return DOMTree.from_cdp_snapshot(data)
+    return DOMTree.from_json(data)
@@ -1,13 +1,144 @@
 import json
-from typing import Dict
+import os
+import re
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+# Digit runs and hex-like hashes ("btn-4821", "css-1a2b3c") collapse to '#',
+# so churn learned on one generated value carries over to its siblings
+_VOLATILE_RE = re.compile(r'[0-9a-f]*[0-9][0-9a-f]*', re.I)
+
+def value_pattern(value: str) -> str:
+    return _VOLATILE_RE.sub('#', value)
+
+def observed_value_patterns(attribute_values: Iterable[Tuple[Tuple[str, str], int]]) -> Dict[str, int]:
+    """
+    Counts elements per "name=pattern" key from ((name, value), element
+    count) pairs, e.g. a SelectorIndex's by_attr sizes.
+    """
+    counts: Dict[str, int] = {}
+    for (name, value), count in attribute_values:
+        if isinstance(value, str):
+            key = f"{name}={value_pattern(value)}"
+            counts[key] = counts.get(key, 0) + count
+    return counts
+
 
 class AdaptiveWeighter:
     """
     Adjusts attribute weights based on historical stability.
+
+    Keeps exponentially decayed churn counters across builds, changes vs.
+    observations, per attribute name and per attribute value pattern.
+    Counters decay lazily, each storing the build it was last touched in, so
+    record_build() costs O(changes + observed) however long the history is.
+    Statistics persist in history_file between runs.
     """
+    # Weight of a counter after one more build (half-life ~6.6 builds)
+    DECAY = 0.9
+    # Churn rate above which an attribute name or value pattern is penalized
+    UNSTABLE_RATE = 0.1
+    # Decayed sightings a value pattern needs before its churn rate counts
+    MIN_VALUE_SAMPLES = 3.0
+    # Counters below this after decay are dropped when the tables grow large
+    MIN_COUNT = 0.01
+    MAX_ENTRIES = 50_000
+
     def __init__(self, history_file: str = "locator_history.json"):
-        self.history = [] # Load from file or DB
+        self.history_file = history_file
         self.penalty_factor = 0.5
+        self.builds = 0
+        self.last_build: Optional[str] = None
+        # name -> [changes, observations, build touched]
+        self.attributes: Dict[str, list] = {}
+        # "name=pattern" -> [changes, observations, build touched]
+        self.values: Dict[str, list] = {}
+        self._load()
+
+    def _load(self):
+        if not self.history_file or not os.path.exists(self.history_file):
+            return
+        with open(self.history_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.builds = data.get("builds", 0)
+        self.last_build = data.get("last_build")
+        self.attributes = data.get("attributes", {})
+        # Value counters without observations (older history files) are dropped
+        self.values = {k: v for k, v in data.get("values", {}).items() if len(v) == 3}
+
+    def save(self):
+        if not self.history_file:
+            return
+        if len(self.values) > self.MAX_ENTRIES:
+            self.values = {k: v for k, v in self.values.items() if self._decayed(v[1], v[2]) >= self.MIN_COUNT}
+        tmp_path = f"{self.history_file}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "builds": self.builds,
+                "last_build": self.last_build,
+                "attributes": self.attributes,
+                "values": self.values,
+            }, f)
+        os.replace(tmp_path, self.history_file)
+
+    def _decayed(self, count: float, touched: int) -> float:
+        return count * self.DECAY ** (self.builds - touched)
+
+    def record_build(self, build_id: str, changes: Iterable[Tuple[Mapping[str, str], Mapping[str, str]]],
+                     observed: Mapping[str, int] = None, observed_values: Mapping[str, int] = None):
+        """
+        Folds one build into the statistics.
+
+        changes holds (old attributes, new attributes) for each matched
+        element whose label changed. observed counts the elements carrying
+        each attribute name on the new page, and observed_values those per
+        "name=pattern" key (see observed_value_patterns); they are the
+        denominators of the churn rates. Re-recording the same build_id is a
+        no-op.
+        """
+        if build_id is not None and build_id == self.last_build:
+            return
+        self.builds += 1
+        self.last_build = build_id
+        observed = observed or {}
+        observed_values = observed_values or {}
+
+        def bump(table: Dict[str, list], key: str, changed: float, seen: float):
+            entry = table.get(key)
+            if entry is None:
+                table[key] = [changed, seen, self.builds]
+            else:
+                factor = self.DECAY ** (self.builds - entry[2])
+                entry[:] = [entry[0] * factor + changed, entry[1] * factor + seen, self.builds]
+
+        for name, count in observed.items():
+            bump(self.attributes, name, 0.0, count)
+        for key, count in observed_values.items():
+            bump(self.values, key, 0.0, count)
+        for old, new in changes:
+            for name in set(old) | set(new):
+                old_value, new_value = old.get(name), new.get(name)
+                if old_value == new_value:
+                    continue
+                # The changed element was itself a sighting, even if its name is gone now
+                bump(self.attributes, name, 1.0, 0.0 if name in observed else 1.0)
+                if isinstance(old_value, str):
+                    key = f"{name}={value_pattern(old_value)}"
+                    bump(self.values, key, 1.0, 0.0 if key in observed_values else 1.0)
+
+    def churn_rate(self, name: str) -> float:
+        """Decayed share of observed elements whose `name` attribute changed."""
+        return self._rate(self.attributes.get(name))
+
+    def value_churn_rate(self, name: str, value: str) -> float:
+        """Decayed share of observed values of this value's pattern that changed."""
+        return self._rate(self.values.get(f"{name}={value_pattern(value)}"))
+
+    @staticmethod
+    def _rate(entry) -> float:
+        # Both counters decay by the same factor, so the stored ratio is current
+        if not entry or entry[1] <= 0:
+            return 0.0
+        return min(1.0, entry[0] / entry[1])
 
     def get_weights(self) -> Dict[str, float]:
         weights = {
@@ -16,16 +147,27 @@ class AdaptiveWeighter:
             'name': 0.8,
             'tag': 0.5
         }
-        
-        # Analyze history to find unstable attributes
-        unstable_ids = self._find_unstable_attributes('id')
-        if unstable_ids:
-            # If many IDs are changing, lower overall ID trust or specific ID trust?
-            # ROBULA usually penalizes the specific attribute value, but here we do global weight.
-            weights['id'] *= self.penalty_factor
-            
+        # Unstable attributes lose trust in proportion to their churn rate
+        for name in self.attributes:
+            if self._find_unstable_attributes(name):
+                weights[name] = weights.get(name, 0.6) * (1.0 - self.penalty_factor * self.churn_rate(name))
         return weights
 
+    def value_weight(self, name: str, value: str, base: float = None) -> float:
+        """
+        Weight of one attribute value: the name's weight scaled down by the
+        churn rate of values of the same pattern, once the pattern has been
+        seen MIN_VALUE_SAMPLES times and churns above UNSTABLE_RATE. A rare
+        change in a large, otherwise stable pattern leaves it untouched.
+        """
+        if base is None:
+            base = self.get_weights().get(name, 0.6)
+        entry = self.values.get(f"{name}={value_pattern(value)}")
+        if not entry or self._decayed(entry[1], entry[2]) < self.MIN_VALUE_SAMPLES:
+            return base
+        rate = self._rate(entry)
+        return base * (1.0 - rate) if rate > self.UNSTABLE_RATE else base
+
     def _find_unstable_attributes(self, attr_type: str) -> bool:
-        # Check logic: if attribute changed value frequently for the same element
-        return False # mock
+        # Unstable once more than UNSTABLE_RATE of recent sightings changed value
+        return self.churn_rate(attr_type) > self.UNSTABLE_RATE
@@ -1,30 +1,147 @@
-from typing import Dict, List
-from common.models import Node
+import multiprocessing
+import os
+import time
+from typing import Dict, List, Sequence, Tuple, Union
+from common.models import BaseNode
+from common.tree import DOMTree, NodeView
+from generator.adaptive import AdaptiveWeighter
 from generator.robula import RobulaPlus
+from generator.selector_index import selector_index
+from generator.validation import ValidationReport, locator_validator
+
+# (generator, tree) inherited by forked pool workers, so the tree is never pickled
+_WORKER_STATE = None
+
+def _bundle_chunk(indices: List[int]):
+    generator, tree = _WORKER_STATE
+    bundles = generator._generate_serial([tree.node(i) for i in indices], tree)
+    report = generator.last_validation
+    if not report:
+        return bundles, ([], None)
+    # perf_counter is system-wide monotonic on fork platforms, so the parent
+    # can line up the workers' validation intervals
+    end = time.perf_counter()
+    return bundles, (report.results, (end - report.seconds, end))
+
+def _covered_seconds(spans: List[Tuple[float, float]]) -> float:
+    """Total length of the union of (start, end) intervals."""
+    total, reach = 0.0, float("-inf")
+    for start, end in sorted(spans):
+        if end > reach:
+            total += end - max(start, reach)
+            reach = end
+    return total
 
 class LocatorBundleGenerator:
-    def __init__(self):
-        self.robula = RobulaPlus()
+    # Below this many targets a pool costs more than it saves
+    MIN_PARALLEL_TARGETS = 64
+    # Chunks per worker, so uneven targets still balance across the pool
+    CHUNKS_PER_WORKER = 4
+
+    def __init__(self, validate: bool = True, weighter: AdaptiveWeighter = None):
+        # With a weighter, ROBULA+ skips attribute values that churned in past builds
+        self.robula = RobulaPlus(weighter.get_weights() if weighter else None, weighter)
+        # Check every locator against the captured DOM (lxml) before returning it
+        self.validate = validate
+        self.last_validation: ValidationReport = None
 
-    def generate_bundle(self, node: Node, context_tree: Node) -> Dict[str, str]:
+    def generate_bundle(self, node: BaseNode, context_tree: Union[DOMTree, BaseNode]) -> Dict[str, str]:
         """
         Generates a bundle of locators for the target node.
+        context_tree is normally the shared DOMTree the differ already built.
         """
         bundle = {
             "primary": self._generate_primary(node, context_tree),
             "secondary": self._generate_secondary(node),
             "tertiary": self._generate_tertiary(node)
         }
-        return bundle
+        return self._validated([node], [bundle], context_tree)[0]
+
+    def generate_bundles(self, nodes: Sequence[BaseNode], context_tree: Union[DOMTree, BaseNode],
+                         workers: int = 1) -> List[Dict[str, str]]:
+        """
+        Bundles for many targets on the same page. The primary locators are
+        generated in one RobulaPlus batch sharing the tree's selector index.
+
+        With workers > 1 (0 = one per CPU) and enough targets, contiguous
+        chunks of targets go to a fork-based process pool. Workers inherit
+        the tree and its prebuilt indexes from the parent instead of
+        receiving them per task, and results are reassembled in input
+        order, so the output matches the serial run.
+        """
+        workers = workers or os.cpu_count() or 1
+        if workers > 1 and len(nodes) >= self.MIN_PARALLEL_TARGETS and isinstance(context_tree, DOMTree) \
+                and all(isinstance(n, NodeView) and n.tree is context_tree for n in nodes) \
+                and "fork" in multiprocessing.get_all_start_methods():
+            return self._generate_parallel([n.index for n in nodes], context_tree, workers)
+        return self._generate_serial(nodes, context_tree)
+
+    def _generate_parallel(self, indices: List[int], tree: DOMTree, workers: int) -> List[Dict[str, str]]:
+        global _WORKER_STATE
+        # Build the shared read-only state once, before forking
+        selector_index(tree).positions()
+        if self.validate:
+            locator_validator(tree)
+        chunk = -(-len(indices) // (workers * self.CHUNKS_PER_WORKER))
+        chunks = [indices[k:k + chunk] for k in range(0, len(indices), chunk)]
+        _WORKER_STATE = (self, tree)
+        try:
+            with multiprocessing.get_context("fork").Pool(min(workers, len(chunks))) as pool:
+                parts = pool.map(_bundle_chunk, chunks)
+        finally:
+            _WORKER_STATE = None
+        bundles = [bundle for part, _ in parts for bundle in part]
+        if self.validate:
+            # Wall-clock time during which any worker was validating (the
+            # union of their intervals), not the sum of per-worker times
+            results = [result for _, (part, _) in parts for result in part]
+            self.last_validation = ValidationReport(results, _covered_seconds(
+                [span for _, (_, span) in parts if span is not None]))
+        return bundles
+
+    def _generate_serial(self, nodes: Sequence[BaseNode], context_tree: Union[DOMTree, BaseNode]) -> List[Dict[str, str]]:
+        try:
+            primaries = self.robula.generate_many(nodes, context_tree)
+        except Exception:
+            primaries = [self._generate_primary(node, context_tree) for node in nodes]
+        bundles = [
+            {
+                "primary": primary,
+                "secondary": self._generate_secondary(node),
+                "tertiary": self._generate_tertiary(node)
+            }
+            for node, primary in zip(nodes, primaries)
+        ]
+        return self._validated(nodes, bundles, context_tree)
+
+    def _validated(self, nodes: Sequence[BaseNode], bundles: List[Dict[str, str]],
+                   context: Union[DOMTree, BaseNode]) -> List[Dict[str, str]]:
+        """
+        Bulk-verifies the bundles on the shared DOMTree. A primary that
+        doesn't resolve to exactly its target is replaced by the anchored
+        positional path, which always does; other kinds are only reported
+        (see last_validation).
+        """
+        if not self.validate or not isinstance(context, DOMTree) \
+                or not all(isinstance(n, NodeView) and n.tree is context for n in nodes):
+            return bundles
+        validator = locator_validator(context)
+        indices = [n.index for n in nodes]
+        report = validator.validate_many(indices, bundles)
+        for index, bundle, result in zip(indices, bundles, report.results):
+            if not result.get("primary", True):
+                bundle["primary"] = self.robula._anchored_path(context, index)
+        self.last_validation = report
+        return bundles
 
-    def _generate_primary(self, node: Node, context: Node) -> str:
+    def _generate_primary(self, node: BaseNode, context: Union[DOMTree, BaseNode]) -> str:
         # 1. ROBULA+ (Robust XPath)
         try:
             return self.robula.generate_xpath(node, context)
         except Exception:
             return f"//*[@id='{node.id}']" if node.id else f"//{node.tag}"
 
-    def _generate_secondary(self, node: Node) -> str:
+    def _generate_secondary(self, node: BaseNode) -> str:
         # 2. CSS Selector (Class/ID based, simpler)
         # Prioritize ID if stable (we assume logic elsewhere handles stability checks, 
         # but here we just produce the string)
@@ -37,7 +154,7 @@ class LocatorBundleGenerator:
             
         return f"{node.tag}"
 
-    def _generate_tertiary(self, node: Node) -> str:
+    def _generate_tertiary(self, node: BaseNode) -> str:
         # 3. Text/Role based (Playwright style)
         if node.text and len(node.text.strip()) < 50:
             clean_text = node.text.strip().replace("'", "\\'")
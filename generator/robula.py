@@ -1,32 +1,56 @@
-from typing import List, Dict
-from common.models import Node
+import itertools
+import weakref
+from collections import deque
+from typing import List, Dict, Optional, Sequence, Tuple, Union
+from common.models import BaseNode
+from common.tree import DOMTree, NodeView, NO_NODE
+from generator.selector_index import selector_index, SHADOW_ROOT_TAG
+from generator.adaptive import AdaptiveWeighter
 
 class RobulaPlus:
     """
     Implementation of ROBULA+ (ROBUst Locator Algorithm).
     Generates short, robust XPaths/CSS Selectors.
     """
-    def __init__(self, adaptive_weights: Dict[str, float] = None):
+    # Candidates evaluated per target before falling back to an anchored path
+    MAX_CANDIDATES = 300
+    # Attributes tried first, in this order (ROBULA+ priority list)
+    ATTRIBUTE_PRIORITY = ('name', 'class', 'title', 'alt', 'value')
+    # Never used as predicates: volatile or handled by transfAddID
+    ATTRIBUTE_BLACKLIST = ('id', 'href', 'src', 'onclick', 'onload', 'tabindex',
+                           'width', 'height', 'style', 'size', 'maxlength')
+    DEFAULT_ATTRIBUTE_WEIGHT = 0.6
+    # Bounds on transfAddAttribute / transfAddAttributeSet fan-out
+    MAX_ATTRIBUTES = 4
+    MAX_ATTRIBUTE_SET = 3
+
+    def __init__(self, adaptive_weights: Dict[str, float] = None, weighter: AdaptiveWeighter = None):
         self.weights = adaptive_weights or {}
+        # Optional per-value weights learned from build history (generator.adaptive)
+        self.weighter = weighter
+        self._value_weights: Dict[Tuple[str, str], float] = {}
         # Default weights
         self.weights.setdefault('id', 1.0)
         self.weights.setdefault('class', 0.8)
         self.weights.setdefault('name', 0.8)
         self.weights.setdefault('text', 0.5)
         self.weights.setdefault('tag', 0.2)
+        # Per-tree memo of generated locators and ancestor-path fragments
+        self._memo = weakref.WeakKeyDictionary()
 
-    def generate_xpath(self, node: Node, context_tree: Node) -> str:
+    def generate_xpath(self, node: BaseNode, context_tree: Union[DOMTree, BaseNode]) -> str:
         """
         Generates a robust XPath for the target node within the context_tree.
+        context_tree may be a shared DOMTree, a NodeView or a standalone Node graph.
         """
         # 1. Try ID
-        if node.id and self.weights.get('id', 0) > 0.5:
+        if node.id and self._value_weight('id', node.id) > 0.5:
              xpath = f"//*[@id='{node.id}']"
              if self._is_unique(xpath, context_tree):
                  return xpath
         
         # 2. Try Classes
-        if node.classes and self.weights.get('class', 0) > 0.5:
+        if node.classes and self._value_weight('class', node.attributes.get('class') or '') > 0.5:
             # First try exact match if only one class
             if len(node.classes) == 1:
                 xpath = f"//{node.tag}[@class='{node.classes[0]}']"
@@ -39,25 +63,283 @@ class RobulaPlus:
                 if self._is_unique(xpath, context_tree):
                     return xpath
 
-        # 3. Path construction (Positional Indexing)
-        # If no unique attribute found, find the index among siblings of same tag
-        # Since our Node doesn't have parent links easily, we'll do a global tag count
-        # or a simplified approach for this prototype.
-        count = self._count_matches(f"//{node.tag}", context_tree)
-        if count <= 1:
-            return f"//{node.tag}"
-        
-        # In a real ROBULA+, we'd find the exact index relative to parent.
-        # Here we'll just use [1] as a simple fallback, but now we've at least checked classes.
-        return f"//{node.tag}[1]" 
+        # 3. ROBULA+ candidate specialization on the indexed tree
+        located = self._locate(node, context_tree)
+        if located is None:
+            # Target isn't part of the context: nothing to verify a path against
+            count = self._count_matches(f"//{node.tag}", context_tree)
+            return f"//{node.tag}" if count <= 1 else f"//{node.tag}[1]"
+        tree, index = located
+        memo = self._tree_memo(tree)["xpaths"]
+        xpath = memo.get(index)
+        if xpath is None:
+            xpath = memo[index] = self._search(tree, index)
+        return xpath
+
+    def generate_many(self, nodes: Sequence[BaseNode], context_tree: Union[DOMTree, BaseNode]) -> List[str]:
+        """
+        Locators for many targets in one pass. All targets share the tree's
+        selector index and this generator's memo of ancestor-path fragments,
+        and a target requested twice is only searched once.
+        """
+        return [self.generate_xpath(node, context_tree) for node in nodes]
+
+    # --- ROBULA+ search ---
+    #
+    # A candidate is a tuple of steps from its head (an ancestor of the target,
+    # or the target itself) down to the target; each step is
+    # (tag, ((attr, value), ...), text, position). The search pops candidates
+    # breadth-first and specializes only the head step, as in ROBULA+.
+
+    def _tree_memo(self, tree: DOMTree) -> Dict[str, Dict[int, str]]:
+        memo = self._memo.get(tree)
+        if memo is None:
+            memo = self._memo[tree] = {"xpaths": {}, "paths": {}}
+        return memo
+
+    @staticmethod
+    def _locate(node: BaseNode, context: Union[DOMTree, BaseNode]) -> Optional[Tuple[DOMTree, int]]:
+        """(tree, preorder index) of the target, packing a Node graph if needed."""
+        if isinstance(node, NodeView):
+            tree = context if isinstance(context, DOMTree) else getattr(context, 'tree', None)
+            return (node.tree, node.index) if tree is node.tree else None
+        if isinstance(context, DOMTree) or isinstance(context, NodeView):
+            return None
+        # Standalone graphs: DOMTree.from_node numbers nodes in this preorder
+        index = 0
+        stack = [context]
+        while stack:
+            curr = stack.pop()
+            if curr is node:
+                return DOMTree.from_node(context), index
+            index += 1
+            stack.extend(reversed(curr.children))
+        return None
+
+    def _search(self, tree: DOMTree, target: int) -> str:
+        index = selector_index(tree)
+        # Heads stop below a shadow-root wrapper: XPath steps cannot cross
+        # into a shadow tree, so its locators are relative to the shadow root
+        depth = 0
+        p = tree.parent[target]
+        while p != NO_NODE and tree.tag_of(p) != SHADOW_ROOT_TAG:
+            depth += 1
+            p = tree.parent[p]
+
+        start = (('*', (), None, None),)
+        if self._count_steps(tree, index, start) == 1:
+            return self._render(start)
+        worklist = deque([start])
+        seen = {start}
+        evaluated = 0
+        while worklist and evaluated < self.MAX_CANDIDATES:
+            steps = worklist.popleft()
+            for candidate in self._specialize(tree, index, steps, target, depth):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                evaluated += 1
+                if self._count_steps(tree, index, candidate) == 1:
+                    return self._render(candidate)
+                worklist.append(candidate)
+        return self._anchored_path(tree, target)
+
+    def _specialize(self, tree: DOMTree, index, steps: tuple, target: int, depth: int) -> List[tuple]:
+        """ROBULA+ transformations of the head step, in the algorithm's order."""
+        level = len(steps) - 1
+        head_node = target
+        for _ in range(level):
+            head_node = tree.parent[head_node]
+        tag, attrs, text, position = steps[0]
+        rest = steps[1:]
+        bare = not attrs and text is None and position is None
+        out = []
+
+        any_pos, tag_pos = index.positions()
+        # transfConvertStar (*[k] counts element siblings, tag[k] only same-tag ones)
+        if tag == '*':
+            converted = tag_pos[head_node] if position is not None else None
+            out.append(((tree.tag_of(head_node), attrs, text, converted),) + rest)
+        if bare:
+            # transfAddID
+            node_id = tree.get_attr(head_node, 'id')
+            if self._quotable(node_id) and self._value_weight('id', node_id) > 0.5:
+                out.append(((tag, (('id', node_id),), None, None),) + rest)
+            # transfAddText
+            node_text = tree.texts[head_node]
+            if self._quotable(node_text) and self.weights.get('text', 0) > 0.5:
+                out.append(((tag, (), node_text, None),) + rest)
+            # transfAddAttribute / transfAddAttributeSet
+            eligible = self._eligible_attributes(tree, head_node)
+            out.extend(((tag, (pair,), None, None),) + rest for pair in eligible)
+            for size in range(2, min(len(eligible), self.MAX_ATTRIBUTE_SET) + 1):
+                out.extend(((tag, combo, None, None),) + rest for combo in itertools.combinations(eligible, size))
+            # transfAddPosition (only on bare heads, so tag[k] is a plain sibling index)
+            out.append(((tag, (), None, tag_pos[head_node] if tag != '*' else any_pos[head_node]),) + rest)
+        # transfAddLevel
+        if level < depth:
+            out.append((('*', (), None, None),) + steps)
+        return out
+
+    def _eligible_attributes(self, tree: DOMTree, i: int) -> List[Tuple[str, str]]:
+        """
+        (name, value) pairs usable as predicates, most stable value first
+        (ties: priority names, then document order). Values the history
+        marks unstable are dropped here, before any candidate is built.
+        """
+        attrs = tree.attributes_of(i)
+        names = [n for n in self.ATTRIBUTE_PRIORITY if n in attrs]
+        names += [n for n in attrs if n not in self.ATTRIBUTE_PRIORITY]
+        weighted = [
+            (self._value_weight(n, attrs[n]), n) for n in names
+            if n not in self.ATTRIBUTE_BLACKLIST and self._quotable(attrs[n])
+        ]
+        if self.weighter is not None:
+            weighted.sort(key=lambda item: -item[0])
+        return [(n, attrs[n]) for weight, n in weighted if weight > 0.5][:self.MAX_ATTRIBUTES]
+
+    def _value_weight(self, name: str, value: str) -> float:
+        """Weight of an attribute value: the name's weight, scaled by its churn history if known."""
+        base = self.weights.get(name, 0 if name == 'id' else self.DEFAULT_ATTRIBUTE_WEIGHT)
+        if self.weighter is None:
+            return base
+        key = (name, value)
+        weight = self._value_weights.get(key)
+        if weight is None:
+            weight = self._value_weights[key] = self.weighter.value_weight(name, value, base)
+        return weight
+
+    @staticmethod
+    def _quotable(value) -> bool:
+        return isinstance(value, str) and value != "" and "'" not in value
+
+    def _count_steps(self, tree: DOMTree, index, steps: tuple) -> int:
+        """Matches of a candidate, counting no further than 2."""
+        any_pos, tag_pos = index.positions()
+        elements, parent = index.elements, tree.parent
+
+        def step_ok(i: int, step) -> bool:
+            tag, attrs, text, position = step
+            if tag == '*':
+                if i not in elements:
+                    return False
+            elif tree.tag_of(i) != tag:
+                return False
+            for name, value in attrs:
+                if tree.get_attr(i, name) != value:
+                    return False
+            if text is not None and tree.texts[i] != text:
+                return False
+            if position is not None and (tag_pos[i] if tag != '*' else any_pos[i]) != position:
+                return False
+            return True
+
+        def seed(step):
+            tag, attrs, text, _ = step
+            return index.matches(tag=tag, attrs=attrs, text=text)
+
+        head_set = seed(steps[0])
+        if len(steps) == 1:
+            count = 0
+            for i in head_set:
+                if step_ok(i, steps[0]):
+                    count += 1
+                    if count > 1:
+                        break
+            return count
 
-    def _is_unique(self, xpath: str, tree: Node) -> bool:
+        last_set = seed(steps[-1])
+        if len(last_set) <= len(head_set):
+            # Upward: each target-step match must have the right ancestor chain
+            count = 0
+            for i in last_set:
+                if not step_ok(i, steps[-1]):
+                    continue
+                p = i
+                for step in reversed(steps[:-1]):
+                    p = parent[p]
+                    if p == NO_NODE or not step_ok(p, step):
+                        break
+                else:
+                    count += 1
+                    if count > 1:
+                        break
+            return count
+
+        # Downward: depth-first from each head match, stopping at the second hit
+        last = len(steps) - 1
+        count = 0
+        for i in head_set:
+            if not step_ok(i, steps[0]):
+                continue
+            stack = [(i, 1)]
+            while stack:
+                p, k = stack.pop()
+                for c in tree.children_of(p):
+                    if not step_ok(c, steps[k]):
+                        continue
+                    if k < last:
+                        stack.append((c, k + 1))
+                        continue
+                    count += 1
+                    if count > 1:
+                        return count
+        return count
+
+    @staticmethod
+    def _render(steps: tuple) -> str:
+        parts = []
+        for tag, attrs, text, position in steps:
+            part = tag + "".join(f"[@{name}='{value}']" for name, value in attrs)
+            if text is not None:
+                part += f"[text()='{text}']"
+            if position is not None:
+                part += f"[{position}]"
+            parts.append(part)
+        return "//" + "/".join(parts)
+
+    def _anchored_path(self, tree: DOMTree, target: int) -> str:
+        """
+        Fallback when the search budget runs out: a positional child path
+        from the nearest ancestor with a unique id (or from the root, or
+        from the enclosing shadow root). Path fragments are memoized per
+        node, so targets sharing ancestors reuse them.
+        """
+        paths = self._tree_memo(tree)["paths"]
+        index = selector_index(tree)
+        _, tag_pos = index.positions()
+        chain = []
+        i = target
+        while i != NO_NODE and i not in paths:
+            chain.append(i)
+            if tree.tag_of(i) == SHADOW_ROOT_TAG:
+                break
+            i = tree.parent[i]
+        for i in reversed(chain):
+            node_id = tree.get_attr(i, 'id')
+            parent = tree.parent[i]
+            if tree.tag_of(i) == SHADOW_ROOT_TAG:
+                # Child steps restart at the shadow root ('/tag' from there)
+                paths[i] = ""
+            elif i != target and self._quotable(node_id) and self._value_weight('id', node_id) > 0.5 \
+                    and len(index.by_id.get(node_id, ())) == 1:
+                paths[i] = f"//*[@id='{node_id}']"
+            elif parent == NO_NODE:
+                paths[i] = f"/{tree.tag_of(i)}"
+            else:
+                tag = tree.tag_of(i)
+                same_tag = sum(1 for c in tree.children_of(parent) if tree.tag_ids[c] == tree.tag_ids[i])
+                step = tag if same_tag == 1 else f"{tag}[{tag_pos[i]}]"
+                paths[i] = f"{paths[parent]}/{step}"
+        return paths[target]
+
+    def _is_unique(self, xpath: str, tree: Union[DOMTree, BaseNode]) -> bool:
         """
         Actually checks if the given XPath-like selector is unique in the tree.
         """
         return self._count_matches(xpath, tree) == 1
 
-    def _count_matches(self, xpath: str, node: Node) -> int:
+    def _count_matches(self, xpath: str, node: Union[DOMTree, BaseNode]) -> int:
         """
         Helper to count matches for a simple XPath (tag + ID/Class).
         """
@@ -81,7 +363,18 @@ class RobulaPlus:
         elif xpath.startswith("//") and "[" not in xpath:
             tag_target = xpath.replace("//", "")
         
-        def traverse(curr: Node):
+        if isinstance(node, DOMTree):
+            node = node.root
+        if isinstance(node, NodeView):
+            # Set lookups on the tree's shared selector index, limited to the
+            # subtree's preorder range
+            tree = node.tree
+            return selector_index(tree).count(
+                lo=node.index, hi=node.index + tree.size[node.index],
+                tag=tag_target, id=id_target, class_token=class_target, class_exact=class_exact_target
+            )
+
+        def traverse(curr: BaseNode):
             nonlocal matches
             is_match = True
             
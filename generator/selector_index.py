@@ -0,0 +1,130 @@
+"""
+Per-tree selector index for locator uniqueness checks.
+
+Maps tag, id, class token, exact class string and attribute name/value to
+the set of preorder indices carrying them, so counting the matches of a
+candidate selector is a set intersection instead of a page traversal.
+"""
+import weakref
+from typing import Dict, List, Optional, Set, Tuple
+from common.tree import DOMTree
+
+_EMPTY: frozenset = frozenset()
+# Synthetic node the tree builders insert between a host and its shadow root
+SHADOW_ROOT_TAG = 'shadow-root'
+
+
+def is_element_tag(tag: str) -> bool:
+    """Whether a node with this tag is an element to XPath ('*' skips comments and shadow-root wrappers)."""
+    return not tag.startswith('#') and tag != SHADOW_ROOT_TAG
+
+
+class SelectorIndex:
+    def __init__(self, tree: DOMTree):
+        self.tree = tree
+        self.all: Set[int] = set(range(len(tree)))
+        self.elements: Set[int] = set()
+        self.by_tag: Dict[str, Set[int]] = {}
+        self.by_id: Dict[str, Set[int]] = {}
+        self.by_class_token: Dict[str, Set[int]] = {}
+        self.by_class_exact: Dict[str, Set[int]] = {}
+        self.by_attr_name: Dict[str, Set[int]] = {}
+        self.by_attr: Dict[Tuple[str, str], Set[int]] = {}
+        self.by_text: Dict[str, Set[int]] = {}
+        self._positions = None
+
+        names = tree.attr_names
+        for i in range(len(tree)):
+            self.by_tag.setdefault(tree.tag_of(i), set()).add(i)
+            if tree.texts[i]:
+                self.by_text.setdefault(tree.texts[i], set()).add(i)
+            for k, value in zip(tree.attr_keys[i], tree.attr_values[i]):
+                name = names[k]
+                self.by_attr_name.setdefault(name, set()).add(i)
+                if not isinstance(value, str):
+                    continue
+                self.by_attr.setdefault((name, value), set()).add(i)
+                if name == 'id':
+                    self.by_id.setdefault(value, set()).add(i)
+                elif name == 'class':
+                    self.by_class_exact.setdefault(value, set()).add(i)
+                    for token in value.split():
+                        self.by_class_token.setdefault(token, set()).add(i)
+        for tag, nodes in self.by_tag.items():
+            if is_element_tag(tag):
+                self.elements |= nodes
+
+    def matches(self, tag: Optional[str] = None, id: Optional[str] = None, class_token: Optional[str] = None,
+                class_exact: Optional[str] = None, attrs: Tuple[Tuple[str, str], ...] = (),
+                text: Optional[str] = None) -> Set[int]:
+        """
+        Indices matching every given constraint. Tag '*' matches elements
+        only, as in XPath; None matches any node.
+        """
+        sets = []
+        if tag == '*':
+            sets.append(self.elements)
+        elif tag:
+            sets.append(self.by_tag.get(tag, _EMPTY))
+        if id:
+            sets.append(self.by_id.get(id, _EMPTY))
+        if class_token:
+            sets.append(self.by_class_token.get(class_token, _EMPTY))
+        if class_exact:
+            sets.append(self.by_class_exact.get(class_exact, _EMPTY))
+        for key in attrs:
+            sets.append(self.by_attr.get(key, _EMPTY))
+        if text:
+            sets.append(self.by_text.get(text, _EMPTY))
+        if not sets:
+            return self.all
+        # Intersect smallest first so the work is bounded by the rarest key
+        sets.sort(key=len)
+        result = sets[0]
+        for other in sets[1:]:
+            if not result:
+                break
+            result = result & other
+        return result
+
+    def positions(self) -> Tuple[List[int], List[int]]:
+        """
+        1-based XPath positions per node: among element siblings (*[k]) and
+        among same-tag siblings (tag[k]). Comments and shadow-root wrappers
+        are not elements, so they take no *[k] position (0) and do not shift
+        their siblings'. Computed on first use.
+        """
+        if self._positions is None:
+            tree = self.tree
+            elements = self.elements
+            any_pos = [0] * len(tree)
+            tag_pos = [1] * len(tree)
+            for parent in range(len(tree)):
+                seen: Dict[int, int] = {}
+                k = 0
+                for child in tree.children_of(parent):
+                    if child in elements:
+                        k += 1
+                        any_pos[child] = k
+                    tag_id = tree.tag_ids[child]
+                    seen[tag_id] = tag_pos[child] = seen.get(tag_id, 0) + 1
+            self._positions = (any_pos, tag_pos)
+        return self._positions
+
+    def count(self, lo: int = 0, hi: Optional[int] = None, **constraints) -> int:
+        """Matches within the preorder range [lo, hi) (a subtree), default the whole tree."""
+        found = self.matches(**constraints)
+        if lo == 0 and (hi is None or hi >= len(self.tree)):
+            return len(found)
+        return sum(1 for i in found if lo <= i < hi)
+
+
+_INDEXES: 'weakref.WeakKeyDictionary[DOMTree, SelectorIndex]' = weakref.WeakKeyDictionary()
+
+
+def selector_index(tree: DOMTree) -> SelectorIndex:
+    """The tree's shared SelectorIndex, built on first use and kept while the tree lives."""
+    index = _INDEXES.get(tree)
+    if index is None:
+        index = _INDEXES[tree] = SelectorIndex(tree)
+    return index
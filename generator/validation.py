@@ -0,0 +1,257 @@
+"""
+Locator validation against the captured DOM.
+
+The cleaned tree is rebuilt once as an lxml element tree whose nodes line
+up with the DOMTree preorder, and every locator of a bundle is evaluated as
+a compiled XPath. A locator is valid when it selects exactly its target.
+Comments stay comments and each shadow root is a separate tree, so '*',
+positions and '//' behave as they do in the browser.
+"""
+import itertools
+import re
+import time
+import weakref
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Set
+from lxml import etree
+from common.tree import DOMTree, NO_NODE
+from generator.selector_index import selector_index, SHADOW_ROOT_TAG
+
+_CSS_COMPOUND_RE = re.compile(r'^([A-Za-z][\w-]*)?((?:[#.][\w-]+)*)$')
+_CSS_PART_RE = re.compile(r'([#.])([\w-]+)')
+_PLAYWRIGHT_TEXT_RE = re.compile(r"^text=(['\"])(.*)\1$", re.S)
+# '//head[...][...]/rest' whose head predicates the selector index can answer
+_HEAD_STEP_RE = re.compile(r'^//([A-Za-z_][\w.-]*|\*)((?:\[[^\[\]]*\])*)(/.*)?$', re.S)
+_PREDICATE_RE = re.compile(r'\[([^\[\]]*)\]')
+_ATTR_EQ_RE = re.compile(r"""^@([\w.-]+)=(?:'([^']*)'|"([^"]*)")$""")
+_CLASS_TOKEN_RE = re.compile(r"^contains\(concat\(' ', normalize-space\(@class\), ' '\), ' ([\w-]+) '\)$")
+
+
+def xpath_literal(value: str) -> str:
+    """XPath 1.0 string literal for value (XPath has no escapes, so mixed quotes use concat())."""
+    if "'" not in value:
+        return f"'{value}'"
+    if '"' not in value:
+        return f'"{value}"'
+    return "concat(" + ", \"'\", ".join(f"'{part}'" for part in value.split("'")) + ")"
+
+
+@lru_cache(maxsize=4096)
+def compile_xpath(expression: str) -> Optional[etree.XPath]:
+    """Compiled XPath for expression, cached by string; None when it doesn't parse."""
+    try:
+        return etree.XPath(expression)
+    except etree.XPathSyntaxError:
+        return None
+
+
+def to_xpath(locator: str) -> Optional[str]:
+    """
+    XPath equivalent of a bundle locator: plain and 'xpath=' XPaths,
+    compound CSS selectors (tag, #id, .class) and Playwright text='...'.
+    None for anything else.
+    """
+    locator = locator.strip()
+    if locator.startswith("xpath="):
+        return locator[len("xpath="):]
+    if locator.startswith("/") or locator.startswith("("):
+        return locator
+    match = _PLAYWRIGHT_TEXT_RE.match(locator)
+    if match:
+        text = match.group(2).replace("\\'", "'").replace('\\"', '"')
+        return f"//*[text()[normalize-space(.)={xpath_literal(text)}]]"
+    match = _CSS_COMPOUND_RE.match(locator)
+    if match and locator:
+        predicates = []
+        for kind, name in _CSS_PART_RE.findall(match.group(2)):
+            if kind == "#":
+                predicates.append(f"[@id={xpath_literal(name)}]")
+            else:
+                predicates.append(f"[contains(concat(' ', normalize-space(@class), ' '), ' {name} ')]")
+        return "//" + (match.group(1) or "*") + "".join(predicates)
+    return None
+
+
+class LocatorValidator:
+    """
+    Evaluates locators on an lxml copy of a DOMTree. Build once per page
+    (locator_validator() shares one per tree); matches() and validate() are
+    then compiled XPath evaluations, seeded from the selector index where
+    the expression allows it.
+    """
+
+    def __init__(self, tree: DOMTree):
+        self.tree = tree
+        self.elements: List[etree._Element] = []
+        self._index: Dict[etree._Element, int] = {}
+        # Per node, the shadow-root wrapper whose tree it belongs to (NO_NODE
+        # for the document). XPath never crosses that boundary, so a
+        # wrapper's element is detached from its host and is the root of
+        # its own tree.
+        self.scopes: List[int] = []
+        self.root = None
+        for i in range(len(tree)):
+            parent = tree.parent[i]
+            tag = tree.tag_of(i)
+            scope = NO_NODE if parent == NO_NODE else self.scopes[parent]
+            if tag == SHADOW_ROOT_TAG:
+                el = etree.Element(tag)
+                scope = i
+            elif tag.startswith('#'):
+                # Comments (and any other non-element node) are not matched by '*'
+                # and take no position among their siblings
+                el = etree.Comment(tree.texts[i].replace('--', '- -'))
+                if parent != NO_NODE:
+                    self.elements[parent].append(el)
+            else:
+                try:
+                    el = etree.Element(tag) if parent == NO_NODE else etree.SubElement(self.elements[parent], tag)
+                except ValueError:
+                    # Not a valid XML name; keep the slot so indices stay aligned
+                    el = etree.Element("_") if parent == NO_NODE else etree.SubElement(self.elements[parent], "_")
+                for name, value in tree.attributes_of(i).items():
+                    try:
+                        el.set(name, value if isinstance(value, str) else "")
+                    except ValueError:
+                        continue
+                if tree.texts[i]:
+                    el.text = tree.texts[i]
+            self.elements.append(el)
+            self.scopes.append(scope)
+            self._index[el] = i
+        self._shadowed = any(scope != NO_NODE for scope in self.scopes)
+        if self.elements:
+            self.root = etree.ElementTree(self.elements[0])
+
+    def matches(self, locator: str, limit: Optional[int] = None, scope: int = NO_NODE) -> Optional[List[int]]:
+        """
+        Preorder indices the locator selects (at most limit of them, in no
+        particular order once limited); None if it can't be evaluated.
+        scope is the shadow-root wrapper to evaluate in (default the
+        document); there a leading '/' is the shadow root.
+        """
+        expression = to_xpath(locator)
+        if expression is None or self.root is None:
+            return None
+        if scope == NO_NODE:
+            context = self.root
+        elif expression.startswith("/"):
+            context = self.elements[scope]
+            expression = "." + expression
+        else:
+            return None
+        seeded = self._seeded_matches(expression, limit, scope)
+        if seeded is not None:
+            return seeded
+        compiled = compile_xpath(expression)
+        if compiled is None:
+            return None
+        try:
+            result = compiled(context)
+        except etree.XPathEvalError:
+            return None
+        if not isinstance(result, list):
+            return None
+        found = [self._index[el] for el in result if el in self._index]
+        return found[:limit] if limit is not None else found
+
+    def _seeded_matches(self, expression: str, limit: Optional[int], scope: int = NO_NODE) -> Optional[List[int]]:
+        """
+        A '//' scan costs a pass over the whole page in libxml2. When the
+        head step only filters on tag, attribute values and class tokens,
+        its matches come from the selector index instead and the rest of
+        the path is evaluated relative to each of them, which selects the
+        same nodes. None when the expression doesn't have that shape.
+        """
+        if scope != NO_NODE:
+            if not expression.startswith(".//"):
+                return None
+            expression = expression[1:]
+        match = _HEAD_STEP_RE.match(expression)
+        if match is None:
+            return None
+        tag, predicates, rest = match.groups()
+        attrs, tokens = [], []
+        for predicate in _PREDICATE_RE.findall(predicates):
+            attr = _ATTR_EQ_RE.match(predicate)
+            if attr:
+                value = attr.group(2) if attr.group(2) is not None else attr.group(3)
+                attrs.append((attr.group(1), value))
+                continue
+            token = _CLASS_TOKEN_RE.match(predicate)
+            if token is None:
+                return None
+            tokens.append(token.group(1))
+        if rest:
+            compiled = compile_xpath("." + rest)
+            if compiled is None:
+                return None
+
+        index = selector_index(self.tree)
+        seeds = index.matches(tag=tag, attrs=tuple(attrs))
+        for token in tokens:
+            seeds = seeds & index.by_class_token.get(token, set())
+        if self._shadowed:
+            scopes = self.scopes
+            seeds = {seed for seed in seeds if scopes[seed] == scope and seed != scope}
+        if not rest:
+            return list(itertools.islice(seeds, limit)) if limit is not None else sorted(seeds)
+        found: Set[int] = set()
+        for seed in seeds:
+            try:
+                result = compiled(self.elements[seed])
+            except etree.XPathEvalError:
+                return None
+            if not isinstance(result, list):
+                return None
+            found.update(self._index[el] for el in result if el in self._index)
+            if limit is not None and len(found) >= limit:
+                return list(found)[:limit]
+        return sorted(found)
+
+    def is_unique(self, locator: str, index: int) -> bool:
+        """Whether the locator selects exactly index, evaluated in the tree (document or shadow root) holding it."""
+        found = self.matches(locator, limit=2, scope=self.scopes[index])
+        return found is not None and len(found) == 1 and found[0] == index
+
+    def validate(self, index: int, bundle: Dict[str, str]) -> Dict[str, bool]:
+        """Per locator kind, whether it resolves to exactly the target."""
+        return {kind: self.is_unique(locator, index) for kind, locator in bundle.items()}
+
+    def validate_many(self, indices: Sequence[int], bundles: Sequence[Dict[str, str]]) -> 'ValidationReport':
+        start = time.perf_counter()
+        results = [self.validate(i, bundle) for i, bundle in zip(indices, bundles)]
+        return ValidationReport(results, time.perf_counter() - start)
+
+
+class ValidationReport:
+    """Outcome of a bulk validation: per-bundle results plus totals by kind."""
+
+    def __init__(self, results: List[Dict[str, bool]], seconds: float):
+        self.results = results
+        self.seconds = seconds
+        self.totals: Dict[str, List[int]] = {}
+        for result in results:
+            for kind, ok in result.items():
+                counts = self.totals.setdefault(kind, [0, 0])
+                counts[0] += ok
+                counts[1] += 1
+
+    @property
+    def locator_count(self) -> int:
+        return sum(total for _, total in self.totals.values())
+
+    def summary(self) -> str:
+        parts = ", ".join(f"{kind} {ok}/{total}" for kind, (ok, total) in self.totals.items())
+        return f"{self.locator_count} locators in {self.seconds * 1000:.1f} ms ({parts or 'none'} unique)"
+
+
+_VALIDATORS: 'weakref.WeakKeyDictionary[DOMTree, LocatorValidator]' = weakref.WeakKeyDictionary()
+
+
+def locator_validator(tree: DOMTree) -> LocatorValidator:
+    """The tree's shared LocatorValidator, built on first use and kept while the tree lives."""
+    validator = _VALIDATORS.get(tree)
+    if validator is None:
+        validator = _VALIDATORS[tree] = LocatorValidator(tree)
+    return validator
@@ -1,16 +1,277 @@
 import asyncio
 import json
+import time
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
 from playwright.async_api import async_playwright, Page, Playwright
+from common.tree import DOMTree
+from ingest.cleaner import DOMCleaner
+
+# What each capture profile fetches besides the DOM itself. The diff only
+# reads the DOM; semantic recovery also embeds page HTML and uses roles from
+# the accessibility tree; "full" keeps the uncleaned DOM as well.
+CAPTURE_PROFILES = {
+    "minimal":  {"hydration": False, "ax_tree": False, "html": False, "raw": False},
+    "diff":     {"hydration": True,  "ax_tree": False, "html": False, "raw": False},
+    "recovery": {"hydration": True,  "ax_tree": True,  "html": True,  "raw": False},
+    "full":     {"hydration": True,  "ax_tree": True,  "html": True,  "raw": True},
+}
+# Request types dropped when resource blocking is on; none of them affect the DOM
+BLOCKED_RESOURCE_TYPES = ("image", "font", "media")
+
+# In-page DOM serializer for the "serialize" capture mode. Traverses the DOM
+# including shadow roots; the walk uses an explicit stack so deeply nested
+# component trees don't overflow the JS call stack.
+SERIALIZE_DOM_SCRIPT = """
+    () => {
+        function shell(node) {
+            const obj = {
+                nodeName: node.nodeName,
+                nodeType: node.nodeType,
+                nodeValue: node.nodeValue,
+                attributes: {},
+                children: []
+            };
+            if (node.attributes) {
+                for (let i = 0; i < node.attributes.length; i++) {
+                    const attr = node.attributes[i];
+                    obj.attributes[attr.name] = attr.value;
+                }
+            }
+            return obj;
+        }
+
+        const root = shell(document.documentElement);
+        const stack = [[document.documentElement, root]];
+        while (stack.length) {
+            const [node, obj] = stack.pop();
+
+            // Serialize children
+            if (node.childNodes) {
+                for (let i = 0; i < node.childNodes.length; i++) {
+                    const child = shell(node.childNodes[i]);
+                    obj.children.push(child);
+                    stack.push([node.childNodes[i], child]);
+                }
+            }
+
+            // Handle Shadow DOM
+            if (node.shadowRoot) {
+                obj.shadowRoot = shell(node.shadowRoot);
+                stack.push([node.shadowRoot, obj.shadowRoot]);
+            }
+        }
+        return root;
+    }
+"""
+
+
+class _BrowserSlot:
+    """One pooled browser and its reused context."""
+
+    def __init__(self):
+        self.browser = None
+        self.context = None
+        self.active = 0
+        self.served = 0
+
 
 class DOMCapturer:
+    """
+    Captures page snapshots with Playwright.
+
+    Used as an async context manager (or via start()/stop()) the capturer
+    keeps `browsers` Chromium processes alive and reuses one context per
+    browser, so each capture only pays for a new page. A browser is recycled
+    once it has served `pages_per_browser` pages or a page's JS heap
+    exceeded `max_heap_mb`; its replacement launches on demand while
+    in-flight captures finish on the old one. capture_many() runs up to
+    `concurrency` captures at once and yields each result as it completes.
+
+    capture_page() also works on a capturer that was never started, in
+    which case it launches and tears down a browser for that one page.
+
+    capture_mode selects how the DOM is read: "serialize" walks it with an
+    in-page script and returns the nested (cleaned) 'dom_structure';
+    "cdp" calls DOMSnapshot.captureSnapshot and returns the flattened
+    arrays and string table as 'cdp_snapshot', including shadow roots and
+    iframe documents, for DOMTree.from_capture to build without a nested
+    intermediate.
+
+    The DOM is returned uncleaned except under the "full" profile, which
+    also keeps the raw copy; cleaner (default: all framework presets) is
+    applied when the tree is built.
+
+    profile (see CAPTURE_PROFILES) limits what else is fetched, and
+    block_resources aborts image, font and media requests so networkidle
+    arrives sooner. With measure, each snapshot carries 'capture_stats':
+    per-step milliseconds and per-part payload bytes.
+    """
+    CAPTURE_MODES = ("serialize", "cdp")
+
+    def __init__(self, browsers: int = 1, concurrency: int = 4, pages_per_browser: int = 200,
+                 max_heap_mb: Optional[float] = 512, headless: bool = True,
+                 capture_mode: str = "serialize", include_frames: bool = False,
+                 profile: str = "full", block_resources: bool = False, measure: bool = False,
+                 cleaner: Optional[DOMCleaner] = None):
+        if capture_mode not in self.CAPTURE_MODES:
+            raise ValueError(f"Unknown capture mode '{capture_mode}', expected one of {self.CAPTURE_MODES}")
+        if profile not in CAPTURE_PROFILES:
+            raise ValueError(f"Unknown capture profile '{profile}', expected one of {tuple(CAPTURE_PROFILES)}")
+        self.browsers = max(1, browsers)
+        self.concurrency = max(1, concurrency)
+        self.pages_per_browser = pages_per_browser
+        self.max_heap_mb = max_heap_mb
+        self.headless = headless
+        self.capture_mode = capture_mode
+        self.include_frames = include_frames
+        self.profile = profile
+        self.block_resources = block_resources
+        self.measure = measure
+        self.cleaner = cleaner or DOMCleaner()
+        self._playwright: Optional[Playwright] = None
+        self._slots: List[_BrowserSlot] = []
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def __aenter__(self) -> 'DOMCapturer':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    @property
+    def started(self) -> bool:
+        return self._playwright is not None
+
+    async def start(self):
+        if self.started:
+            return
+        self._playwright = await async_playwright().start()
+        self._lock = asyncio.Lock()
+        self._slots = [_BrowserSlot() for _ in range(self.browsers)]
+
+    async def stop(self):
+        if not self.started:
+            return
+        for slot in self._slots:
+            await self._close_slot(slot)
+        self._slots = []
+        await self._playwright.stop()
+        self._playwright = None
+
+    async def _close_slot(self, slot: _BrowserSlot):
+        if slot.browser is not None:
+            try:
+                await slot.browser.close()
+            except Exception as e:
+                print(f"    [Ingest] Browser close warning: {e}")
+        slot.browser = slot.context = None
+
+    async def _acquire(self) -> _BrowserSlot:
+        async with self._lock:
+            slot = min(self._slots, key=lambda s: s.active)
+            if slot.browser is None:
+                try:
+                    slot.browser = await self._playwright.chromium.launch(headless=self.headless)
+                    slot.context = await slot.browser.new_context()
+                    if self.block_resources:
+                        await slot.context.route("**/*", self._route)
+                except Exception:
+                    # Leave the slot empty so the next capture launches afresh
+                    await self._close_slot(slot)
+                    raise
+            slot.active += 1
+            return slot
+
+    async def _release(self, slot: _BrowserSlot, heap_mb: float, broken: bool = False):
+        """Returns a capture's slot; a broken slot (its browser couldn't open a page) is retired."""
+        async with self._lock:
+            slot.active -= 1
+            slot.served += 1
+            worn = broken or slot.served >= self.pages_per_browser or \
+                (self.max_heap_mb is not None and heap_mb > self.max_heap_mb)
+            if worn and slot in self._slots:
+                # Retire: new captures go to a fresh slot from now on
+                self._slots[self._slots.index(slot)] = _BrowserSlot()
+            retired = slot not in self._slots
+        if retired and slot.active == 0:
+            await self._close_slot(slot)
+
     async def capture_page(self, url: str):
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
-            
-            await page.goto(url, wait_until="networkidle")
-            
-            # 1. Wait for Hydration (Beacon)
+        if not self.started:
+            async with DOMCapturer(browsers=1, concurrency=1, headless=self.headless,
+                                   capture_mode=self.capture_mode, include_frames=self.include_frames,
+                                   profile=self.profile, block_resources=self.block_resources,
+                                   measure=self.measure, cleaner=self.cleaner) as capturer:
+                return await capturer.capture_page(url)
+        slot = await self._acquire()
+        heap_mb = 0.0
+        page = None
+        try:
+            page = await slot.context.new_page()
+            snapshot, heap_mb = await self._snapshot(page, url)
+            return snapshot
+        finally:
+            try:
+                if page is not None:
+                    await page.close()
+            finally:
+                # No page means the browser or its context died: retire the slot
+                await self._release(slot, heap_mb, broken=page is None)
+
+    async def capture_many(self, urls: Iterable[str]) -> AsyncIterator[Dict]:
+        """
+        Captures urls concurrently and yields snapshots as they complete (not
+        in input order). A failed capture yields {"url": ..., "error": ...}
+        instead of stopping the run.
+        """
+        owned = not self.started
+        if owned:
+            await self.start()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(url: str) -> Dict:
+            async with semaphore:
+                try:
+                    return await self.capture_page(url)
+                except Exception as e:
+                    return {"url": url, "error": str(e)}
+
+        tasks = [asyncio.ensure_future(bounded(url)) for url in urls]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if owned:
+                await self.stop()
+
+    @staticmethod
+    async def _route(route):
+        if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _snapshot(self, page: Page, url: str) -> Tuple[Dict, float]:
+        """Captures one loaded page; returns (snapshot, JS heap in MB)."""
+        wants = CAPTURE_PROFILES[self.profile]
+        timings: Dict[str, float] = {}
+        clock = time.perf_counter()
+
+        def lap(step: str):
+            nonlocal clock
+            now = time.perf_counter()
+            timings[step] = (now - clock) * 1000
+            clock = now
+
+        await page.goto(url, wait_until="networkidle")
+        lap("load")
+
+        # 1. Wait for Hydration (Beacon)
+        if wants["hydration"]:
             from ingest.beacon import HV_BEACON_SCRIPT
             print("    [Ingest] Waiting for hydration...")
             try:
@@ -19,75 +280,64 @@ class DOMCapturer:
                 print(f"    [Ingest] Hydration complete. Reason: {reason}")
             except Exception as e:
                 print(f"    [Ingest] Hydration warning: {e}")
+            lap("hydration")
 
-            # 2. Capture CDP Session
-            client = await page.context.new_cdp_session(page)
-            
-            # 3. Get AXTree
-            ax_tree = await client.send("Accessibility.getFullAXTree")
-            
-            # 4. Flattened DOM with Shadow Roots
-            # We inject a script to traverse the DOM including shadow roots
-            # This is a recursive function to build a JSON representation
-            dom_snapshot = await page.evaluate("""
-                () => {
-                    function serializeNode(node) {
-                        const obj = {
-                            nodeName: node.nodeName,
-                            nodeType: node.nodeType,
-                            nodeValue: node.nodeValue,
-                            attributes: {},
-                            children: []
-                        };
-                        
-                        if (node.attributes) {
-                            for (let i = 0; i < node.attributes.length; i++) {
-                                const attr = node.attributes[i];
-                                obj.attributes[attr.name] = attr.value;
-                            }
-                        }
-                        
-                        // Serialize children
-                        if (node.childNodes) {
-                            for (let i = 0; i < node.childNodes.length; i++) {
-                                obj.children.push(serializeNode(node.childNodes[i]));
-                            }
-                        }
-                        
-                        // Handle Shadow DOM
-                        if (node.shadowRoot) {
-                            obj.shadowRoot = serializeNode(node.shadowRoot);
-                        }
-                        
-                        return obj;
-                    }
-                    return serializeNode(document.documentElement);
-                }
-            """)
-            
-            # 5. Clean DOM (Dynamic Attribute Masking)
-            from ingest.cleaner import DOMCleaner
-            cleaner = DOMCleaner()
-            clean_dom = cleaner.clean(dom_snapshot)
-            
-            content = await page.content()
-            
-            await browser.close()
-            
-            return {
-                "url": url,
-                "ax_tree": ax_tree,
-                "dom_structure": clean_dom, # Return clean structure
-                "raw_structure": dom_snapshot, # Keep raw if needed
-                "html_content": content 
+        # 2. Capture CDP Session
+        client = await page.context.new_cdp_session(page)
+        await client.send("Performance.enable")
+        
+        # 3. Get AXTree
+        parts: Dict = {}
+        if wants["ax_tree"]:
+            parts["ax_tree"] = await client.send("Accessibility.getFullAXTree")
+            lap("ax_tree")
+        
+        # 4. DOM, either as CDP flattened arrays or via the in-page serializer
+        if self.capture_mode == "cdp":
+            # Node arrays plus a shared string table, shadow roots and iframe
+            # documents included; cleaning happens while building the tree
+            parts["cdp_snapshot"] = await client.send("DOMSnapshot.captureSnapshot", {
+                "computedStyles": [], "includeDOMRects": False, "includePaintOrder": False
+            })
+            parts["include_frames"] = self.include_frames
+            lap("dom")
+        else:
+            dom_snapshot = await page.evaluate(SERIALIZE_DOM_SCRIPT)
+            lap("dom")
+
+            if wants["raw"]:
+                # 5. Clean DOM (Dynamic Attribute Masking), keeping the raw copy too
+                parts["dom_structure"] = self.cleaner.clean(dom_snapshot) # Return clean structure
+                parts["raw_structure"] = dom_snapshot # Keep raw if needed
+                lap("clean")
+            else:
+                # Cleaned while the tree is built (DOMTree.from_capture), with no copy
+                parts["dom_structure"] = dom_snapshot
+        
+        if wants["html"]:
+            parts["html_content"] = await page.content()
+            lap("html")
+
+        metrics = await client.send("Performance.getMetrics")
+        heap = next((m["value"] for m in metrics.get("metrics", []) if m["name"] == "JSHeapTotalSize"), 0)
+
+        snapshot = {"url": url, **parts}
+        if self.measure:
+            snapshot["capture_stats"] = {
+                "profile": self.profile,
+                "ms": timings,
+                "bytes": {k: len(json.dumps(v)) for k, v in parts.items() if k != "include_frames"},
             }
+        return snapshot, heap / (1 << 20)
 
 if __name__ == "__main__":
     # Test execution
     async def main():
-        capturer = DOMCapturer()
-        result = await capturer.capture_page("https://example.com")
-        print(f"Captured AXTree Nodes: {len(result['ax_tree']['nodes'])}")
-        print(f"Captured DOM Root: {result['dom_structure']['nodeName']}")
+        async with DOMCapturer() as capturer:
+            result = await capturer.capture_page("https://example.com")
+            print(f"Captured AXTree Nodes: {len(result['ax_tree']['nodes'])}")
+            print(f"Captured DOM Root: {DOMTree.from_capture(result).tag_of(0)}")
+            async for snapshot in capturer.capture_many(["https://example.com", "https://example.org"]):
+                print(f"Captured {snapshot['url']}: {'error' if 'error' in snapshot else 'ok'}")
         
     asyncio.run(main())
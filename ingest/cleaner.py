@@ -1,63 +1,97 @@
 import re
 import copy
+from typing import Dict, Iterable, Optional
+
+# Dynamic attribute-name patterns per framework. The default cleaner uses all
+# of them; a build can pick its own presets and add in-house patterns.
+FRAMEWORK_PRESETS: Dict[str, tuple] = {
+    "react": (
+        r'data-reactid',
+        r'react-id.*',
+    ),
+    "angular": (
+        r'ng-content-.*',
+        r'_ngcontent-.*',
+    ),
+    "vue": (
+        r'data-v-.*',     # Vue scoped styles
+    ),
+    "ember": (
+        r'ember\d+',      # Ember IDs
+    ),
+}
 
 class DOMCleaner:
-    def __init__(self):
+    """
+    Strips framework-generated attributes from captured DOM snapshots.
+
+    All patterns are compiled into one anchored alternation, and each
+    attribute name is classified once and memoized, so cleaning costs a
+    dict lookup per attribute. Tree builders take the cleaner as a filter
+    (DOMTree.from_json / from_cdp_snapshot / from_capture(cleaner=...)), so
+    the snapshot is neither copied nor walked a second time.
+    """
+    # Bound on memoised attribute-name verdicts; a long-running capture pool
+    # sees an open-ended stream of generated names (data-v-<hash>, ...)
+    CLASSIFY_CACHE_SIZE = 1 << 16
+
+    def __init__(self, presets: Optional[Iterable[str]] = None, patterns: Optional[Iterable[str]] = None):
+        presets = tuple(FRAMEWORK_PRESETS) if presets is None else tuple(presets)
+        unknown = [name for name in presets if name not in FRAMEWORK_PRESETS]
+        if unknown:
+            raise ValueError(f"Unknown cleaner presets {unknown}, expected some of {tuple(FRAMEWORK_PRESETS)}")
         # Regex patterns for attributes to strip
-        self.dynamic_patterns = [
-            r'^data-reactid$',
-            r'^ng-content-.*$',
-            r'^_ngcontent-.*$',
-            r'^data-v-.*$',   # Vue scoped styles
-            r'^ember\d+$',    # Ember IDs
-            r'^react-id.*$'
-        ]
-        self.compiled_patterns = [re.compile(p) for p in self.dynamic_patterns]
-
-    def clean(self, dom_node):
+        self.dynamic_patterns = [p for name in presets for p in FRAMEWORK_PRESETS[name]]
+        self.dynamic_patterns += list(patterns or ())
+        self.dynamic_regex = (
+            re.compile("(?:" + "|".join(f"(?:{p})" for p in self.dynamic_patterns) + r")\Z")
+            if self.dynamic_patterns else None
+        )
+        # Attribute name -> dynamic?
+        self._classified: Dict[str, bool] = {}
+
+    def is_dynamic_name(self, name: str) -> bool:
+        dynamic = self._classified.get(name)
+        if dynamic is None:
+            if len(self._classified) >= self.CLASSIFY_CACHE_SIZE:
+                self._classified.clear()
+            dynamic = self._classified[name] = bool(self.dynamic_regex and self.dynamic_regex.match(name))
+        return dynamic
+
+    def clean(self, dom_node, in_place: bool = False):
         """
         Deep clean the DOM node (dict) by removing dynamic attributes.
-        Returns a new clean dict.
+        Returns a new clean dict, or dom_node itself cleaned with in_place.
+        Prefer passing the cleaner to a tree builder, which needs neither.
         """
-        # We work on a copy to avoid mutating the original capture if needed elsewhere
-        # But for speed, we might mutate. Let's return a new dict for safety in prototype.
-        # Actually deepcopy is slow. Let's do a recursive reconstruction or optional mutation.
-        # For this implementation: In-place mutation of the specific 'attributes' dicts 
-        # is risky if we need original for XPaths.
-        # Let's clone.
-        node = copy.deepcopy(dom_node)
-        self._clean_recursive(node)
+        node = dom_node if in_place else copy.deepcopy(dom_node)
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            attributes = item.get('attributes')
+            if attributes:
+                for key in [k for k in attributes if self.is_dynamic_name(k)]:
+                    del attributes[key]
+            stack.extend(item.get('children') or ())
+            if item.get('shadowRoot'):
+                stack.append(item['shadowRoot'])
         return node
 
-    def _clean_recursive(self, node):
-        if 'attributes' in node and node['attributes']:
-            keys_to_delete = []
-            for key, value in node['attributes'].items():
-                if self._is_dynamic(key, value):
-                    keys_to_delete.append(key)
-            
-            for k in keys_to_delete:
-                del node['attributes'][k]
-        
-        if 'children' in node:
-            for child in node['children']:
-                self._clean_recursive(child)
-                
-        if 'shadowRoot' in node:
-            self._clean_recursive(node['shadowRoot'])
+    def clean_attributes(self, attributes):
+        """
+        Returns the attribute dict without dynamic attributes. Used as a filter
+        by the tree builders; the input is returned as-is when nothing is stripped.
+        """
+        classified = self._classified
+        for key in attributes:
+            dynamic = classified.get(key)
+            if dynamic is None:
+                dynamic = self.is_dynamic_name(key)
+            if dynamic:
+                return {k: v for k, v in attributes.items() if not self.is_dynamic_name(k)}
+        return attributes
 
     def _is_dynamic(self, key, value):
-        # Check keys
-        for pattern in self.compiled_patterns:
-            if pattern.match(key):
-                return True
-        
-        # Check values? (e.g. id="ember123")
-        # If ID looks dynamic? (e.g. ends with numbers)
-        if key == 'id' and re.match(r'.*\d{3,}$', value):
-            # Heuristic: ID ending in 3+ digits might be dynamic
-            # But dangerous for "item-123" which might be stable product ID.
-            # Keep conservative for now. Only strip completely generated ones.
-            pass
-            
-        return False
+        # Classification is by attribute name only. Ids ending in digits
+        # ("item-123") are often stable product ids, so values are kept.
+        return self.is_dynamic_name(key)
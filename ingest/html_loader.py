@@ -0,0 +1,41 @@
+from typing import Dict
+from lxml import etree, html as lxml_html
+
+def _text_node(text: str) -> Dict:
+    return {"nodeName": "#text", "nodeType": 3, "nodeValue": text, "attributes": {}, "children": []}
+
+def snapshot_from_html(markup: str) -> Dict:
+    """
+    Parses static HTML (e.g. the testing/ fixtures) into the same nested
+    structure the in-page serializeNode script produces, rooted at <html>.
+    """
+    root_el = lxml_html.document_fromstring(markup)
+
+    def shell(el) -> Dict:
+        if el.tag is etree.Comment:
+            return {"nodeName": "#comment", "nodeType": 8, "nodeValue": el.text or "", "attributes": {}, "children": []}
+        return {
+            "nodeName": str(el.tag).upper(),
+            "nodeType": 1,
+            "nodeValue": None,
+            "attributes": dict(el.attrib),
+            "children": []
+        }
+
+    root = shell(root_el)
+    stack = [(root_el, root)]
+    while stack:
+        el, obj = stack.pop()
+        if el.tag is etree.Comment:
+            continue
+        if el.text:
+            obj["children"].append(_text_node(el.text))
+        for child in el:
+            if child.tag is etree.ProcessingInstruction or child.tag is etree.Entity:
+                continue
+            child_obj = shell(child)
+            obj["children"].append(child_obj)
+            stack.append((child, child_obj))
+            if child.tail:
+                obj["children"].append(_text_node(child.tail))
+    return root
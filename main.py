@@ -12,18 +12,25 @@ if sys.stdout.encoding.lower() != 'utf-8':
         import io
         sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
-from ingest.capture import DOMCapturer
-from analyze.diff import StructuralDiffer
-from generator.robula import RobulaPlus
+from ingest.capture import DOMCapturer, CAPTURE_PROFILES
+from ingest.cleaner import DOMCleaner, FRAMEWORK_PRESETS
+from analyze.diff import StructuralDiffer, DiffBudget
+from analyze.cache import DiffCache
 from integration.registry import LocatorRegistry
 from integration.gitops import GitOpsBot
 from common.models import Node
+from common.tree import DOMTree
+from common.simhash import page_fingerprint
+from common.lsh import SimHashLSHIndex
 
-async def main(url: str, build_id: str, mode: str = "complete", target_id: str = None):
+async def main(url: str, build_id: str, mode: str = "complete", target_id: str = None, diff_engine: str = "auto", diff_budget: DiffBudget = None, diff_cache: DiffCache = None, skip_threshold: int = -1, workers: int = 1, capture_mode: str = "serialize", capture_profile: str = "diff", block_resources: bool = False, cleaner: DOMCleaner = None):
     print(f"Starting PLR for {url} [Build: {build_id}]")
     
     # 1. Ingestion
-    capturer = DOMCapturer()
+    # The pipeline below only reads the DOM, so the default "diff" profile skips the rest
+    # Dynamic-attribute filter applied while building each tree (per-build presets)
+    cleaner = cleaner or DOMCleaner()
+    capturer = DOMCapturer(capture_mode=capture_mode, profile=capture_profile, block_resources=block_resources, cleaner=cleaner)
     print("Step 1: Ingestion (Launching Browser...)")
     try:
         current_snapshot = await capturer.capture_page(url)
@@ -38,6 +45,8 @@ async def main(url: str, build_id: str, mode: str = "complete", target_id: str =
     import json
     
     SNAPSHOT_FILE = "last_snapshot.json"
+    # Page SimHash index over stored snapshots, kept next to the snapshot store
+    SNAPSHOT_INDEX_FILE = "snapshot_index.json"
     
     save_baseline = False
     
@@ -60,7 +69,14 @@ async def main(url: str, build_id: str, mode: str = "complete", target_id: str =
         # Ensure we store the URL in the snapshot
         if "url" not in current_snapshot:
              current_snapshot["url"] = url
-             
+
+        fingerprint = page_fingerprint(DOMTree.from_capture(current_snapshot, cleaner=cleaner))
+        current_snapshot["simhash"] = format(fingerprint, "016x")
+        current_snapshot["build_id"] = build_id
+        snapshot_index = SimHashLSHIndex.load(SNAPSHOT_INDEX_FILE, max_distance=max(skip_threshold, 0))
+        snapshot_index.add(f"{url}@{build_id}", fingerprint, route=url, build=build_id)
+        snapshot_index.save(SNAPSHOT_INDEX_FILE)
+
         with open(SNAPSHOT_FILE, 'w') as f:
             json.dump(current_snapshot, f, default=lambda o: o.__dict__)
         return
@@ -69,11 +85,49 @@ async def main(url: str, build_id: str, mode: str = "complete", target_id: str =
     
     # Use the real captured data for new_snapshot
     new_snapshot = current_snapshot
-    
+
+    # Build each tree once; the differ and the generators share them.
+    # Either capture mode works on either side; captures are cleaned while building.
+    old_tree = DOMTree.from_capture(old_snapshot, cleaner=cleaner)
+    new_tree = DOMTree.from_capture(new_snapshot, cleaner=cleaner)
+
+    # Material-change gate: compare page SimHashes through the snapshot index
+    snapshot_index = SimHashLSHIndex.load(SNAPSHOT_INDEX_FILE, max_distance=max(skip_threshold, 0))
+    baseline_key = f"{url}@{old_snapshot.get('build_id', 'baseline')}"
+    if baseline_key not in snapshot_index.entries:
+        old_fingerprint = int(old_snapshot["simhash"], 16) if old_snapshot.get("simhash") else page_fingerprint(old_tree)
+        snapshot_index.add(baseline_key, old_fingerprint, route=url, build=old_snapshot.get('build_id'))
+    new_fingerprint = page_fingerprint(new_tree)
+    hits = snapshot_index.query(new_fingerprint, skip_threshold, route=url) if skip_threshold >= 0 else []
+    snapshot_index.add(f"{url}@{build_id}", new_fingerprint, route=url, build=build_id)
+    snapshot_index.save(SNAPSHOT_INDEX_FILE)
+
+    # Only an identical Merkle hash proves nothing changed; the SimHash gate is
+    # opt-in, as a single renamed attribute barely moves the page fingerprint
+    if old_tree.root_hash == new_tree.root_hash:
+        print("  - Page structurally identical to the baseline. No change; skipping diff and remediation.")
+        return
+    baseline_hit = next((d for key, d in hits if key == baseline_key), None)
+    if baseline_hit is not None:
+        print(f"  - Page fingerprint within {baseline_hit} bit(s) of the baseline (threshold {skip_threshold}). No material change; skipping diff and remediation.")
+        return
+
     # 2. Analysis
     print("Step 2: Differential Analysis (RTED)")
-    differ = StructuralDiffer()
-    diff_result = differ.diff(old_snapshot["dom_structure"], new_snapshot["dom_structure"])
+    differ = StructuralDiffer(engine=diff_engine, budget=diff_budget)
+    diff_result = diff_cache.get(old_tree, new_tree, diff_engine, diff_budget) if diff_cache else None
+    if diff_result is not None:
+        print("  - Diff cache hit (same baseline/candidate pair as a previous run)")
+    else:
+        diff_result = differ.diff(old_tree, new_tree)
+        if diff_result.get("timed_out"):
+            print(f"  - {diff_result['timed_out']} diff exceeded the {diff_budget.max_seconds}s budget; used the fast engine")
+        elif diff_result.get("failed"):
+            print(f"  - {diff_result['failed']} diff failed ({diff_result['error']}); used the fast engine")
+        # A deadline or failure fallback depends on the machine, so it isn't cached
+        if diff_cache and not diff_result.get("timed_out") and not diff_result.get("failed"):
+            diff_cache.put(old_tree, new_tree, diff_engine, diff_result, diff_budget)
+    print(f"  - Diff strategy: {diff_result.get('strategy', diff_engine)} ({len(old_tree)} -> {len(new_tree)} nodes, {diff_result.get('elapsed', 0):.2f}s)")
     print(f"  - Edit Distance: {diff_result['distance']}")
     
     # Identify broken locators based on diff mapping
@@ -100,6 +154,7 @@ async def main(url: str, build_id: str, mode: str = "complete", target_id: str =
     else:
         # COMPLETE MODE: Scan mapping for nodes with ID or Class
         print("  - Scanning all elements for status...")
+        # n1 != n2 compares precomputed label hashes for tree nodes
         for n1, n2 in diff_result['mapping']:
             if n1 and (n1.attributes.get('id') or n1.attributes.get('class')):
                 # Use ID as key, fall back to class
@@ -117,12 +172,26 @@ async def main(url: str, build_id: str, mode: str = "complete", target_id: str =
     
     all_bundles = []
     from generator.bundle import LocatorBundleGenerator
-    bundle_gen = LocatorBundleGenerator()
-    new_root = Node.from_json(new_snapshot["dom_structure"] if "dom_structure" in new_snapshot else new_snapshot)
+    from generator.adaptive import AdaptiveWeighter, observed_value_patterns
+    from generator.selector_index import selector_index
+    # Locators are weighted by earlier builds only; this build's churn is
+    # folded in afterwards so the changes being remediated don't penalize
+    # the attributes chosen to remediate them
+    weighter = AdaptiveWeighter()
+    bundle_gen = LocatorBundleGenerator(weighter=weighter)
 
-    for key, n1, n2 in mutations_to_process:
+    bundles = bundle_gen.generate_bundles([n2 for _, _, n2 in mutations_to_process], new_tree, workers=workers)
+
+    index = selector_index(new_tree)
+    observed = {name: len(nodes) for name, nodes in index.by_attr_name.items()}
+    observed_values = observed_value_patterns((key, len(nodes)) for key, nodes in index.by_attr.items())
+    weighter.record_build(build_id, [(n1.attributes, n2.attributes) for _, n1, n2 in mutations_to_process if n1 and n2],
+                          observed, observed_values)
+    weighter.save()
+    if bundle_gen.last_validation:
+        print(f"  - Validated {bundle_gen.last_validation.summary()}")
+    for (key, n1, n2), bundle in zip(mutations_to_process, bundles):
         print(f"  - Remediating: {key}")
-        bundle = bundle_gen.generate_bundle(n2, new_root)
         all_bundles.append({
             "key": key,
             "old_node": n1,
@@ -225,6 +294,20 @@ if __name__ == "__main__":
     parser.add_argument("--build", default="AUTO", help="Build Identifier (e.g. 101, staging-v4)")
     parser.add_argument("--target-id", default=None, help="The specific ID to track (if using single mode)")
     parser.add_argument("--mode", choices=["single", "complete"], default="complete", help="Operation mode (defaults to complete)")
+    parser.add_argument("--diff-engine", choices=StructuralDiffer.ENGINES, default="auto", help="Tree diff engine: exact (APTED), hybrid (hash-pruned APTED), fast (GumTree-style) or auto (by page size)")
+    parser.add_argument("--diff-timeout", type=float, default=None, help="Wall-clock budget (seconds) for the diff: diffs estimated to exceed it degrade to a cheaper strategy up front, and an APTED run still going at the deadline is stopped for the fast engine")
+    parser.add_argument("--diff-max-nodes", type=int, default=None, help="Largest tree (nodes) APTED may be run on")
+    parser.add_argument("--diff-max-memory-mb", type=float, default=None, help="Estimated APTED memory budget in MB")
+    parser.add_argument("--diff-cache-dir", default=".plr_cache/diff", help="Directory of the on-disk diff result cache")
+    parser.add_argument("--diff-cache-mb", type=int, default=256, help="Diff cache size limit in MB (LRU eviction)")
+    parser.add_argument("--no-diff-cache", action="store_true", help="Always recompute the diff")
+    parser.add_argument("--skip-threshold", type=int, default=-1, help="Also skip diffing when the page SimHash is within this many bits of the baseline; may miss single-attribute changes (default -1: only identical pages are skipped)")
+    parser.add_argument("--capture-mode", choices=DOMCapturer.CAPTURE_MODES, default="serialize", help="DOM capture: in-page serializer or CDP DOMSnapshot.captureSnapshot (flattened, faster on large pages)")
+    parser.add_argument("--capture-profile", choices=list(CAPTURE_PROFILES), default="diff", help="What to fetch per page: minimal, diff (DOM only), recovery (+HTML, AX tree) or full (+raw DOM)")
+    parser.add_argument("--block-resources", action="store_true", help="Abort image, font and media requests during capture")
+    parser.add_argument("--cleaner-presets", default=",".join(FRAMEWORK_PRESETS), help=f"Comma-separated framework presets of dynamic attributes to strip ({', '.join(FRAMEWORK_PRESETS)})")
+    parser.add_argument("--cleaner-pattern", action="append", default=[], help="Extra dynamic attribute-name regex (repeatable), e.g. for an in-house framework")
+    parser.add_argument("--workers", type=int, default=1, help="Processes for locator-bundle generation on large batches (0 = one per CPU)")
     args = parser.parse_args()
     
     # If no build ID provided, generate one based on timestamp
@@ -232,4 +315,11 @@ if __name__ == "__main__":
         import datetime
         args.build = datetime.datetime.now().strftime("%H%M")
         
-    asyncio.run(main(args.url, args.build, args.mode, args.target_id))
+    budget = None
+    if args.diff_timeout is not None or args.diff_max_nodes is not None or args.diff_max_memory_mb is not None:
+        budget = DiffBudget(args.diff_timeout, args.diff_max_nodes, args.diff_max_memory_mb)
+        
+    cache = None if args.no_diff_cache else DiffCache(args.diff_cache_dir, args.diff_cache_mb * 1024 * 1024)
+
+    asyncio.run(main(args.url, args.build, args.mode, args.target_id, args.diff_engine, budget, cache, args.skip_threshold, args.workers, args.capture_mode, args.capture_profile, args.block_resources,
+                     DOMCleaner([p for p in args.cleaner_presets.split(",") if p], args.cleaner_pattern)))
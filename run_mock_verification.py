@@ -86,6 +86,13 @@ StructuralDiffer.diff = mock_diff
 # so Node.from_json doesn't crash on MagicMocks
 async def mock_capture_page(self, url):
     print(f"[Mock] Capturing {url}")
+    # Serve the old build until it is the stored baseline, then the new one,
+    # so the second run sees a changed page and takes the diff path
+    import json, os
+    has_baseline = False
+    if os.path.exists("last_snapshot.json"):
+        with open("last_snapshot.json", "r") as f:
+            has_baseline = json.load(f).get("url") == url
     # Return a fake snapshot structure
     return {
         "url": url,
@@ -95,7 +102,7 @@ async def mock_capture_page(self, url):
             "children": [
                 {
                     "nodeName": "div",
-                    "attributes": {"id": "submit-btn-v2"}, # The new state
+                    "attributes": {"id": "submit-btn-v2" if has_baseline else "login-btn"}, # The new state
                     "children": []
                 }
             ]
@@ -0,0 +1,54 @@
+import os
+import tempfile
+from common.models import Node
+from common.tree import DOMTree
+from generator.adaptive import AdaptiveWeighter, observed_value_patterns
+from generator.robula import RobulaPlus
+from generator.selector_index import selector_index
+
+def build_page(ids):
+    return DOMTree.from_node(Node("body", children=[Node("div", {"id": i}) for i in ids]))
+
+def record(weighter, build_id, old_ids, new_ids):
+    tree = build_page(new_ids)
+    index = selector_index(tree)
+    changes = [({"id": a}, {"id": b}) for a, b in zip(old_ids, new_ids) if a != b]
+    weighter.record_build(build_id, changes,
+                          {name: len(nodes) for name, nodes in index.by_attr_name.items()},
+                          observed_value_patterns((key, len(nodes)) for key, nodes in index.by_attr.items()))
+    return tree
+
+def test_rare_change_keeps_pattern():
+    print("Testing that one changed id out of 105 does not demote the whole id pattern...")
+    with tempfile.TemporaryDirectory() as scratch:
+        weighter = AdaptiveWeighter(os.path.join(scratch, "history.json"))
+        old_ids = [f"node-{k}" for k in range(105)]
+        new_ids = list(old_ids)
+        new_ids[3] = "node-3-renamed"
+        tree = record(weighter, "b1", old_ids, new_ids)
+
+        rate = weighter.value_churn_rate("id", "node-57")
+        weight = weighter.value_weight("id", "node-57", 1.0)
+        xpath = RobulaPlus(weighter=weighter).generate_xpath(tree.node(58), tree)
+        print(f"  - Pattern churn {rate:.4f}, weight {weight:.2f}, locator {xpath}")
+        assert weight == 1.0, weight
+        assert xpath == "//*[@id='node-57']", xpath
+    print("SUCCESS: rare change leaves the pattern stable.")
+
+def test_churning_pattern_demoted():
+    print("Testing that a pattern regenerated every build is demoted...")
+    with tempfile.TemporaryDirectory() as scratch:
+        weighter = AdaptiveWeighter(os.path.join(scratch, "history.json"))
+        ids = [f"css-{k}a" for k in range(20)]
+        for build in range(1, 5):
+            new_ids = [f"css-{k}a{build}" for k in range(20)]
+            record(weighter, f"b{build}", ids, new_ids)
+            ids = new_ids
+        weight = weighter.value_weight("id", ids[0], 1.0)
+        print(f"  - Pattern churn {weighter.value_churn_rate('id', ids[0]):.2f}, weight {weight:.2f}")
+        assert weight <= 0.5, weight
+    print("SUCCESS: churning pattern demoted.")
+
+if __name__ == "__main__":
+    test_rare_change_keeps_pattern()
+    test_churning_pattern_demoted()
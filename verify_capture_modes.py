@@ -0,0 +1,98 @@
+import copy
+import random
+from common.tree import DOMTree
+from ingest.cleaner import DOMCleaner
+from benchmarks.synthetic import make_snapshot, to_cdp_snapshot
+
+def with_shadow_and_comments(node_count=2000, seed=4):
+    """Synthetic page with comments, open shadow roots (one nested) and texts."""
+    snapshot = make_snapshot(node_count, seed=seed)
+    rng = random.Random(seed)
+    elements = []
+    stack = [snapshot]
+    while stack:
+        item = stack.pop()
+        elements.append(item)
+        stack.extend(c for c in item["children"] if c["nodeName"] != "#text")
+    for item in rng.sample(elements, 40):
+        item["children"].insert(rng.randint(0, len(item["children"])),
+                                {"nodeName": "#comment", "nodeType": 8, "nodeValue": "c", "attributes": {}, "children": []})
+    hosts = rng.sample(elements, 5)
+    for k, host in enumerate(hosts):
+        host["shadowRoot"] = {"nodeName": "#document-fragment", "nodeType": 11, "nodeValue": None, "attributes": {}, "children": [
+            {"nodeName": "#comment", "nodeType": 8, "nodeValue": "slot", "attributes": {}, "children": []},
+            {"nodeName": "BUTTON", "nodeType": 1, "nodeValue": None, "attributes": {"class": f"inner-{k}", "data-v-1f": ""}, "children": [
+                {"nodeName": "#text", "nodeType": 3, "nodeValue": "Go", "attributes": {}, "children": []}]},
+        ]}
+    # A shadow host inside a shadow tree
+    inner = hosts[0]["shadowRoot"]["children"][1]
+    inner["shadowRoot"] = {"nodeName": "#document-fragment", "nodeType": 11, "nodeValue": None, "attributes": {}, "children": [
+        {"nodeName": "SPAN", "nodeType": 1, "nodeValue": None, "attributes": {"id": "deep"}, "children": []}]}
+    return snapshot
+
+def add_pseudo_elements(cdp, count=10, seed=2):
+    """Appends ::before nodes (pseudoType), which the serializer never sees."""
+    nodes = cdp["documents"][0]["nodes"]
+    strings = cdp["strings"]
+    strings.append("::before")
+    name = len(strings) - 1
+    rng = random.Random(seed)
+    parents = [i for i, t in enumerate(nodes["nodeType"]) if t == 1]
+    pseudo = nodes.setdefault("pseudoType", {"index": [], "value": []})
+    for parent in rng.sample(parents, count):
+        pseudo["index"].append(len(nodes["parentIndex"]))
+        pseudo["value"].append(name)
+        nodes["parentIndex"].append(parent)
+        nodes["nodeType"].append(1)
+        nodes["nodeName"].append(name)
+        nodes["nodeValue"].append(-1)
+        nodes["attributes"].append([])
+    return cdp
+
+def assert_same_tree(a, b, label):
+    assert len(a) == len(b), f"{label}: {len(a)} vs {len(b)} nodes"
+    for i in range(len(a)):
+        assert (a.tag_of(i), a.parent[i], a.attributes_of(i), a.texts[i]) == \
+               (b.tag_of(i), b.parent[i], b.attributes_of(i), b.texts[i]), f"{label}: node {i} differs"
+    assert a.root_hash == b.root_hash, f"{label}: root_hash differs"
+    assert list(a.subtree_hash) == list(b.subtree_hash), f"{label}: subtree hashes differ"
+
+def test_cdp_build_matches_serialize_build():
+    print("Testing that CDP and serialize captures build the same tree...")
+    snapshot = with_shadow_and_comments()
+    cdp = add_pseudo_elements(to_cdp_snapshot(snapshot))
+    serialized = DOMTree.from_json(copy.deepcopy(snapshot))
+    tags = {serialized.tag_of(i) for i in range(len(serialized))}
+    assert {"#comment", "shadow-root"} <= tags
+    for label, cleaner in (("uncleaned", None), ("cleaned", DOMCleaner())):
+        a = DOMTree.from_json(copy.deepcopy(snapshot), cleaner=cleaner)
+        b = DOMTree.from_capture({"cdp_snapshot": cdp}, cleaner=cleaner)
+        assert_same_tree(a, b, label)
+        print(f"  - {label}: {len(a)} nodes, root_hash {a.root_hash:016x} in both modes")
+    print("SUCCESS: both capture modes give identical trees and hashes.")
+
+def test_cdp_hash_sees_shadow_and_comment_changes():
+    print("Testing that edits inside shadow roots and comments change the CDP root_hash...")
+    snapshot = with_shadow_and_comments()
+    base = DOMTree.from_capture({"cdp_snapshot": to_cdp_snapshot(snapshot)}).root_hash
+    deep = copy.deepcopy(snapshot)
+    stack = [deep]
+    while stack:
+        item = stack.pop()
+        if item.get("attributes", {}).get("id") == "deep":
+            item["attributes"]["id"] = "deeper"
+        stack.extend(item.get("children", []))
+        if item.get("shadowRoot"):
+            stack.append(item["shadowRoot"])
+    removed = copy.deepcopy(snapshot)
+    removed["children"] = [c for c in removed["children"] if c["nodeName"] != "#comment"] + \
+                          [{"nodeName": "#comment", "nodeType": 8, "nodeValue": "new", "attributes": {}, "children": []}]
+    for label, changed in (("nested shadow id", deep), ("comment", removed)):
+        cdp_hash = DOMTree.from_capture({"cdp_snapshot": to_cdp_snapshot(changed)}).root_hash
+        assert cdp_hash != base and cdp_hash == DOMTree.from_json(changed).root_hash, label
+        print(f"  - {label}: hash changed, still equal across modes")
+    print("SUCCESS: shadow and comment edits are visible to the hash.")
+
+if __name__ == "__main__":
+    test_cdp_build_matches_serialize_build()
+    test_cdp_hash_sees_shadow_and_comment_changes()
@@ -0,0 +1,200 @@
+import asyncio
+import sys
+from unittest.mock import MagicMock
+
+# The browser is faked below; only stub the bindings when absent
+for name in ("playwright", "playwright.async_api"):
+    try:
+        __import__(name)
+    except ImportError:
+        sys.modules[name] = MagicMock()
+
+import ingest.capture
+from ingest.capture import DOMCapturer
+
+MB = 1 << 20
+
+
+class FakeCDPSession:
+    def __init__(self, page):
+        self.page = page
+
+    async def send(self, method, params=None):
+        if method == "Performance.getMetrics":
+            return {"metrics": [{"name": "JSHeapTotalSize", "value": self.page.heap_mb * MB}]}
+        if method == "DOMSnapshot.captureSnapshot":
+            return {"strings": [], "documents": []}
+        return {}
+
+
+class FakePage:
+    def __init__(self, context):
+        self.context = context
+        self.heap_mb = 10
+
+    async def goto(self, url, wait_until=None):
+        playwright = self.context.browser.playwright
+        playwright.in_flight += 1
+        playwright.peak = max(playwright.peak, playwright.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if "fail" in url:
+                raise RuntimeError(f"navigation to {url} failed")
+            if "heavy" in url:
+                self.heap_mb = 600
+        finally:
+            playwright.in_flight -= 1
+
+    async def close(self):
+        self.context.browser.open_pages -= 1
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+
+    async def new_page(self):
+        if self.browser.crashed:
+            raise RuntimeError("Target page, context or browser has been closed")
+        self.browser.open_pages += 1
+        self.browser.pages += 1
+        return FakePage(self)
+
+    async def new_cdp_session(self, page):
+        return FakeCDPSession(page)
+
+    async def route(self, pattern, handler):
+        pass
+
+
+class FakeBrowser:
+    def __init__(self, playwright):
+        self.playwright = playwright
+        self.crashed = False
+        self.closed = False
+        self.pages = 0
+        self.open_pages = 0
+
+    async def new_context(self):
+        return FakeContext(self)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.chromium = self
+        self.browsers = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def launch(self, headless=True):
+        self.browsers.append(FakeBrowser(self))
+        return self.browsers[-1]
+
+    async def start(self):
+        return self
+
+    async def stop(self):
+        pass
+
+
+def run(coroutine):
+    """Runs a coroutine against a fresh FakePlaywright; returns (result, playwright)."""
+    playwright = FakePlaywright()
+    real = ingest.capture.async_playwright
+    ingest.capture.async_playwright = lambda: playwright
+    try:
+        return asyncio.run(coroutine), playwright
+    finally:
+        ingest.capture.async_playwright = real
+
+
+def capturer(**kwargs):
+    return DOMCapturer(capture_mode="cdp", profile="minimal", **kwargs)
+
+
+def test_recycle_by_page_count():
+    print("Testing that a browser is recycled after pages_per_browser pages...")
+
+    async def scenario():
+        async with capturer(pages_per_browser=3) as c:
+            for k in range(7):
+                await c.capture_page(f"http://test/{k}")
+            return [b.closed for b in c._playwright.browsers]
+
+    closed, playwright = run(scenario())
+    print(f"  - {len(playwright.browsers)} browsers for 7 pages, pages each {[b.pages for b in playwright.browsers]}")
+    assert [b.pages for b in playwright.browsers] == [3, 3, 1]
+    assert closed == [True, True, False]
+    assert all(b.closed and b.open_pages == 0 for b in playwright.browsers)
+    print("SUCCESS: worn browsers closed, the pool kept serving.")
+
+
+def test_recycle_by_heap_size():
+    print("Testing that a page over max_heap_mb retires its browser...")
+
+    async def scenario():
+        async with capturer(max_heap_mb=512) as c:
+            await c.capture_page("http://test/light")
+            await c.capture_page("http://test/heavy")
+            await c.capture_page("http://test/light")
+
+    _, playwright = run(scenario())
+    print(f"  - pages per browser {[b.pages for b in playwright.browsers]}")
+    assert [b.pages for b in playwright.browsers] == [2, 1]
+    print("SUCCESS: the heavy page's browser was replaced.")
+
+
+def test_release_on_failure():
+    print("Testing that failed captures release their slot and a dead browser is retired...")
+
+    async def scenario():
+        async with capturer(browsers=1) as c:
+            # A navigation error leaves the browser in service
+            try:
+                await c.capture_page("http://test/fail")
+            except RuntimeError:
+                pass
+            assert c._slots[0].active == 0 and len(c._playwright.browsers) == 1
+            # A crashed browser can't open pages: its slot must not stay busy or in the pool
+            c._playwright.browsers[0].crashed = True
+            try:
+                await c.capture_page("http://test/crash")
+            except RuntimeError:
+                pass
+            assert c._slots[0].active == 0
+            snapshot = await c.capture_page("http://test/after")
+            return snapshot
+
+    snapshot, playwright = run(scenario())
+    print(f"  - browsers launched {len(playwright.browsers)}, first closed {playwright.browsers[0].closed}")
+    assert snapshot["url"] == "http://test/after"
+    assert len(playwright.browsers) == 2 and playwright.browsers[0].closed
+    print("SUCCESS: captures continue after a browser crash.")
+
+
+def test_capture_many_concurrency():
+    print("Testing that capture_many keeps at most `concurrency` pages in flight...")
+    urls = [f"http://test/{k}" for k in range(12)] + ["http://test/fail"]
+
+    async def scenario():
+        c = capturer(browsers=2, concurrency=3)
+        return [snapshot async for snapshot in c.capture_many(urls)], c.started
+
+    (results, started), playwright = run(scenario())
+    errors = [r["url"] for r in results if "error" in r]
+    print(f"  - {len(results)} results, peak in flight {playwright.peak}, errors {errors}")
+    assert sorted(r["url"] for r in results) == sorted(urls)
+    assert errors == ["http://test/fail"]
+    assert playwright.peak <= 3 and not started
+    assert all(b.closed for b in playwright.browsers)
+    print("SUCCESS: concurrency bounded, failures reported, pool stopped.")
+
+
+if __name__ == "__main__":
+    test_recycle_by_page_count()
+    test_recycle_by_heap_size()
+    test_release_on_failure()
+    test_capture_many_concurrency()
@@ -0,0 +1,85 @@
+import copy
+import re
+from ingest.cleaner import DOMCleaner, FRAMEWORK_PRESETS
+from benchmarks.bench_cleaner import LegacyCleaner
+from benchmarks.synthetic import make_snapshot
+
+# The per-attribute regexes DOMCleaner used before the patterns were fused,
+# by preset; each was tried on its own with re.match
+BASELINE = {
+    "react": (r'^data-reactid$', r'^react-id.*$'),
+    "angular": (r'^ng-content-.*$', r'^_ngcontent-.*$'),
+    "vue": (r'^data-v-.*$',),
+    "ember": (r'^ember\d+$',),
+}
+CUSTOM = (r'qa-(?:tmp|gen)-\d+', r'x-\d+', r'foo|bar')
+
+NAMES = [
+    "id", "class", "name", "style", "data-reactid", "data-reactid-x", "xdata-reactid", "react-id", "react-idx",
+    "react-id-1.2", "ng-content-", "ng-content-c3", "_ngcontent-c12", "_ngcontent", "ngcontent-c1", "data-v-",
+    "data-v-1f2e", "data-vue", "xdata-v-1", "ember", "ember12", "ember12a", "Ember12", "qa-tmp-4", "qa-gen-77",
+    "qa-tmp-", "qa-other-4", "x-12", "x-12b", "ax-12", "foo", "bar", "foobar", "fooo", "food", "",
+]
+
+def corpus():
+    names = set(NAMES)
+    stack = [make_snapshot(2000, seed=13)]
+    while stack:
+        item = stack.pop()
+        names.update(item.get("attributes") or {})
+        stack.extend(item.get("children") or ())
+    return sorted(names)
+
+def baseline_dynamic(name, presets, patterns=()):
+    regexes = [p for preset in presets for p in BASELINE[preset]] + [f"^(?:{p})$" for p in patterns]
+    return any(re.match(r, name) for r in regexes)
+
+def test_presets_match_baseline():
+    print("Testing preset classification against the baseline per-attribute regexes...")
+    names = corpus()
+    assert set(BASELINE) == set(FRAMEWORK_PRESETS)
+    choices = [(), *((p,) for p in FRAMEWORK_PRESETS), tuple(FRAMEWORK_PRESETS), ("react", "vue")]
+    for presets in choices:
+        cleaner = DOMCleaner(presets)
+        dynamic = [n for n in names if cleaner.is_dynamic_name(n)]
+        expected = [n for n in names if baseline_dynamic(n, presets)]
+        assert dynamic == expected, (presets, set(dynamic) ^ set(expected))
+        print(f"  - {','.join(presets) or 'none'}: {len(dynamic)} of {len(names)} names dynamic")
+    print("SUCCESS: presets classify exactly like the baseline.")
+
+def test_custom_patterns_match_baseline():
+    print("Testing custom patterns (alone and with presets) against per-pattern regexes...")
+    names = corpus()
+    for presets in ((), tuple(FRAMEWORK_PRESETS)):
+        cleaner = DOMCleaner(presets, patterns=CUSTOM)
+        dynamic = [n for n in names if cleaner.is_dynamic_name(n)]
+        expected = [n for n in names if baseline_dynamic(n, presets, CUSTOM)]
+        assert dynamic == expected, (presets, set(dynamic) ^ set(expected))
+        print(f"  - presets {','.join(presets) or 'none'} + {len(CUSTOM)} patterns: {len(dynamic)} names dynamic")
+    print("SUCCESS: custom patterns are anchored like the baseline.")
+
+class TinyMemoCleaner(DOMCleaner):
+    CLASSIFY_CACHE_SIZE = 4
+
+def test_clean_matches_legacy_cleaner():
+    print("Testing clean() and clean_attributes() output against the legacy cleaner...")
+    snapshot = make_snapshot(3000, seed=21)
+    snapshot["children"][1]["shadowRoot"] = {"nodeName": "#document-fragment", "attributes": {}, "children": [
+        {"nodeName": "DIV", "attributes": {"data-v-9": "", "ember7": "", "title": "t"}, "children": []}]}
+    expected = LegacyCleaner().clean(snapshot)
+    # A memo far smaller than the name set is cleared repeatedly; verdicts must not change
+    for cleaner in (DOMCleaner(), TinyMemoCleaner()):
+        assert cleaner.clean(snapshot) == expected
+        in_place = copy.deepcopy(snapshot)
+        assert cleaner.clean(in_place, in_place=True) is in_place and in_place == expected
+        for name in NAMES:
+            attrs = {"id": "a", name: "v"}
+            assert cleaner.clean_attributes(attrs) == {k: v for k, v in attrs.items() if not baseline_dynamic(k, FRAMEWORK_PRESETS)}
+        assert len(cleaner._classified) <= cleaner.CLASSIFY_CACHE_SIZE
+    assert expected["children"][1]["shadowRoot"]["children"][0]["attributes"] == {"title": "t"}
+    print("SUCCESS: cleaned snapshots identical to the legacy cleaner.")
+
+if __name__ == "__main__":
+    test_presets_match_baseline()
+    test_custom_patterns_match_baseline()
+    test_clean_matches_legacy_cleaner()
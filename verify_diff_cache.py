@@ -0,0 +1,40 @@
+import json
+import os
+import tempfile
+from common.models import Node
+from common.tree import DOMTree
+from analyze.cache import DiffCache
+from analyze.diff import StructuralDiffer
+
+def test_malformed_entries_are_misses():
+    print("Testing that truncated or edited diff cache entries read as misses...")
+    t1 = DOMTree.from_node(Node("body", children=[Node("div", {"id": "a"}), Node("p", text="x")]))
+    t2 = DOMTree.from_node(Node("body", children=[Node("div", {"id": "b"})]))
+    result = StructuralDiffer("exact").diff(t1, t2)
+    with tempfile.TemporaryDirectory() as scratch:
+        cache = DiffCache(scratch)
+        assert cache.put(t1, t2, "exact", result)
+        path = os.path.join(scratch, f"{cache.key(t1, t2, 'exact')}.json")
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        hit = cache.get(t1, t2, "exact")
+        assert hit is not None and hit["distance"] == result["distance"] and len(hit["mapping"]) == len(result["mapping"])
+
+        broken = {
+            "truncated file": json.dumps(entry)[:20],
+            "missing pairs": json.dumps({"distance": entry["distance"]}),
+            "missing distance": json.dumps({"pairs": entry["pairs"]}),
+            "odd pair list": json.dumps(dict(entry, pairs=entry["pairs"][:-1])),
+            "index out of range": json.dumps(dict(entry, pairs=[0, 99])),
+            "non-integer index": json.dumps(dict(entry, pairs=["0", 0])),
+            "not an object": json.dumps([1, 2]),
+        }
+        for label, text in broken.items():
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            assert cache.get(t1, t2, "exact") is None, label
+            print(f"  - {label}: miss")
+    print(f"SUCCESS: {len(broken)} malformed entries read as misses.")
+
+if __name__ == "__main__":
+    test_malformed_entries_are_misses()
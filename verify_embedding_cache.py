@@ -0,0 +1,87 @@
+import os
+import tempfile
+import numpy as np
+from analyze.cache import EmbeddingCache
+
+DIM = 8
+ROWS = 4
+
+def vector(seed):
+    return np.random.default_rng(seed).normal(size=DIM).astype(np.float32)
+
+def open_cache(directory, model_id="markuplm", revision="r1"):
+    # Room for exactly ROWS float16 rows
+    return EmbeddingCache(directory, model_id, revision, max_bytes=ROWS * DIM * 2)
+
+def put(cache, *names):
+    cache.put_many(list(names), np.stack([vector(ord(n)) for n in names]))
+
+def test_lru_eviction():
+    print("Testing that a full memmap evicts the least recently used rows...")
+    with tempfile.TemporaryDirectory() as scratch:
+        cache = open_cache(scratch)
+        put(cache, "a", "b", "c", "d")
+        assert cache.capacity == ROWS and len(cache) == ROWS
+        cache.get_many(["a"])
+        put(cache, "e")
+        assert sorted(cache.slots) == ["a", "c", "d", "e"], sorted(cache.slots)
+        # Keys of the batch being stored are never evicted for each other
+        put(cache, "f", "g")
+        assert sorted(cache.slots) == ["a", "e", "f", "g"], sorted(cache.slots)
+        found = cache.get_many(["a", "g", "b"])
+        assert sorted(found) == ["a", "g"]
+        assert np.allclose(found["a"], vector(ord("a")).astype(np.float16)), "recycled row overwrote a live vector"
+        try:
+            put(cache, "v", "w", "x", "y", "z")
+        except ValueError as e:
+            print(f"  - oversized batch rejected: {e}")
+        else:
+            raise AssertionError("a batch larger than the cache was accepted")
+        print(f"  - live keys after evictions: {sorted(cache.slots)}")
+    print("SUCCESS: eviction is least-recently-used.")
+
+def test_reopen_existing_cache():
+    print("Testing that a flushed cache reopens with its vectors and LRU order...")
+    with tempfile.TemporaryDirectory() as scratch:
+        cache = open_cache(scratch)
+        put(cache, "a", "b", "c", "d")
+        expected = {k: v.copy() for k, v in cache.get_many(["a", "b", "c", "d"]).items()}
+        cache.get_many(["b", "a"])
+        cache.flush()
+
+        reopened = open_cache(scratch)
+        assert reopened.dim == DIM and reopened.capacity == ROWS and len(reopened) == ROWS
+        # c was least recently used before the reopen
+        put(reopened, "e")
+        assert sorted(reopened.slots) == ["a", "b", "d", "e"], sorted(reopened.slots)
+        found = reopened.get_many(["a", "b", "d"])
+        assert all(np.array_equal(found[k], expected[k]) for k in found)
+        assert len(open_cache(scratch, revision="r2")) == 0, "another model revision must not see these vectors"
+
+        # A matrix file shorter than the index claims reads as an empty cache
+        reopened.flush()
+        with open(os.path.join(reopened.directory, "vectors.f16"), "r+b") as f:
+            f.truncate(DIM * 2)
+        assert len(open_cache(scratch)) == 0
+    print("SUCCESS: reopened cache serves the same vectors.")
+
+def test_dim_mismatch():
+    print("Testing that vectors of another dimension are rejected...")
+    with tempfile.TemporaryDirectory() as scratch:
+        cache = open_cache(scratch)
+        put(cache, "a")
+        cache.flush()
+        for target in (cache, open_cache(scratch)):
+            try:
+                target.put_many(["wide"], np.zeros((1, DIM * 2), dtype=np.float32))
+            except ValueError as e:
+                print(f"  - rejected: {e}")
+            else:
+                raise AssertionError("a wider vector was stored")
+            assert "wide" not in target and list(target.slots) == ["a"]
+    print("SUCCESS: dimension mismatch raises and leaves the cache intact.")
+
+if __name__ == "__main__":
+    test_lru_eviction()
+    test_reopen_existing_cache()
+    test_dim_mismatch()
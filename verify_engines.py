@@ -0,0 +1,134 @@
+import copy
+import itertools
+import os
+import time
+from common.models import Node
+from common.tree import DOMTree
+from analyze.diff import StructuralDiffer, DiffBudget
+from benchmarks.synthetic import make_snapshot
+from ingest.html_loader import snapshot_from_html
+
+def N(tag, attrs=None, *children, text=""):
+    return Node(tag, attrs or {}, children=list(children), text=text)
+
+def login_form():
+    return N("form", {"id": "login"}, N("input", {"name": "user"}), N("input", {"name": "pass"}), N("button", {"type": "submit"}, text="Go"))
+
+def row(text, cls="row"):
+    return N("li", {"class": cls}, N("span", text=text))
+
+def build_cases():
+    cases = {
+        # The form moves from the nav into main
+        "moved subtree": (N("body", {}, N("nav", {}, login_form()), N("main", {}, N("h1", text="Hi"))),
+                          N("body", {}, N("nav"), N("main", {}, N("h1", text="Hi"), login_form()))),
+        # Three identical rows on one side, two on the other
+        "repeated rows": (N("body", {}, N("ul", {}, row("a"), row("a"), row("a"), row("b"))),
+                          N("body", {}, N("ul", {}, row("b"), row("a"), row("a"), row("a", "row x")))),
+        # One of three identical rows restyled: only two pairs are identical
+        "restyled copy": (N("body", {}, N("ul", {}, row("a"), row("a"), row("a"))),
+                          N("body", {}, N("ul", {}, row("a"), row("a"), row("a", "row x")))),
+    }
+    pages = {}
+    for name in ("v1", "v2", "v3", "active"):
+        with open(f"testing/{name}.html", "r", encoding="utf-8") as f:
+            pages[name] = DOMTree.from_json(snapshot_from_html(f.read()))
+    for a, b in itertools.combinations(pages, 2):
+        cases[f"{a} -> {b}"] = (pages[a], pages[b])
+    return {name: tuple(t if isinstance(t, DOMTree) else DOMTree.from_node(t) for t in pair) for name, pair in cases.items()}
+
+def mapping_errors(t1, t2, mapping):
+    """Pairs breaking one-to-one, ancestor or document order (an invalid edit mapping)."""
+    pairs = [(n1.index, n2.index) for n1, n2 in mapping if n1 is not None and n2 is not None]
+    errors = []
+    if len({i for i, _ in pairs}) != len(pairs) or len({j for _, j in pairs}) != len(pairs):
+        errors.append("not one-to-one")
+    for (i1, j1), (i2, j2) in itertools.combinations(pairs, 2):
+        above1 = i1 < i2 < i1 + t1.size[i1] or i2 < i1 < i2 + t1.size[i2]
+        above2 = j1 < j2 < j1 + t2.size[j1] or j2 < j1 < j2 + t2.size[j2]
+        if above1 != above2 or (i1 < i2) != (j1 < j2):
+            errors.append(((i1, j1), (i2, j2)))
+    return errors
+
+def check_engine(engine, must_match=()):
+    print(f"Testing that the {engine} engine never reports less than the exact distance...")
+    for name, (t1, t2) in build_cases().items():
+        exact = StructuralDiffer("exact").diff(t1, t2)["distance"]
+        result = StructuralDiffer(engine).diff(t1, t2)
+        errors = mapping_errors(t1, t2, result["mapping"])
+        print(f"  - {name}: exact={exact} {engine}={result['distance']} invalid pairs={len(errors)}")
+        assert not errors, f"{name}: {engine} mapping is not an edit mapping: {errors[:3]}"
+        assert result["distance"] >= exact, f"{name}: {engine} distance {result['distance']} below exact {exact}"
+        if name in must_match:
+            assert result["distance"] == exact, f"{name}: {engine} distance {result['distance']} != exact {exact}"
+    print(f"SUCCESS: {engine} distances are valid edit costs.")
+
+def test_hybrid_engine():
+    # Identical subtrees are paired one-to-one, so the leftover copy stays renameable
+    check_engine("hybrid", must_match=("restyled copy", "v1 -> v2", "v1 -> v3", "v2 -> v3"))
+
+def test_fast_engine():
+    check_engine("fast")
+
+class UnderestimatingBudget(DiffBudget):
+    # Calibration off by orders of magnitude, so the up-front check lets APTED run
+    APTED_SECONDS_PER_PAIR = 1e-12
+
+def test_diff_deadline():
+    print("Testing that --diff-timeout stops an underestimated APTED run...")
+    snapshot = make_snapshot(3000, dynamic_attrs=False)
+    changed = copy.deepcopy(snapshot)
+    changed["children"][1]["attributes"]["id"] = "renamed"
+    t1, t2 = DOMTree.from_json(snapshot), DOMTree.from_json(changed)
+
+    start = time.perf_counter()
+    result = StructuralDiffer("exact", UnderestimatingBudget(max_seconds=0.5)).diff(t1, t2)
+    elapsed = time.perf_counter() - start
+    print(f"  - {result['strategy']} after {result.get('timed_out')} timed out, {elapsed:.2f} s, distance {result['distance']}")
+    assert result.get("timed_out") == "exact" and result["strategy"] == "fast", result.get("timed_out")
+    assert elapsed < 5, f"deadline not enforced ({elapsed:.1f} s)"
+
+    small1, small2 = DOMTree.from_json(make_snapshot(50, dynamic_attrs=False)), DOMTree.from_json(make_snapshot(50, seed=8, dynamic_attrs=False))
+    bounded = StructuralDiffer("exact", UnderestimatingBudget(max_seconds=30)).diff(small1, small2)
+    direct = StructuralDiffer("exact").diff(small1, small2)
+    index = lambda n: n.index if n is not None else None
+    assert bounded["strategy"] == "exact" and "timed_out" not in bounded
+    assert bounded["distance"] == direct["distance"]
+    assert [(index(a), index(b)) for a, b in bounded["mapping"]] == [(index(a), index(b)) for a, b in direct["mapping"]]
+    print("SUCCESS: overrunning diff degraded to the fast engine; runs within the deadline are kept.")
+
+class CrashingDiffer(StructuralDiffer):
+    """APTED that raises, or kills its process, wherever it runs."""
+    parent_runs = []
+
+    def __init__(self, crash, *args):
+        super().__init__(*args)
+        self.crash = crash
+        self.parent = os.getpid()
+
+    def _run(self, t1, t2, strategy, collapsed):
+        if os.getpid() == self.parent:
+            self.parent_runs.append(strategy)
+        if self.crash == "exit":
+            os._exit(3)
+        raise MemoryError("APTED matrix too large")
+
+def test_deadline_child_failure():
+    print("Testing that a failed deadline child falls back to the fast engine, not an unbounded re-run...")
+    t1 = DOMTree.from_json(make_snapshot(300, dynamic_attrs=False))
+    t2 = DOMTree.from_json(make_snapshot(300, seed=8, dynamic_attrs=False))
+    fast = StructuralDiffer("fast").diff(t1, t2)["distance"]
+    for crash in ("raise", "exit"):
+        CrashingDiffer.parent_runs.clear()
+        result = CrashingDiffer(crash, "exact", DiffBudget(max_seconds=30)).diff(t1, t2)
+        print(f"  - child {crash}: strategy {result['strategy']}, failed {result.get('failed')} ({result.get('error')})")
+        assert not CrashingDiffer.parent_runs, "APTED re-ran in process without a deadline"
+        assert result["strategy"] == "fast" and result.get("failed") == "exact" and result.get("error")
+        assert "timed_out" not in result and result["distance"] == fast
+    print("SUCCESS: child failures degrade to the fast engine.")
+
+if __name__ == "__main__":
+    test_hybrid_engine()
+    test_fast_engine()
+    test_diff_deadline()
+    test_deadline_child_failure()
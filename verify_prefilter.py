@@ -0,0 +1,78 @@
+import copy
+import random
+import time
+from common.tree import DOMTree
+from analyze.prefilter import CandidateFilter
+from benchmarks.synthetic import make_snapshot
+
+TOP_N = 50
+MIN_RECALL = 0.95
+
+def element_order(root):
+    """Element dicts in DOMTree.from_json preorder ('#text' skipped)."""
+    order, stack = [], [root]
+    while stack:
+        item = stack.pop()
+        order.append(item)
+        stack.extend(reversed([c for c in item.get("children", []) if c.get("nodeName") != "#text"]))
+    return order
+
+def mutate(snapshot, rng, changes: int):
+    """
+    A later build of the page: ids renamed, classes swapped and new siblings
+    inserted. Returns (new snapshot, {old index: new index}) for the nodes
+    whose locators broke.
+    """
+    memo = {}
+    new = copy.deepcopy(snapshot, memo)
+    old_nodes = element_order(snapshot)
+    broken = rng.sample(range(1, len(old_nodes)), changes)
+    for k in broken:
+        node = memo[id(old_nodes[k])]
+        attrs = node["attributes"]
+        if "id" in attrs:
+            attrs["id"] = attrs["id"] + "-v2"
+        else:
+            attrs["class"] = attrs["class"].replace("item", "entry")
+    # Unrelated insertions shift positions between the builds
+    for node in rng.sample(element_order(new), changes // 2):
+        node["children"].insert(0, {"nodeName": "DIV", "nodeType": 1, "attributes": {"class": "promo"}, "children": []})
+
+    new_index = {id(node): i for i, node in enumerate(element_order(new))}
+    truth = {k: new_index[id(memo[id(old_nodes[k])])] for k in broken}
+    return new, truth
+
+def test_prefilter_recall():
+    print("Testing the recovery pre-filter against exhaustive search and the known counterparts...")
+    rng = random.Random(11)
+    snapshot = make_snapshot(20000, dynamic_attrs=False)
+    new_snapshot, truth = mutate(snapshot, rng, 200)
+    t1, t2 = DOMTree.from_json(snapshot), DOMTree.from_json(new_snapshot)
+
+    start = time.perf_counter()
+    prefilter = CandidateFilter(t1, t2)
+    built = time.perf_counter() - start
+    lost = [t1.node(k) for k in truth]
+    start = time.perf_counter()
+    shortlists = prefilter.candidates_many(lost, TOP_N)
+    ranked = time.perf_counter() - start
+
+    truth_recall = CandidateFilter.recall(shortlists, list(truth.values()))
+    pool = prefilter.average_pool_size()
+    start = time.perf_counter()
+    exhaustive = [prefilter.exhaustive_best(node) for node in lost]
+    scanned = time.perf_counter() - start
+    exhaustive_recall = CandidateFilter.recall(shortlists, exhaustive)
+    print(f"  - {len(t1)} -> {len(t2)} nodes, indexes built in {built * 1000:.0f} ms")
+    print(f"  - {len(lost)} lost nodes ranked in {ranked * 1000:.0f} ms, top {TOP_N} each "
+          f"(exhaustive scoring: {scanned * 1000:.0f} ms)")
+    print(f"  - Average pool scored: {pool:.0f} of {len(t2)} nodes ({pool / len(t2):.1%})")
+    print(f"  - Recall of the exhaustive-search best: {exhaustive_recall:.3f}")
+    print(f"  - Recall of the true counterpart: {truth_recall:.3f}")
+
+    assert exhaustive_recall >= MIN_RECALL, f"exhaustive-best recall {exhaustive_recall:.3f} is below {MIN_RECALL}"
+    assert truth_recall >= MIN_RECALL, f"true-counterpart recall {truth_recall:.3f} is below {MIN_RECALL}"
+    print(f"SUCCESS: pre-filter keeps the counterpart for at least {MIN_RECALL:.0%} of lost nodes.")
+
+if __name__ == "__main__":
+    test_prefilter_recall()
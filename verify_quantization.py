@@ -0,0 +1,60 @@
+import sys
+from lxml import etree, html as lxml_html
+from analyze.recovery import SemanticRecovery
+
+FIXTURES = ("v1", "v2", "v3", "active")
+# Mean fp32/int8 cosine similarity we accept for the quantized model
+MIN_MEAN_COSINE = 0.98
+
+def load_snippets():
+    """Outer HTML of every element with text, per fixture page."""
+    pages = {}
+    for name in FIXTURES:
+        with open(f"testing/{name}.html", "r", encoding="utf-8") as f:
+            doc = lxml_html.document_fromstring(f.read())
+        pages[name] = [
+            etree.tostring(el, encoding="unicode", with_tail=False)
+            for el in doc.iter()
+            if isinstance(el.tag, str) and (el.text or "").strip()
+        ]
+    return pages
+
+def test_quantization_accuracy(model_dir: str = None):
+    print("Comparing fp32 and dynamic int8 MarkupLM embeddings on the fixtures...")
+    full = SemanticRecovery(model_dir=model_dir, cache_dir=None)
+    quantized = SemanticRecovery(model_dir=model_dir, quantize=True, cache_dir=None)
+    if not full.model or not quantized.model:
+        print("SKIPPED: MarkupLM unavailable.")
+        return
+
+    import torch.nn.functional as F
+    pages = load_snippets()
+    vectors = {}
+    cosines = []
+    for name, snippets in pages.items():
+        v32 = full.embed_batch(snippets)
+        v8 = quantized.embed_batch(snippets)
+        vectors[name] = (v32, v8)
+        cosines.extend(F.cosine_similarity(v32, v8).tolist())
+    mean_cos = sum(cosines) / len(cosines)
+    print(f"  - fp32 vs int8 cosine over {len(cosines)} nodes: mean {mean_cos:.4f}, min {min(cosines):.4f}")
+
+    # Recovery decision agreement: best match of every v1 node on each later page
+    agree = total = 0
+    base32, base8 = vectors["v1"]
+    for name in FIXTURES[1:]:
+        cand32, cand8 = vectors[name]
+        for k in range(len(base32)):
+            pick32 = full.find_best_match(base32[k], list(enumerate(cand32)))
+            pick8 = quantized.find_best_match(base8[k], list(enumerate(cand8)))
+            total += 1
+            agree += pick32[0] == pick8[0]
+    print(f"  - Best-match agreement: {agree}/{total}")
+
+    if mean_cos >= MIN_MEAN_COSINE:
+        print(f"SUCCESS: int8 embeddings stay within cosine {MIN_MEAN_COSINE} of fp32 on average.")
+    else:
+        print(f"FAILURE: mean cosine {mean_cos:.4f} is below {MIN_MEAN_COSINE}.")
+
+if __name__ == "__main__":
+    test_quantization_accuracy(sys.argv[1] if len(sys.argv) > 1 else None)
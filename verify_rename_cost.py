@@ -0,0 +1,64 @@
+import itertools
+import random
+from common.models import Node
+from common.tree import DOMTree
+from analyze.diff import DOMTreeConfig
+from common.hashing import label_hash
+from ingest.html_loader import snapshot_from_html
+
+def build_trees():
+    trees = []
+    for name in ("v1", "v2", "v3", "active"):
+        with open(f"testing/{name}.html", "r", encoding="utf-8") as f:
+            trees.append(DOMTree.from_json(snapshot_from_html(f.read())))
+
+    # Synthetic nodes covering the edge cases of the reference formula:
+    # no attributes, disjoint keys, None values and text-only differences.
+    rng = random.Random(3)
+    children = []
+    for _ in range(300):
+        attrs = {}
+        for key in rng.sample(["id", "class", "name", "role", "href", "data-x"], rng.randint(0, 4)):
+            attrs[key] = rng.choice(["a", "b", "", None])
+        children.append(Node(rng.choice(["div", "span", "a"]), attrs, text=rng.choice(["", "Login", "Logout"])))
+    trees.append(DOMTree.from_node(Node("body", children=children)))
+    return trees
+
+def test_rename_cost_regression():
+    print("Testing DOMTreeConfig.rename fast path against the reference cost...")
+    config = DOMTreeConfig()
+    nodes = [n for tree in build_trees() for n in tree.nodes()]
+
+    mismatches = 0
+    checked = 0
+    # Twice over the same pairs so the second pass is served from the memo
+    for _ in range(2):
+        for n1, n2 in itertools.product(nodes[::3], nodes[1::4]):
+            checked += 1
+            if config.rename(n1, n2) != DOMTreeConfig.attribute_cost(n1, n2):
+                mismatches += 1
+
+    if mismatches == 0:
+        print(f"SUCCESS: {checked} node pairs produce identical rename costs.")
+    else:
+        print(f"FAILURE: {mismatches} of {checked} node pairs differ from the reference cost.")
+
+def test_label_hash_separates_lookalike_labels():
+    print("Testing that label hashes of look-alike labels differ...")
+    lookalikes = [
+        (("div", {"a=b": "c"}, ""), ("div", {"a": "b=c"}, "")),
+        (("div", {"x": None}, ""), ("div", {"x": "None"}, "")),
+        (("div", {"a": "1\x00b=2"}, ""), ("div", {"a": "1", "b": "2"}, "")),
+        (("div", {"a": "b"}, ""), ("div", {}, "\x01a=b")),
+    ]
+    config = DOMTreeConfig()
+    for first, second in lookalikes:
+        assert label_hash(*first) != label_hash(*second), (first, second)
+        n1 = DOMTree.from_node(Node(first[0], first[1], text=first[2])).root
+        n2 = DOMTree.from_node(Node(second[0], second[1], text=second[2])).root
+        assert config.rename(n1, n2) == DOMTreeConfig.attribute_cost(n1, n2), (first, second)
+    print(f"SUCCESS: {len(lookalikes)} look-alike label pairs hash apart.")
+
+if __name__ == "__main__":
+    test_rename_cost_regression()
+    test_label_hash_separates_lookalike_labels()
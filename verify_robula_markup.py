@@ -0,0 +1,70 @@
+from lxml import etree, html as lxml_html
+from common.tree import DOMTree
+from generator.robula import RobulaPlus
+
+PAGE = """<html><body>
+<section><!-- promo --><div>a</div><div>b</div><!-- end --><span>c</span></section>
+<section><div>a</div><div>b</div><span>c</span></section>
+<nav><div class="host"><!-- slot --><div>x</div></div><div class="host"><div>x</div></div></nav>
+</body></html>"""
+
+# Shadow content attached to the first host: repeated items and a comment
+SHADOW = """<ul><!-- items --><li>one</li><li>one</li></ul><ul><li>one</li></ul>"""
+
+def snapshot_of(el):
+    """serializeNode-shaped dict for an lxml element or comment (text skipped)."""
+    if el.tag is etree.Comment:
+        return {"nodeName": "#comment", "nodeType": 8, "nodeValue": el.text or "", "attributes": {}, "children": []}
+    return {"nodeName": str(el.tag).upper(), "nodeType": 1, "nodeValue": None, "attributes": dict(el.attrib),
+            "children": [snapshot_of(c) for c in el]}
+
+def build_page():
+    """(tree, light-DOM document, shadow root stand-in, host index) for PAGE with SHADOW on the first host."""
+    doc = lxml_html.document_fromstring(PAGE)
+    shadow = lxml_html.fragment_fromstring(SHADOW, create_parent="shadow-root")
+    snapshot = snapshot_of(doc)
+    host = snapshot["children"][0]["children"][2]["children"][0]
+    host["shadowRoot"] = {"nodeName": "#document-fragment", "nodeType": 11, "attributes": {},
+                          "children": [snapshot_of(c) for c in shadow]}
+    return DOMTree.from_json(snapshot), doc, shadow
+
+def elements(root):
+    return [el for el in root.iter() if el.tag is not etree.Comment]
+
+def test_locators_match_real_markup():
+    print("Testing ROBULA+ locators against lxml on markup with comments and a shadow host...")
+    tree, doc, shadow = build_page()
+    wrapper = next(i for i in range(len(tree)) if tree.tag_of(i) == "shadow-root")
+    inside = set(range(wrapper + 1, wrapper + tree.size[wrapper]))
+    light = [i for i in range(len(tree)) if i not in inside and i != wrapper and tree.tag_of(i) != "#comment"]
+    hidden = [i for i in sorted(inside) if tree.tag_of(i) != "#comment"]
+    expected = dict(zip(light, elements(doc)))
+    expected.update(zip(hidden, elements(shadow)[1:]))
+    assert len(expected) == len(light) + len(hidden)
+
+    robula = RobulaPlus()
+    for i, el in expected.items():
+        xpath = robula.generate_xpath(tree.node(i), tree)
+        assert "shadow-root" not in xpath, xpath
+        # Document XPath cannot see into the shadow tree; those locators are
+        # evaluated from the shadow root
+        found = shadow.xpath("." + xpath) if i in inside else doc.xpath(xpath)
+        assert found == [el], f"node {i} <{tree.tag_of(i)}>: {xpath} matched {len(found)} element(s)"
+        print(f"  - {'shadow' if i in inside else 'light '} {tree.tag_of(i):8} {xpath}")
+    print(f"SUCCESS: {len(expected)} locators each match exactly their element.")
+
+def test_anchored_path_stops_at_shadow_root():
+    print("Testing the anchored fallback path inside a shadow tree...")
+    tree, _, shadow = build_page()
+    robula = RobulaPlus()
+    wrapper = next(i for i in range(len(tree)) if tree.tag_of(i) == "shadow-root")
+    targets = [i for i in range(wrapper + 1, wrapper + tree.size[wrapper]) if tree.tag_of(i) != "#comment"]
+    for i, el in zip(targets, elements(shadow)[1:]):
+        path = robula._anchored_path(tree, i)
+        assert "shadow-root" not in path and shadow.xpath("." + path) == [el], path
+        print(f"  - {tree.tag_of(i):4} {path}")
+    print("SUCCESS: anchored paths restart at the shadow root.")
+
+if __name__ == "__main__":
+    test_locators_match_real_markup()
+    test_anchored_path_stops_at_shadow_root()
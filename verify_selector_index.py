@@ -0,0 +1,101 @@
+import random
+from common.tree import DOMTree
+from generator.selector_index import SelectorIndex, is_element_tag
+from benchmarks.synthetic import make_snapshot
+from ingest.html_loader import snapshot_from_html
+
+def pages():
+    trees = {}
+    for name in ("v1", "v2", "v3", "active"):
+        with open(f"testing/{name}.html", "r", encoding="utf-8") as f:
+            trees[name] = DOMTree.from_json(snapshot_from_html(f.read()))
+    snapshot = make_snapshot(3000, seed=11)
+    # Texts, a comment and a shadow root so every lookup table is populated
+    snapshot["children"][0]["nodeValue"] = "Sign in"
+    snapshot["children"][1]["children"].append({"nodeName": "#comment", "nodeValue": "x", "attributes": {}, "children": []})
+    snapshot["children"][1]["shadowRoot"] = {"nodeName": "#document-fragment", "attributes": {}, "children": [
+        {"nodeName": "BUTTON", "nodeValue": "Sign in", "attributes": {"class": "c1 item", "name": "go"}, "children": []}]}
+    trees["synthetic"] = DOMTree.from_json(snapshot)
+    return trees
+
+def scan(tree, keep):
+    """Indices i with keep(i), by a plain pass over every node."""
+    return {i for i in range(len(tree)) if keep(i)}
+
+def test_lookups_match_full_scan():
+    print("Testing SelectorIndex lookups against a plain full-tree scan...")
+    for name, tree in pages().items():
+        index = SelectorIndex(tree)
+        attrs = [tree.attributes_of(i) for i in range(len(tree))]
+        checked = 0
+        for tag, found in index.by_tag.items():
+            assert found == scan(tree, lambda i: tree.tag_of(i) == tag), (name, tag)
+            checked += 1
+        assert index.elements == scan(tree, lambda i: is_element_tag(tree.tag_of(i))), name
+        assert index.matches(tag="*") == index.elements
+        names = {n for a in attrs for n in a}
+        assert set(index.by_attr_name) == names, name
+        for attr in names:
+            assert index.by_attr_name[attr] == scan(tree, lambda i: attr in attrs[i]), (name, attr)
+            checked += 1
+        pairs = {(n, v) for a in attrs for n, v in a.items() if isinstance(v, str)}
+        assert set(index.by_attr) == pairs, name
+        for pair in pairs:
+            assert index.by_attr[pair] == scan(tree, lambda i: attrs[i].get(pair[0]) == pair[1]), (name, pair)
+            checked += 1
+        ids = {a["id"] for a in attrs if isinstance(a.get("id"), str)}
+        assert set(index.by_id) == ids
+        for value in ids:
+            assert index.by_id[value] == scan(tree, lambda i: attrs[i].get("id") == value), (name, value)
+        classes = {a["class"] for a in attrs if isinstance(a.get("class"), str)}
+        assert set(index.by_class_exact) == classes
+        tokens = {t for c in classes for t in c.split()}
+        assert set(index.by_class_token) == tokens
+        for token in tokens:
+            expected = scan(tree, lambda i: token in (attrs[i].get("class") or "").split())
+            assert index.by_class_token[token] == expected, (name, token)
+            checked += 1
+        texts = {t for t in tree.texts if t}
+        assert set(index.by_text) == texts
+        for text in texts:
+            assert index.by_text[text] == scan(tree, lambda i: tree.texts[i] == text), (name, text)
+        print(f"  - {name}: {len(tree)} nodes, {checked} tag/attribute/class keys identical")
+    print("SUCCESS: every lookup equals the full scan.")
+
+def test_matches_and_count_match_full_scan():
+    print("Testing combined matches() and subtree count() against a full scan...")
+    rng = random.Random(5)
+    for name, tree in pages().items():
+        index = SelectorIndex(tree)
+        attrs = [tree.attributes_of(i) for i in range(len(tree))]
+        for _ in range(300):
+            i = rng.randrange(len(tree))
+            tag = rng.choice([tree.tag_of(i), "*", None])
+            own = [(n, v) for n, v in attrs[i].items() if isinstance(v, str) and n not in ("id", "class")]
+            pairs = tuple(rng.sample(own, min(len(own), rng.randint(0, 2))))
+            token = rng.choice((attrs[i].get("class") or "").split() or [None])
+            node_id = attrs[i].get("id") if rng.random() < 0.3 else None
+
+            def keep(j):
+                if tag == "*" and not is_element_tag(tree.tag_of(j)):
+                    return False
+                if tag not in ("*", None) and tree.tag_of(j) != tag:
+                    return False
+                if node_id and attrs[j].get("id") != node_id:
+                    return False
+                if token and token not in (attrs[j].get("class") or "").split():
+                    return False
+                return all(attrs[j].get(n) == v for n, v in pairs)
+
+            constraints = dict(tag=tag, id=node_id, class_token=token, attrs=pairs)
+            expected = scan(tree, keep)
+            assert index.matches(**constraints) == expected, (name, constraints)
+            lo = tree.parent[i] if tree.parent[i] >= 0 else 0
+            hi = lo + tree.size[lo]
+            assert index.count(lo=lo, hi=hi, **constraints) == sum(1 for j in expected if lo <= j < hi)
+        print(f"  - {name}: 300 random selectors identical")
+    print("SUCCESS: matches() and count() equal the full scan.")
+
+if __name__ == "__main__":
+    test_lookups_match_full_scan()
+    test_matches_and_count_match_full_scan()
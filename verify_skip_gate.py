@@ -0,0 +1,94 @@
+import asyncio
+import copy
+import os
+import sys
+import tempfile
+from unittest.mock import MagicMock
+
+# Capture is patched below; only stub the browser/git bindings when absent
+for name in ("playwright", "playwright.async_api", "git"):
+    try:
+        __import__(name)
+    except ImportError:
+        sys.modules[name] = MagicMock()
+
+from ingest.capture import DOMCapturer
+from analyze.diff import StructuralDiffer
+from common.lsh import SimHashLSHIndex
+from common.simhash import page_fingerprint
+from common.tree import DOMTree
+from benchmarks.synthetic import make_snapshot
+from main import main
+
+def find_id(root, value):
+    stack = [root]
+    while stack:
+        item = stack.pop()
+        if item.get("attributes", {}).get("id") == value:
+            return item
+        stack.extend(item.get("children", []))
+    return None
+
+def run_builds(snapshots):
+    """Runs main() once per snapshot in a scratch directory; returns the number of diffs run."""
+    diffs = []
+    real_diff = StructuralDiffer.diff
+
+    async def capture_page(self, url):
+        return {"url": url, "dom_structure": copy.deepcopy(snapshots.pop(0))}
+
+    def diff(self, t1, t2):
+        diffs.append((len(t1), len(t2)))
+        return real_diff(self, t1, t2)
+
+    cwd = os.getcwd()
+    real_capture = DOMCapturer.capture_page
+    DOMCapturer.capture_page, StructuralDiffer.diff = capture_page, diff
+    try:
+        with tempfile.TemporaryDirectory() as scratch:
+            os.chdir(scratch)
+            for build in range(len(snapshots)):
+                asyncio.run(main("http://test.com", f"build-{build}", diff_engine="fast"))
+    finally:
+        os.chdir(cwd)
+        DOMCapturer.capture_page, StructuralDiffer.diff = real_capture, real_diff
+    return len(diffs)
+
+def test_single_id_rename_still_diffs():
+    print("Testing that renaming one id is not skipped as 'no material change'...")
+    baseline = make_snapshot(2000, dynamic_attrs=False)
+    renamed = copy.deepcopy(baseline)
+    find_id(renamed, "node-2")["attributes"]["id"] = "login-button-v2"
+    distance = (page_fingerprint(DOMTree.from_json(baseline)) ^ page_fingerprint(DOMTree.from_json(renamed))).bit_count()
+    print(f"  - Page SimHash distance after the rename: {distance} bit(s)")
+
+    diffs = run_builds([baseline, renamed])
+    assert diffs == 1, f"expected the renamed page to be diffed, got {diffs} diff(s)"
+    print("SUCCESS: the renamed id reaches the differ.")
+
+def test_identical_page_skips():
+    print("Testing that an identical page skips the diff...")
+    baseline = make_snapshot(500, dynamic_attrs=False)
+    diffs = run_builds([baseline, baseline])
+    assert diffs == 0, f"expected no diff for an identical page, got {diffs}"
+    print("SUCCESS: identical page skipped.")
+
+def test_lsh_index_distance_and_eviction():
+    print("Testing SimHashLSHIndex reload distance and per-route eviction...")
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "index.json")
+        index = SimHashLSHIndex(max_distance=0, max_per_route=3)
+        for build in range(5):
+            index.add(f"page@{build}", 0b1111 << build, route="page")
+        assert sorted(index.entries) == ["page@2", "page@3", "page@4"], sorted(index.entries)
+        index.save(path)
+        # A larger threshold on a later run is honoured, not capped to the saved one
+        reloaded = SimHashLSHIndex.load(path, max_distance=4, max_per_route=3)
+        hits = dict(reloaded.query(0b1111 << 4, route="page"))
+        assert hits == {"page@4": 0, "page@3": 2, "page@2": 4}, hits
+    print("SUCCESS: caller's distance wins and old entries are evicted.")
+
+if __name__ == "__main__":
+    test_single_id_rename_still_diffs()
+    test_identical_page_skips()
+    test_lsh_index_distance_and_eviction()
@@ -0,0 +1,44 @@
+from lxml import html as lxml_html
+from common.tree import DOMTree
+from ingest.html_loader import snapshot_from_html
+from generator.validation import LocatorValidator
+
+PAGE = "<html><body><section><!-- promo --><div>a</div><div>b</div></section><section><div>a</div><div>b</div></section></body></html>"
+
+def test_comment_positions_match_browser():
+    print("Testing that the validator counts * positions like the real DOM...")
+    tree = DOMTree.from_json(snapshot_from_html(PAGE))
+    doc = lxml_html.document_fromstring(PAGE)
+    validator = LocatorValidator(tree)
+    second_div = 5
+    assert tree.tag_of(second_div) == "div" and tree.tag_of(second_div - 2) == "#comment"
+    # *[3] counts the comment: it selects nothing in the page and must be rejected
+    for xpath, real_ok in (("//*[1]/*[3]", False), ("//section[1]/*[2]", True), ("//*[1]/div[2]", True), ("//*[3]", False)):
+        real = doc.xpath(xpath)
+        found = validator.matches(xpath)
+        ok = validator.is_unique(xpath, second_div)
+        print(f"  - {xpath}: real DOM {len(real)} match(es), validator {found}, valid={ok}")
+        assert ok == real_ok and len(found) == len(real), xpath
+    print("SUCCESS: locators wrong in the real DOM are rejected.")
+
+def test_shadow_root_is_a_separate_tree():
+    print("Testing that shadow content is only reachable from its shadow root...")
+    snapshot = snapshot_from_html("<html><body><ul><li>x</li></ul><div id='host'></div></body></html>")
+    body = next(c for c in snapshot["children"] if c["nodeName"] == "BODY")
+    host = next(c for c in body["children"] if c["attributes"].get("id") == "host")
+    host["shadowRoot"] = {"nodeName": "#document-fragment", "attributes": {}, "children": [
+        {"nodeName": "UL", "attributes": {}, "children": [{"nodeName": "LI", "attributes": {"class": "item"}, "children": []}]}]}
+    tree = DOMTree.from_json(snapshot)
+    validator = LocatorValidator(tree)
+    light_li, shadow_li = [i for i in range(len(tree)) if tree.tag_of(i) == "li"]
+    assert validator.matches("//li") == [light_li]
+    assert validator.is_unique("//li", light_li) and validator.is_unique("//ul/li", light_li)
+    assert validator.is_unique("//li", shadow_li) and validator.is_unique("/ul/li", shadow_li)
+    assert validator.is_unique("//li[@class='item']", shadow_li)
+    assert not validator.is_unique("//li[@class='item']", light_li)
+    assert not validator.is_unique("//div/shadow-root/ul/li", shadow_li)
+    print("SUCCESS: document and shadow tree are evaluated separately.")
+
+if __name__ == "__main__":
+    test_comment_positions_match_browser()
+    test_shadow_root_is_a_separate_tree()
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import numpy as np
+from analyze.vector_index import VectorIndex
+
+DIM = 64
+# recall@10 the IVF layout must keep against exact search at the default nprobe
+MIN_IVF_RECALL = 0.9
+
+def clustered_vectors(n=8000, clusters=64, queries=200, seed=3):
+    """(vectors, queries): points around random centers, queries perturbed from random points."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, DIM))
+    vectors = centers[rng.integers(clusters, size=n)] + 1.5 * rng.normal(size=(n, DIM))
+    picks = vectors[rng.choice(n, queries, replace=False)]
+    return vectors.astype(np.float32), (picks + 0.1 * rng.normal(size=picks.shape)).astype(np.float32)
+
+def brute_force(vectors, queries, k):
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ unit.T
+    rows = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(scores, rows, axis=1), rows
+
+def build(vectors):
+    index = VectorIndex()
+    # Added in two batches, with tuple keys like the xpath/hash pairs callers store
+    half = len(vectors) // 2
+    index.add([("node", k) for k in range(half)], vectors[:half])
+    index.add([("node", k) for k in range(half, len(vectors))], vectors[half:])
+    return index
+
+def test_flat_matches_brute_force():
+    print("Testing flat top-k against brute-force numpy...")
+    vectors, queries = clustered_vectors()
+    index = build(vectors)
+    for k in (1, 10):
+        scores, rows = index.search(queries, k=k)
+        expected_scores, expected_rows = brute_force(vectors, queries, k)
+        assert np.array_equal(rows, expected_rows), f"k={k}: rows differ"
+        assert np.allclose(scores, expected_scores, atol=1e-5), f"k={k}: scores differ"
+        print(f"  - k={k}: {len(queries)} queries identical")
+    # More results asked than vectors held: the tail is -1 / -inf
+    small = VectorIndex()
+    small.add(["a", "b"], vectors[:2])
+    scores, rows = small.search(queries[:3], k=4)
+    assert (rows[:, 2:] == -1).all() and np.isneginf(scores[:, 2:]).all() and (rows[:, :2] >= 0).all()
+    print("SUCCESS: flat search is exact.")
+
+def test_ivf_recall():
+    print(f"Testing IVF recall@10 (must be >= {MIN_IVF_RECALL})...")
+    vectors, queries = clustered_vectors()
+    index = build(vectors)
+    index.train_ivf()
+    assert index.centroids is not None
+    _, rows = index.search(queries, k=10)
+    _, expected = brute_force(vectors, queries, 10)
+    # IVF reorders rows, so compare by key
+    found = [{index.keys[r] for r in row if r >= 0} for row in rows]
+    recall = np.mean([len(f & {("node", int(r)) for r in e}) / 10 for f, e in zip(found, expected)])
+    print(f"  - {len(index.centroids)} lists, nprobe 8: recall@10 {recall:.3f}")
+    assert recall >= MIN_IVF_RECALL, recall
+    small = build(vectors[:100])
+    small.train_ivf()
+    assert small.centroids is None, "small indexes stay flat"
+    print("SUCCESS: IVF recall above threshold.")
+
+def test_save_load_round_trip():
+    print("Testing that save()/load() gives identical results...")
+    vectors, queries = clustered_vectors()
+    with tempfile.TemporaryDirectory() as scratch:
+        for layout in ("flat", "ivf"):
+            index = build(vectors)
+            if layout == "ivf":
+                index.train_ivf()
+            path = os.path.join(scratch, layout, "index.npz")
+            index.save(path)
+            loaded = VectorIndex.load(path)
+            assert loaded.keys == index.keys and loaded.dim == index.dim
+            assert (loaded.centroids is None) == (layout == "flat")
+            before, after = index.search(queries, k=5), loaded.search(queries, k=5)
+            assert np.array_equal(before[0], after[0]) and np.array_equal(before[1], after[1]), layout
+            assert loaded.best_matches(queries[:5], k=3) == index.best_matches(queries[:5], k=3)
+            print(f"  - {layout}: {len(loaded)} vectors, identical scores and rows")
+        assert len(VectorIndex.load(os.path.join(scratch, "missing.npz"))) == 0
+    print("SUCCESS: round trip is lossless.")
+
+if __name__ == "__main__":
+    test_flat_matches_brute_force()
+    test_ivf_recall()
+    test_save_load_round_trip()